@@ -2,28 +2,97 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import hashlib
 import io
 import os
 import threading
+import time
 import logging
+import weakref
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from fs import errors
+from fs import iotools
 from fs import ResourceType
-from fs import tools
 from fs.base import FS
 from fs.mode import Mode
 from fs.info import Info
+from fs.path import basename
+from fs.path import dirname
+from fs.path import join
 from fs.path import normpath
 from fs.path import relpath
-from smart_open.http import SeekableBufferedInputBase
 
 from .api_factory import BasespaceApiFactory
-from .basespace_context import FileContext, MAX_PAGE_SIZE
+from .basespace_file import BaseSpaceFile
+from .bgzf import open_decompressed
+from .basespace_context import FileContext, MAX_PAGE_SIZE, MAX_PROBED_PAGE_SIZE
 from .basespace_context import CategoryContext
+from .basespace_context import FLIGHTS
+from .basespace_context import DEFAULT_LIMIT
+from .basespace_context import DEFAULT_QUERY
+from .basespace_context import MINIMAL_QUERY
+from .basespace_context import list_query_for_namespaces
+from .basespace_context import list_query_from_patterns
 from .basespace_context import get_last_direct_context
 from .basespace_context import get_context_by_key
+from .basespace_context import get_context_class_by_key
+from .basespace_context import get_endpoint_by_key
+from .basespace_context import is_not_found_error
+from .basespace_glob import BaseSpaceGlobber
+from .cache import SqliteTTLCache
+from .cache import TTLCache
+from .file_cache import DEFAULT_FILE_CACHE_QUOTA
+from .file_cache import LocalFileCache
+from .file_cache import copy_into
+from .fanout import DEFAULT_IDS_PER_QUERY
+from .fanout import datasets_for_appsessions
+from .fanout import fastqs_for_biosamples
+from .page_size import PageSizer
+from .sync import sync
+from .table import DEFAULT_BATCH_SIZE
+from .table import iter_table_batches
+from .usage import du
+from .usage import iter_du
+from .http_pool import http_get as shared_http_get
+from .http_pool import metrics as http_metrics
+from .genomic_index import INDEX_EXTENSIONS
+from .genomic_index import chunk_byte_ranges
+from .genomic_index import decompress_chunk
+from .genomic_index import parse_index
+from .genomic_index import read_bam_reference_names
+from .transfer import DEFAULT_MEMORY_LIMIT
+from .transfer import WritePipeline
+from .transfer import copy_dir
+from .transfer import copy_file
+from .transfer import download_to_syspath
+from .transfer import read_range
 
 __all__ = ["BASESPACEFS"]
 _BASESPACE_DEFAULT_SERVER = "https://api.basespace.illumina.com/"
+_DEFAULT_METADATA_WORKERS = 8
+_DEFAULT_DOWNLOAD_WORKERS = 4
+_DEFAULT_PART_SIZE = 64 * 1024 * 1024
+_DEFAULT_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# presigned urls handed out by BaseSpace stay valid longer than that
+_FILE_URL_TTL = 600
+_DEFAULT_CACHE_SIZE = 16384
+_DEFAULT_NEGATIVE_CACHE_TTL = 30
+_DEFAULT_METADATA_CACHE_TTL = 300
+_INDEX_CACHE_SIZE = 64
+_INDEX_CACHE_TTL = 3600
+# subtree byte counts of du, kept as long as the signature of their root is unchanged
+_DU_CACHE_TTL = 24 * 3600
+# byte ranges of a region closer than that are fetched with a single request
+_REGION_COALESCE_GAP = 256 * 1024
+
+# from this many siblings on, one listing of their parent is cheaper than individual lookups
+_GETINFO_MANY_LISTING_THRESHOLD = 8
+
+CachedFileUrl = namedtuple("CachedFileUrl", ["url", "size"])
+
+# filesystems of the process, reset in forked children before anything else runs there
+_live_filesystems = weakref.WeakSet()
 
 logger = logging.getLogger("BaseSpaceFs")
 logger.setLevel(logging.DEBUG)
@@ -62,10 +131,64 @@ class BASESPACEFS(FS):
             client_id=None,
             client_secret=None,
             access_token=None,
-            basespace_server=None
+            basespace_server=None,
+            metadata_workers=_DEFAULT_METADATA_WORKERS,
+            resolve_file_hrefs=False,
+            negative_cache_ttl=_DEFAULT_NEGATIVE_CACHE_TTL,
+            download_workers=_DEFAULT_DOWNLOAD_WORKERS,
+            part_size=_DEFAULT_PART_SIZE,
+            metadata_cache_path=None,
+            metadata_cache_ttl=_DEFAULT_METADATA_CACHE_TTL,
+            cache_size=_DEFAULT_CACHE_SIZE,
+            read_ahead=None,
+            download_memory=DEFAULT_MEMORY_LIMIT,
+            file_cache_path=None,
+            file_cache_quota=DEFAULT_FILE_CACHE_QUOTA,
+            tracer=None
     ):
+        # what the filesystem is pickled as, clients and caches are rebuilt from it
+        self._config = dict(dir_path=dir_path, client_id=client_id, client_secret=client_secret,
+                            access_token=access_token, basespace_server=basespace_server,
+                            metadata_workers=metadata_workers, resolve_file_hrefs=resolve_file_hrefs,
+                            negative_cache_ttl=negative_cache_ttl, download_workers=download_workers,
+                            part_size=part_size, metadata_cache_path=metadata_cache_path,
+                            metadata_cache_ttl=metadata_cache_ttl, cache_size=cache_size, read_ahead=read_ahead,
+                            download_memory=download_memory, file_cache_path=file_cache_path,
+                            file_cache_quota=file_cache_quota)
         self._prefix = relpath(normpath(dir_path)).rstrip("/")
+        self._pid = os.getpid()
         self._tlocal = threading.local()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # (access token, user) of the token owner, see get_current_user
+        self._current_user = None
+        self._current_user_lock = threading.Lock()
+        self.metadata_workers = metadata_workers
+        self.resolve_file_hrefs = resolve_file_hrefs
+        self.download_workers = download_workers
+        self.part_size = part_size
+        # buffers a download may hold between its network readers and its writer
+        self.download_memory = download_memory
+        # buffer size of the files returned by openbin, smart_open's default when None
+        self.read_ahead = read_ahead
+        self._url_cache = TTLCache(maxsize=cache_size, ttl=_FILE_URL_TTL)
+        # keys BaseSpace answered 404 for, so optional outputs can be probed repeatedly for free
+        self.negative_cache_ttl = negative_cache_ttl
+        self._missing_cache = TTLCache(maxsize=cache_size if negative_cache_ttl > 0 else 0,
+                                       ttl=negative_cache_ttl)
+        self._index_cache = TTLCache(maxsize=_INDEX_CACHE_SIZE, ttl=_INDEX_CACHE_TTL)
+        self._du_cache = TTLCache(maxsize=cache_size, ttl=_DU_CACHE_TTL)
+        # TraceRecorder or TraceReplayer of fs_basespace.tracing, not pickled: tracing is per process
+        self._tracer = tracer
+        # presigned url reads share the keep-alive connections of the process
+        self._http_get = tracer.http_get if tracer is not None else shared_http_get
+        self._page_sizer = PageSizer(MAX_PAGE_SIZE, MAX_PROBED_PAGE_SIZE)
+        # optional metadata cache shared by the processes of a node, see _shared_cache_state
+        self._metadata_cache_path = metadata_cache_path
+        self._metadata_cache_ttl = metadata_cache_ttl
+        self._shared_cache_token_state = None
+        # optional cache of downloaded files shared by the processes of a node
+        self._file_cache = LocalFileCache(file_cache_path, quota=file_cache_quota) if file_cache_path else None
 
         self.client_id = client_id
         self.client_secret = client_secret
@@ -73,15 +196,50 @@ class BASESPACEFS(FS):
         self.basespace_server = basespace_server or _BASESPACE_DEFAULT_SERVER
 
         self._validate_mandatory_fields()
+        self._shared_cache_state()
 
         super(BASESPACEFS, self).__init__()
+        _live_filesystems.add(self)
         logger.debug('BaseSpaceFs is created')
 
+    def __getstate__(self):
+        # the token may have changed since __init__
+        return dict(self._config, access_token=self.access_token)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _reset_after_fork(self):
+        """ Api clients, pools and locks inherited from the parent process are not usable in a forked child:
+            a lock held by a parent thread at fork time would never be released. Run in the child right after
+            the fork, see _after_fork_in_child.
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._tlocal = threading.local()
+            self._executor = None
+            self._executor_lock = threading.Lock()
+            self._current_user_lock = threading.Lock()
+            # lock of fs.base.FS
+            self._lock = threading.RLock()
+            for cache in (self._url_cache, self._missing_cache, self._index_cache, self._du_cache):
+                cache.after_fork()
+            self._page_sizer.after_fork()
+
     @property
     def basespace(self) -> BasespaceApiFactory:
-        if not hasattr(self._tlocal, "basespace"):
-            self._tlocal.basesapce_api_factory = BasespaceApiFactory(self.client_id, self.client_secret, self.basespace_server, self.access_token)
-        return self._tlocal.basesapce_api_factory
+        self._reset_after_fork()
+        factory = getattr(self._tlocal, "basespace_api_factory", None)
+        if factory is None or factory.access_token != self.access_token:
+            def create():
+                return BasespaceApiFactory(self.client_id, self.client_secret, self.basespace_server, self.access_token)
+
+            if self._tracer is not None:
+                factory = self._tracer.api_factory(create, self.basespace_server, self.access_token, self.client_secret)
+            else:
+                factory = create()
+            self._tlocal.basespace_api_factory = factory
+        return self._tlocal.basespace_api_factory
 
     def __repr__(self):
         return _make_repr(
@@ -95,6 +253,31 @@ class BASESPACEFS(FS):
     def __str__(self):
         return f"<basespace '{self._prefix}'>"
 
+    def _get_executor(self):
+        """ Pool used to issue metadata calls concurrently, every worker thread holds its own api clients """
+        self._reset_after_fork()
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.metadata_workers,
+                                                    thread_name_prefix="basespace-metadata")
+            return self._executor
+
+    def get_current_user(self):
+        """ The user owning the access token, looked up once and shared by every thread until the token changes """
+        with self._current_user_lock:
+            if self._current_user is None or self._current_user[0] != self.access_token:
+                self._current_user = (self.access_token, self.basespace.base_api.getUserById('current'))
+            return self._current_user[1]
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        if self._tracer is not None and not self.isclosed():
+            self._tracer.close()
+        super(BASESPACEFS, self).close()
+
     def _validate_mandatory_fields(self):
         if not self.client_id:
             raise ValueError('Client id must be specified')
@@ -118,8 +301,75 @@ class BASESPACEFS(FS):
         self._validate_key(_key)
         return _key
 
-    def _get_context_by_key(self, key, page=None):
-        return get_context_by_key(self.basespace, key, page)
+    def _get_context_by_key(self, key, page=None, query=DEFAULT_QUERY, lazy=False):
+        return self._through_shared_cache(("context", key, page, query, lazy),
+                                          get_context_by_key, self.basespace, key, page, query, lazy)
+
+    def _is_category_path(self, path):
+        """ Whether the path is a category directory (appresults, files...), from the static hierarchy alone.
+            Listing one checks its parents exist, no need to fetch them beforehand.
+        """
+        try:
+            return issubclass(get_context_class_by_key(self._path_to_key(self.validatepath(path))), CategoryContext)
+        except Exception:
+            return False
+
+    def _list_page(self, key, destination, page, query):
+        return self._through_shared_cache(("list", key, page, query),
+                                          destination.list, self.basespace, page, query)
+
+    def _shared_cache_state(self):
+        """ (scope, shared metadata cache or None) of the current access token, rebuilt when the token changes.
+            Entries are scoped by server and user without storing the token itself, and signed with a key only
+            holders of the token can derive.
+        """
+        state = self._shared_cache_token_state
+        if state is None or state[0] != self.access_token:
+            access_token = self.access_token
+            scope = (self.basespace_server, hashlib.sha256(access_token.encode()).hexdigest()[:16])
+            shared_cache = None
+            if self._metadata_cache_path:
+                secret = hashlib.sha256(b"fs-basespace metadata cache\0" + access_token.encode()).digest()
+                shared_cache = SqliteTTLCache(self._metadata_cache_path, ttl=self._metadata_cache_ttl, secret=secret)
+            state = self._shared_cache_token_state = (access_token, scope, shared_cache)
+        return state[1:]
+
+    @property
+    def _shared_cache(self):
+        return self._shared_cache_state()[1]
+
+    def _is_missing(self, key):
+        """ Whether BaseSpace recently answered 404 for key, to this process or, with a shared cache, another one """
+        if key in self._missing_cache:
+            return True
+        scope, shared_cache = self._shared_cache_state()
+        if shared_cache is None or self.negative_cache_ttl <= 0:
+            return False
+        return shared_cache.get(repr(scope + ("missing", key))) is not None
+
+    def _set_missing(self, key):
+        self._missing_cache.set(key, True)
+        scope, shared_cache = self._shared_cache_state()
+        if shared_cache is not None and self.negative_cache_ttl > 0:
+            shared_cache.set(repr(scope + ("missing", key)), True, ttl=self.negative_cache_ttl)
+
+    def _forget_missing(self, keys):
+        """ keys showed up in a listing, forget they were missing, in the shared cache too """
+        for key in keys:
+            self._missing_cache.pop(key)
+        scope, shared_cache = self._shared_cache_state()
+        if shared_cache is not None and self.negative_cache_ttl > 0:
+            shared_cache.discard([repr(scope + ("missing", key)) for key in keys])
+
+    def _through_shared_cache(self, cache_key, fn, *args):
+        scope, shared_cache = self._shared_cache_state()
+        if shared_cache is None:
+            return fn(*args)
+        cache_key = repr(scope + cache_key)
+        if (value := shared_cache.get(cache_key)) is None:
+            value = fn(*args)
+            shared_cache.set(cache_key, value)
+        return value
 
     def getinfo(self, path, namespaces=None):
         logger.debug(f'getinfo path: {path}')
@@ -130,13 +380,77 @@ class BASESPACEFS(FS):
 
         try:
             _key = self._path_to_key(_path)
+        except Exception:
+            raise errors.ResourceNotFound(path)
+        if self._is_missing(_key):
+            raise errors.ResourceNotFound(path)
+
+        try:
             current_context = self._get_context_by_key(_key)
             info_dict = self._info_from_object(current_context, namespaces)
-        except Exception:
+        except Exception as e:
+            if is_not_found_error(e):
+                self._set_missing(_key)
             raise errors.ResourceNotFound(path)
 
         return Info(info_dict)
 
+    def getinfo_many(self, paths, namespaces=None):
+        """ Get the info of many paths at once, in input order.
+            Siblings are resolved from a single listing of their parent when there are enough of them,
+            the remaining paths are looked up concurrently. A path that can't be resolved gets its
+            exception (usually ResourceNotFound) in place of an Info.
+        """
+        paths = list(paths)
+        namespaces = namespaces or ()
+        results = [None] * len(paths)
+        siblings = {}
+        for index, path in enumerate(paths):
+            siblings.setdefault(dirname(normpath(path)), []).append(index)
+
+        executor = self._get_executor()
+        futures = []
+        for parent, indexes in siblings.items():
+            if len(indexes) >= _GETINFO_MANY_LISTING_THRESHOLD:
+                futures.append(executor.submit(self._getinfo_siblings, parent, paths, indexes, namespaces, results))
+            else:
+                futures.extend(executor.submit(self._getinfo_one, paths, index, namespaces, results)
+                               for index in indexes)
+        for future in futures:
+            future.result()
+        return results
+
+    def _getinfo_one(self, paths, index, namespaces, results):
+        try:
+            results[index] = self.getinfo(paths[index], namespaces)
+        except Exception as e:
+            results[index] = e
+
+    def _getinfo_siblings(self, parent, paths, indexes, namespaces, results):
+        wanted = {}
+        for index in indexes:
+            wanted.setdefault(basename(normpath(paths[index])), []).append(index)
+        try:
+            _key = self._path_to_key(self.validatepath(parent))
+            for entity in self._iter_entities(_key, list_query_for_namespaces(namespaces)):
+                found = wanted.pop(str(entity.get_id()), None)
+                if found is None:
+                    continue
+                info = Info(self._info_from_object(entity, namespaces))
+                for index in found:
+                    results[index] = info
+                if not wanted:
+                    break
+        except Exception:
+            logger.debug(f'getinfo_many could not list {parent}, looking paths up one by one')
+            for found in wanted.values():
+                for index in found:
+                    self._getinfo_one(paths, index, namespaces, results)
+            return
+        for found in wanted.values():
+            for index in found:
+                results[index] = errors.ResourceNotFound(paths[index])
+
     @staticmethod
     def _get_extras(raw_obj):
         if qc_status := getattr(raw_obj, "qc_status", None):
@@ -194,69 +508,434 @@ class BASESPACEFS(FS):
         except Exception:
             raise errors.ResourceNotFound(path)
 
+        # without a page every page is streamed: the first one of the default page size, as requested by
+        # scandir ever since, the next ones sized per endpoint
+        query = list_query_for_namespaces(namespaces)
+        entities = (self._listdir_entities(_key, page, query) if page
+                    else self._iter_entities(_key, query, first_page_size=DEFAULT_LIMIT))
         info = (
             Info(self._info_from_object(entity, namespaces=namespaces))
-            for entity in self._listdir_entities(_key, page)
+            for entity in entities
         )
         iter_info = iter(info)
         return iter_info
 
-    def _listdir_entities(self, key, page=None):
-        destination = self._get_context_by_key(key, page)
-        return [entry for entry in destination.list(self.basespace, page)]
+    def scandir_table(self, path, recursive=False, batch_size=DEFAULT_BATCH_SIZE, output="columns"):
+        """ Stream the listing of a directory, or of its whole tree when recursive, as column batches
+            (id, name, parent, size, created, is_dir, qc_status) built without Info objects.
+            output: "columns" (dict of lists), "numpy" (dict of arrays) or "arrow" (pyarrow.RecordBatch),
+            arrow batches can be written to Parquet with fs_basespace.table.write_parquet.
+        """
+        logger.debug(f'scandir_table path: {path} recursive: {recursive}')
+        if not self.isdir(path):
+            raise errors.DirectoryExpected(path)
+        return iter_table_batches(self, path, recursive=recursive, batch_size=batch_size, output=output)
 
-    def listdir(self, path):
-        all_entities_list = []
+    def du(self, path, by=None):
+        """ Disk usage of a directory tree, as a DiskUsage of the bytes and files below it.
+            With by, a category name such as "projects", "appresults" or "datasets", totals are given per
+            entity of that category (totals["/projects/1/appresults/10"]), otherwise for path alone.
+            Sizes are read from the listings, subtrees unchanged since the last call are not listed again.
+        """
+        logger.debug(f'du path: {path} by: {by}')
+        if not self.isdir(path):
+            raise errors.DirectoryExpected(path)
+        return du(self, path, by=by)
+
+    def iter_du(self, path, by=None):
+        """ Same as du, streaming a DiskUsage of the partial totals after every directory counted """
+        logger.debug(f'iter_du path: {path} by: {by}')
+        if not self.isdir(path):
+            raise errors.DirectoryExpected(path)
+        return iter_du(self, path, by=by)
+
+    def http_metrics(self):
+        """ HttpMetrics of the data requests of the process: requests made, connections opened (handshakes)
+            and requests served over a reused connection, by host too. The connections are shared by every
+            filesystem of the process, so are the counts.
+        """
+        return http_metrics()
+
+    def filterdir(
+            self,
+            path,  # type: Text     # noqa
+            files=None,  # type: Optional[Iterable[Text]]   # noqa
+            dirs=None,  # type: Optional[Iterable[Text]]    # noqa
+            exclude_dirs=None,  # type: Optional[Iterable[Text]]    # noqa
+            exclude_files=None,  # type: Optional[Iterable[Text]]   # noqa
+            namespaces=None,  # type: Optional[Collection[Text]]    # noqa
+            page=None,  # type: Optional[Tuple[int, int]]   # noqa
+    ):
+        # type: (...) -> Iterator[Info] # noqa
+        """ Same as FS.filterdir, but file patterns the listing endpoint understands are sent to the server.
+            Patterns match the entity id or its alias (the original file name), and a page, when given,
+            refers to the server filtered listing.
+        """
+        logger.debug(f'filterdir path: {path} files: {files}')
+        namespaces = namespaces or ()
+        _path = self.validatepath(path)
+
+        try:
+            _key = self._path_to_key(_path)
+        except Exception:
+            raise errors.ResourceNotFound(path)
+
+        query = list_query_for_namespaces(namespaces, list_query_from_patterns(files))
+        entities = self._listdir_entities(_key, page, query)
+
+        def matches(patterns, info):
+            return self.match(patterns, info.name) or self.match(patterns, info.get("basic", "alias") or "")
+
+        filters = []
+        if files:
+            filters.append(lambda info: info.is_dir or matches(files, info))
+        if dirs:
+            filters.append(lambda info: info.is_file or matches(dirs, info))
+        if exclude_dirs:
+            filters.append(lambda info: info.is_file or not matches(exclude_dirs, info))
+        if exclude_files:
+            filters.append(lambda info: info.is_dir or not matches(exclude_files, info))
+
+        info = (
+            Info(self._info_from_object(entity, namespaces=namespaces))
+            for entity in entities
+        )
+        return iter(entry for entry in info if all(_filter(entry) for _filter in filters))
+
+    def _list_query(self, query):
+        if self.resolve_file_hrefs and not query.resolve_hrefs:
+            return query._replace(resolve_hrefs=True)
+        return query
+
+    def _listdir_entities(self, key, page=None, query=DEFAULT_QUERY):
+        query = self._list_query(query)
+        destination = self._get_context_by_key(key, page, query, lazy=True)
+        entities = [entry for entry in self._list_page(key, destination, page, query)]
+        self._remember_entities(key, destination, entities, query)
+        return entities
+
+    def _remember_entities(self, key, destination, entities, query):
+        """ Keep what a listing of destination already told us about its entities """
+        self._forget_missing([join(key, str(entity.get_id())).lstrip("/") for entity in entities])
+        if not query.resolve_hrefs or not getattr(destination, "RESOLVES_HREFS", False):
+            return
+        for entity in entities:
+            entity_key = join(key, str(entity.get_id())).lstrip("/")
+            if not isinstance(entity, FileContext) or entity.get_upload_status() not in (None, 'complete'):
+                continue
+            if href := entity.get_href_content():
+                self._url_cache.set(entity_key, CachedFileUrl(href, entity.get_size()))
+
+    def _iter_entities(self, key, query=DEFAULT_QUERY, first_page_size=None):
+        """ Stream every entity of a directory, holding a single page in memory at a time.
+            Pages are sized per endpoint by the page sizer, but for the first one when first_page_size is given.
+        """
+        query = self._list_query(query)
+        endpoint = get_endpoint_by_key(key)
+        page_size = first_page_size or self._page_sizer.size(endpoint)
+        # only pages of the sizer's choosing are measured
+        sized = first_page_size is None
         offset = 0
-        limit = MAX_PAGE_SIZE
+        page = (offset, offset + page_size)
+        destination = self._get_context_by_key(key, page, query, lazy=True)
+        if not isinstance(destination, CategoryContext):
+            # entity directories only hold the static categories
+            entities = self._list_page(key, destination, page, query)
+            if query.ordered:
+                entities = sorted(entities, key=lambda entity: entity.get_id())
+            yield from entities
+            return
 
+        short_probe = None
+        while True:
+            probing = self._page_sizer.is_probe(endpoint, page_size)
+            started = time.monotonic()
+            try:
+                if offset and destination.PAGED_BY_PARENT:
+                    destination = self._get_context_by_key(key, page, query, lazy=True)
+                entities = self._list_page(key, destination, page, query)
+            except Exception:
+                if not probing:
+                    raise
+                # the server refuses pages that big, go on with the largest size it accepted
+                self._page_sizer.refused(endpoint, page_size)
+                page_size = self._page_sizer.size(endpoint)
+                page = (offset, offset + page_size)
+                continue
+            if sized:
+                self._page_sizer.record(endpoint, page_size, len(entities), time.monotonic() - started)
+            sized = True
+            if short_probe is not None and entities:
+                self._page_sizer.capped(endpoint, short_probe)
+            self._remember_entities(key, destination, entities, query)
+            yield from entities
+
+            short_probe = None
+            if len(entities) < page_size:
+                if not probing or len(entities) < self._page_sizer.initial:
+                    break
+                # a short probe is either the end of the listing or a silent server cap, the next page tells
+                short_probe = len(entities)
+                page_size = self._page_sizer.size(endpoint)
+            else:
+                page_size = self._page_sizer.next_size(endpoint, page_size)
+            offset += len(entities)
+            page = (offset, offset + page_size)
+
+    def listdir(self, path):
         logger.debug(f'listdir path: {path}')
-        if not self.isdir(path) and not self.isfile(path):
+        if not self._is_category_path(path) and not self.isdir(path) and not self.isfile(path):
             raise errors.DirectoryExpected(path)
 
         try:
             _path = self.validatepath(path)
             _key = self._path_to_key(_path)
-            while True:
-                entities_list = self._listdir_entities(_key, (offset, limit))
-                all_entities_list.extend(entities_list)
-                if len(entities_list) < limit:
-                    break
-                offset += limit
-
+            entity_ids = [entry.get_id() for entry in self._iter_entities(_key, MINIMAL_QUERY)]
         except Exception:
             raise errors.ResourceNotFound(path)
 
-        return sorted(entry.get_id() for entry in all_entities_list)
+        return sorted(entity_ids)
+
+    def iterdir(self, path):
+        """ Stream the names of a directory in ascending id order, as returned page by page by the server.
+            Unlike listdir nothing is materialized, and the order differs: numeric ids come in numeric order
+            ("9" before "10") where listdir sorts names as strings ("10" before "9"). Sort the names to compare
+            both.
+        """
+        logger.debug(f'iterdir path: {path}')
+        if not self._is_category_path(path) and not self.isdir(path):
+            raise errors.DirectoryExpected(path)
+
+        _path = self.validatepath(path)
+        _key = self._path_to_key(_path)
+        for entry in self._iter_entities(_key, MINIMAL_QUERY._replace(ordered=True)):
+            yield entry.get_id()
+
+    def iglob(self, pattern, namespaces=None):
+        """ Stream the GlobMatch objects of a pattern such as 'projects/*/appresults/*/files/*.vcf.gz'.
+            Unlike the generic fs.glob, category levels are expanded without API calls, wildcard ids are
+            listed concurrently and a trailing file name pattern is pushed down as a listing filter.
+            '**' patterns are delegated to the generic globber.
+        """
+        logger.debug(f'iglob pattern: {pattern}')
+        if "**" in pattern:
+            return iter(self.glob(pattern, namespaces=namespaces))
+        return iter(BaseSpaceGlobber(self, pattern, namespaces))
 
-    def openbin(self, path, mode="r", buffering=-1, **options):
+    def open(self, path, mode="r", buffering=-1, encoding=None, errors=None, newline="", **options):
+        """ Same as FS.open, with an extra `decompress` option.
+            decompress=True yields the decompressed content of gzip files, BGZF blocks (bgzip, BAM) being
+            inflated in parallel.
+        """
+        if not options.get("decompress"):
+            return super(BASESPACEFS, self).open(path, mode, buffering, encoding, errors, newline, **options)
+        bin_mode = mode.replace("t", "")
+        bin_file = self.openbin(path, mode=bin_mode, buffering=buffering, decompress=True)
+        return iotools.make_stream(path, bin_file, mode=mode, buffering=buffering, encoding=encoding or "utf-8",
+                                   errors=errors, newline=newline)
+
+    def openbin(self, path, mode="r", buffering=-1, decompress=False, **options):
         _mode = Mode(mode)
         if _mode.create:
             raise errors.ResourceReadOnly
 
         _mode.validate_bin()
 
+        buffer_size = buffering if buffering > 1 else self.read_ahead
+        cached_file = self._open_cached_file(path)
+        if cached_file is not None:
+            return open_decompressed(cached_file) if decompress else cached_file
         s3_url = self.geturl(path=path)
-        return SeekableBufferedInputBase(s3_url, mode, timeout=15)
+        if buffer_size:
+            basespace_file = BaseSpaceFile(s3_url, mode, buffer_size=buffer_size, timeout=15, http_get=self._http_get)
+        else:
+            basespace_file = BaseSpaceFile(s3_url, mode, timeout=15, http_get=self._http_get)
+        if decompress:
+            return open_decompressed(basespace_file)
+        return basespace_file
 
     def download(self, path, file, chunk_size=None, **options):
         logger.debug(f'download path: {path}')
+        chunk_size = chunk_size or _DEFAULT_DOWNLOAD_CHUNK_SIZE
+        expected_size = None
         try:
-            with self.openbin(path, "rb") as basespace_f:
-                tools.copy_file_data(basespace_f, file)
+            cached_file = self._open_cached_file(path)
+            if cached_file is None and self._file_cache is not None:
+                cached_file = self._fetch_cached_file(path, self._resolve_file(path))
+            if cached_file is not None:
+                with cached_file:
+                    # entries were checked against the BaseSpace size when they were downloaded
+                    expected_size = os.fstat(cached_file.fileno()).st_size
+                    copy_into(cached_file, file)
+            else:
+                self._download_stream(path, file, chunk_size)
         except Exception as e:
             logger.exception(f'download failed: {path} err: {str(e)}')
             raise
 
         try:
-            self.validate_files_has_same_size(path, file)
+            self.validate_files_has_same_size(path, file, expected_size)
         except Exception as e:
             logger.exception(f'download failed: {path} err: {str(e)}')
             raise
 
-    def validate_files_has_same_size(self, path, file):
-        current_context = self.get_context_by_path(path)
-        file_size_in_path = current_context.raw_obj.Size
+    def _download_stream(self, path, file, chunk_size):
+        with self.openbin(path, "rb") as basespace_f:
+            # the socket is read while the previous chunks are written
+            with WritePipeline(lambda offset, view: file.write(view), chunk_size, self.download_memory) as pipeline:
+                pipeline.feed(basespace_f)
+
+    def _cached_file_id(self, path):
+        """ Id of the file at path in the node file cache, from the path alone. None without a file cache or
+            when the path isn't a file path. The path isn't checked against BaseSpace, see _open_cached_file.
+        """
+        if self._file_cache is None:
+            return None
+        try:
+            _key = self._path_to_key(self.validatepath(path))
+            if not issubclass(get_context_class_by_key(_key), FileContext):
+                return None
+        except Exception:
+            return None
+        return basename(_key)
+
+    def _open_cached_file(self, path, context=None):
+        """ The local copy of a file in the node file cache opened for reading, None when it isn't there.
+            The path is resolved first, an entry is only served for a file this token can read and of the size
+            BaseSpace gives. The size comes from the context when known, or from the url cache, BaseSpace is
+            asked otherwise. None as well when the path can't be resolved, the caller reports it as usual.
+        """
+        file_id = self._cached_file_id(path)
+        if file_id is None:
+            return None
+        if context is None and (cached := self._get_cached_file_url(path)):
+            size = cached.size
+        else:
+            if context is None:
+                try:
+                    context = self._get_context_by_key(self._path_to_key(self.validatepath(path)))
+                except Exception:
+                    return None
+            if not isinstance(context, FileContext):
+                return None
+            size = context.get_size()
+        return None if size is None else self._file_cache.open(file_id, size)
+
+    def _fetch_cached_file(self, path, resolved):
+        """ The local copy of a file in the node file cache, downloaded into it first when missing.
+            None when the file can't be cached.
+        """
+        file_id = self._cached_file_id(path)
+        if file_id is None or resolved.size is None:
+            return None
+        return self._file_cache.fetch(
+            file_id, resolved.size,
+            lambda partial_path: download_to_syspath(resolved.url, resolved.size, partial_path, self.part_size,
+                                                     self.download_workers, http_get=self._http_get,
+                                                     memory_limit=self.download_memory))
+
+    def copy_to(self, src_path, dst_fs, dst_path, skip_same_size=False):
+        """ Copy a file into another filesystem through the fast path: the file is resolved once, fetched in
+            concurrent ranges into a file moved into place when dst_fs has system paths, uploaded as one stream
+            otherwise. fs.copy functions don't take this path, they read through openbin.
+            With skip_same_size, a destination of the same size is left as is. Returns False when skipped.
+        """
+        logger.debug(f'copy_to src_path: {src_path} dst_path: {dst_path}')
+        return copy_file(self, src_path, dst_fs, dst_path, skip_same_size=skip_same_size)
+
+    def copydir_to(self, src_path, dst_fs, dst_path="/", workers=None, skip_same_size=False):
+        """ Copy a directory tree into another filesystem, files being copied concurrently (download_workers
+            by default) through the fast path of copy_to. Returns the number of files copied.
+        """
+        logger.debug(f'copydir_to src_path: {src_path} dst_path: {dst_path}')
+        return copy_dir(self, src_path, dst_fs, dst_path, workers=workers, skip_same_size=skip_same_size)
+
+    def sync(self, src_path, dest_fs, dest_path="/", workers=None):
+        """ Mirror src_path into dest_fs, downloading only files that are new or changed since the last sync.
+            Files still uploading are skipped. Returns a SyncResult of the copied, unchanged and uploading
+            paths, relative to src_path.
+        """
+        logger.debug(f'sync src_path: {src_path} dest_path: {dest_path}')
+        return sync(self, src_path, dest_fs, dest_path, workers=workers)
+
+    def fastqs_for_biosamples(self, project_path, biosample_ids, namespaces=None,
+                              ids_per_query=DEFAULT_IDS_PER_QUERY):
+        """ Fastq datasets and files of many biosamples of a project at once, as
+            {biosample id: {dataset id: {file path: Info}}}. Biosample ids are batched into shared dataset
+            queries and the files of the datasets are listed concurrently on the metadata pool.
+        """
+        logger.debug(f'fastqs_for_biosamples project_path: {project_path}')
+        return fastqs_for_biosamples(self, project_path, biosample_ids, namespaces or (), ids_per_query)
+
+    def datasets_for_appsessions(self, project_path, appsession_ids, namespaces=None,
+                                 ids_per_query=DEFAULT_IDS_PER_QUERY):
+        """ Same as fastqs_for_biosamples, for the datasets of appsessions:
+            {appsession id: {dataset id: {file path: Info}}}
+        """
+        logger.debug(f'datasets_for_appsessions project_path: {project_path}')
+        return datasets_for_appsessions(self, project_path, appsession_ids, namespaces or (), ids_per_query)
+
+    def fetch_region(self, path, contig, start, end, index_path=None):
+        """ Decompressed records of a BAM / bgzipped VCF (or any tabix indexed file) overlapping a region.
+            start/end are 0-based, end excluded. The .bai/.csi/.tbi index is looked up next to the file
+            unless index_path is given, and kept in cache. Like an htslib index query, the records of the
+            returned chunks may extend a little outside the region.
+        """
+        logger.debug(f'fetch_region path: {path} region: {contig}:{start}-{end}')
+        resolved = self._resolve_file(path)
+        index = self._load_index(path, index_path or self._find_index_path(path))
+        try:
+            ref_id = index.ref_id(contig)
+        except KeyError as e:
+            raise errors.ResourceNotFound(path, msg=str(e))
+
+        chunks = index.chunks(ref_id, start, end)
+        ranges = chunk_byte_ranges(chunks, resolved.size, _REGION_COALESCE_GAP)
+        with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+            fetched = dict(zip((range_start for range_start, _ in ranges),
+                               executor.map(lambda byte_range: read_range(resolved.url, *byte_range, http_get=self._http_get),
+                                            ranges)))
+        return b"".join(decompress_chunk(fetched, chunk) for chunk in chunks)
+
+    def _find_index_path(self, path):
+        """ Path of the .bai/.csi/.tbi sibling of a file, matched by file names in its directory """
+        parent = dirname(normpath(path))
+        file_id = basename(normpath(path))
+        ids_by_name = {}
+        file_name = None
+        for entity in self._iter_entities(self._path_to_key(self.validatepath(parent)), MINIMAL_QUERY):
+            ids_by_name[entity.get_name()] = str(entity.get_id())
+            if str(entity.get_id()) == file_id:
+                file_name = entity.get_name()
+        if file_name is None:
+            raise errors.ResourceNotFound(path)
+
+        stem = file_name.rsplit(".", 1)[0]
+        for candidate in [file_name + extension for extension in INDEX_EXTENSIONS] + [stem + ".bai"]:
+            if candidate in ids_by_name:
+                return join(parent, ids_by_name[candidate])
+        raise errors.ResourceNotFound(path, msg=f"no index found next to {file_name}")
+
+    def _load_index(self, path, index_path):
+        _key = self._path_to_key(self.validatepath(index_path))
+        if (index := self._index_cache.get(_key)) is not None:
+            return index
+
+        with self.openbin(index_path) as index_file:
+            index = parse_index(index_file.read())
+        if not index.names:
+            with self.openbin(path, decompress=True) as bam_file:
+                index = index._replace(names=read_bam_reference_names(bam_file))
+        self._index_cache.set(_key, index)
+        return index
+
+    def validate_files_has_same_size(self, path, file, file_size_in_path=None):
+        if file_size_in_path is None:
+            if cached := self._get_cached_file_url(path):
+                file_size_in_path = cached.size
+            else:
+                current_context = self.get_context_by_path(path)
+                file_size_in_path = current_context.raw_obj.Size
         file.seek(0, io.SEEK_END)
         downloaded_file_size = file.tell()
         if file_size_in_path != downloaded_file_size:
@@ -269,6 +948,9 @@ class BASESPACEFS(FS):
         if purpose != "download":
             raise errors.NoURL(path, purpose)
 
+        if cached := self._get_cached_file_url(path):
+            return cached.url
+
         try:
             current_context = self.get_context_by_path(path)
             self.verify_upload_complete(path, context=current_context)
@@ -281,6 +963,35 @@ class BASESPACEFS(FS):
 
         return s3_url
 
+    def _resolve_file(self, path, context=None):
+        """ Download url and size of a file, with a single file lookup (none when the context is known) """
+        if cached := self._get_cached_file_url(path):
+            return cached
+
+        if context is None or not hasattr(context.raw_obj, "getFileUrl"):
+            _path = self.validatepath(path)
+            try:
+                _key = self._path_to_key(_path)
+                context = self._get_context_by_key(_key)
+            except Exception:
+                raise errors.ResourceNotFound(path)
+        if not isinstance(context, FileContext):
+            raise errors.FileExpected(path)
+
+        self.verify_upload_complete(path, context=context)
+        try:
+            s3_url = context.raw_obj.getFileUrl(self.basespace.base_api)
+        except Exception as e:
+            raise errors.NoURL(path, "download", msg=str(e))
+        return CachedFileUrl(s3_url, context.get_size())
+
+    def _get_cached_file_url(self, path):
+        try:
+            _key = self._path_to_key(self.validatepath(path))
+        except Exception:
+            return None
+        return self._url_cache.get(_key)
+
     def verify_upload_complete(self, path, context=None):
         is_complete = context.raw_obj.UploadStatus == 'complete'
         if not is_complete:
@@ -314,3 +1025,12 @@ class BASESPACEFS(FS):
 
     def upload(self, path, file, chunk_size=None, **options):
         raise errors.ResourceReadOnly
+
+
+def _after_fork_in_child():
+    FLIGHTS.after_fork()
+    for basespace_fs in list(_live_filesystems):
+        basespace_fs._reset_after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
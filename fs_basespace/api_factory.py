@@ -6,6 +6,8 @@ import bssh_sdk_2
 class BasespaceApiFactory():
 
     def __init__(self, client_id, client_secret, basespace_server, access_token):
+        self.basespace_server = basespace_server
+        self.access_token = access_token
         self.base_api = BaseSpaceAPI(client_id,
                                      client_secret,
                                      basespace_server,
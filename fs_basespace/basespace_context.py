@@ -1,9 +1,11 @@
 import re
 from abc import abstractmethod
-from typing import Tuple
+from typing import Iterable, NamedTuple, Optional, Tuple
 
 from fs import errors
 from fs_basespace.api_factory import BasespaceApiFactory
+from fs_basespace.lazy_entity import LazyAppResult, LazyProject, LazySample
+from fs_basespace.single_flight import SingleFlight
 from BaseSpacePy.model.QueryParameters import QueryParameters as qp
 
 
@@ -11,6 +13,41 @@ Page = Tuple[int, int]
 DEFAULT_OFFSET = 0
 DEFAULT_LIMIT = 512
 MAX_PAGE_SIZE = 1024
+# largest page the listings try when the server accepts bigger pages than MAX_PAGE_SIZE
+MAX_PROBED_PAGE_SIZE = 8192
+# properties of the fastq datasets of a biosample expanded in full listings
+DATASET_PROPERTY_FILTERS = ["Input.Libraries", "Input.Runs", "BaseSpace.Metrics.FastQ"]
+NOT_FOUND_MESSAGE = re.compile(r"\b404\b|not[ _.]?found", re.IGNORECASE)
+WILDCARD_CHARS = re.compile(r"[*?\[\]]")
+EXTENSION_PATTERN = re.compile(r"^\*\.([^*?\[\]/]+)$")
+
+
+class ListQuery(NamedTuple):
+    """Filters a listing endpoint may apply on the server side.
+
+    Only narrows what the server returns, callers still match the final names.
+    """
+    extensions: Tuple[str, ...] = ()
+    names: Tuple[str, ...] = ()
+    # ask for ascending id order, so pages can be streamed without sorting on the client
+    ordered: bool = False
+    # let the v2 file listings resolve the download url of every file in the same response
+    resolve_hrefs: bool = False
+    # expand the heavy fields of the listed entities (dataset properties), False when the caller only reads
+    # what the minimal representation holds: ids, names, sizes, dates and statuses
+    expand: bool = True
+
+
+DEFAULT_QUERY = ListQuery()
+# listings read for the ids and basic info of their entities only
+MINIMAL_QUERY = ListQuery(expand=False)
+
+# identical metadata calls issued concurrently by any thread of the process share one request
+FLIGHTS = SingleFlight()
+
+
+def flight_key(api: BasespaceApiFactory, *call):
+    return (api.basespace_server, api.access_token) + call
 
 class classproperty:
     def __init__(self, getter):
@@ -33,7 +70,7 @@ class EntityContext(metaclass=EntityContextMeta):
     def __init__(self, raw_obj):
         self.raw_obj = raw_obj
 
-    def list(self, api: BasespaceApiFactory, page: Page):
+    def list(self, api: BasespaceApiFactory, page: Page, query: ListQuery = DEFAULT_QUERY):
         return [context(self.raw_obj) for context in self.CATEGORY_MAP.values()]
 
     def get(self, api: BasespaceApiFactory, category):
@@ -55,21 +92,46 @@ class EntityContext(metaclass=EntityContextMeta):
     def get_size(self):
         return getattr(self.raw_obj, 'Size', getattr(self.raw_obj, 'size', None))
 
+    def get_date_modified(self):
+        return getattr(self.raw_obj, 'DateModified', getattr(self.raw_obj, 'date_modified', None))
+
+    def get_total_size(self):
+        return getattr(self.raw_obj, 'TotalSize', getattr(self.raw_obj, 'total_size', None))
+
+    def get_href_content(self):
+        return getattr(self.raw_obj, 'HrefContent', getattr(self.raw_obj, 'href_content', None))
+
+    def get_upload_status(self):
+        return getattr(self.raw_obj, 'UploadStatus', getattr(self.raw_obj, 'upload_status', None))
+
 
 class CategoryContext:
     NAME = "undefined"
     ENTITY_ID_FORMAT = re.compile("^[0-9]+$")
     ENTITY_CONTEXT = None
+    # the listing is part of the parent response, every page needs the parent to be fetched again
+    PAGED_BY_PARENT = False
+    # listed files carry presigned download urls when the query asks to resolve them (v2 dataset files only,
+    # v1 listings return the api path of the content)
+    RESOLVES_HREFS = False
 
     def __init__(self, raw_obj):
         self.raw_obj = raw_obj
 
     @abstractmethod
-    def list_raw(self, api: BasespaceApiFactory, page: Page):
+    def list_raw(self, api: BasespaceApiFactory, page: Page, query: ListQuery = DEFAULT_QUERY):
         raise NotImplementedError("Should return list of entity contexts")
 
-    def list(self, api: BasespaceApiFactory, page: Page):
-        return [self.ENTITY_CONTEXT(entity) for entity in self.list_raw(api, page)]
+    def list(self, api: BasespaceApiFactory, page: Page, query: ListQuery = DEFAULT_QUERY):
+        if self.PAGED_BY_PARENT:
+            raw_entities = self.list_raw(api, page, query)
+        else:
+            parent_id = getattr(self.raw_obj, 'Id', getattr(self.raw_obj, 'id', None))
+            # ids are unique per entity type only: files of appresult N and of sample N are different listings
+            parent_type = getattr(self.raw_obj, 'RAW_TYPE', type(self.raw_obj).__name__)
+            key = flight_key(api, "list", self.__class__.__name__, parent_type, parent_id, page, query)
+            raw_entities = FLIGHTS.do(key, self.list_raw, api, page, query)
+        return [self.ENTITY_CONTEXT(entity) for entity in raw_entities]
 
     @abstractmethod
     def get_raw(self, api: BasespaceApiFactory, entity_id):
@@ -97,21 +159,36 @@ class CategoryContext:
 
 
 class CategoryContextDirect(CategoryContext):
+    # placeholder class standing for an entity until more than its id is needed, None to always fetch it
+    LAZY_RAW_OBJECT = None
+
     def get_raw(self, api: BasespaceApiFactory, entity_id):
         return self.get_raw_entity_direct(api, entity_id)
 
     @classmethod
-    def get_entity_direct(cls, api: BasespaceApiFactory, entity_id: str, page: Page):
-        return cls.ENTITY_CONTEXT(cls.get_raw_entity_direct(api, entity_id, page))
+    def get_entity_direct(cls, api: BasespaceApiFactory, entity_id: str, page: Page,
+                          query: ListQuery = DEFAULT_QUERY):
+        key = flight_key(api, "get", cls.__name__, entity_id, page, query)
+        return cls.ENTITY_CONTEXT(FLIGHTS.do(key, cls.get_raw_entity_direct, api, entity_id, page, query))
+
+    @classmethod
+    def get_entity_lazy(cls, api: BasespaceApiFactory, entity_id: str, page: Page,
+                        query: ListQuery = DEFAULT_QUERY):
+        """Context of an entity whose children are about to be resolved, fetched only if its own fields are read."""
+        if cls.LAZY_RAW_OBJECT is None:
+            return cls.get_entity_direct(api, entity_id, page, query)
+        return cls.ENTITY_CONTEXT(cls.LAZY_RAW_OBJECT(
+            entity_id, lambda: cls.get_entity_direct(api, entity_id, page, query).raw_obj))
 
     @classmethod
     @abstractmethod
-    def get_raw_entity_direct(cls, api: BasespaceApiFactory, entity_id: str, page: Page):
+    def get_raw_entity_direct(cls, api: BasespaceApiFactory, entity_id: str, page: Page,
+                              query: ListQuery = DEFAULT_QUERY):
         raise NotImplementedError("Should return entity context by id")
 
 
 class FileContext(EntityContext):
-    def list_raw(self, api: BasespaceApiFactory, page: Page):
+    def list_raw(self, api: BasespaceApiFactory, page: Page, query: ListQuery = DEFAULT_QUERY):
         raise TypeError("list_raw() is not applicable to a single file")
 
     @classmethod
@@ -132,12 +209,13 @@ class FileGroupContext(CategoryContextDirect):
     NAME = "files"
     ENTITY_CONTEXT = FileContext
 
-    def list_raw(self, api: BasespaceApiFactory, page: Page):
-        params = translate_offset_and_limit_to_queryparams(page)
+    def list_raw(self, api: BasespaceApiFactory, page: Page, query: ListQuery = DEFAULT_QUERY):
+        params = translate_offset_and_limit_to_queryparams(page, query, **translate_query_to_v1_file_filters(query))
         return self.raw_obj.getFiles(api.base_api, queryPars=params)
 
     @classmethod
-    def get_raw_entity_direct(cls, api: BasespaceApiFactory, file_id: str, page: Page):
+    def get_raw_entity_direct(cls, api: BasespaceApiFactory, file_id: str, page: Page,
+                              query: ListQuery = DEFAULT_QUERY):
         params = translate_offset_and_limit_to_queryparams(page)
         return api.base_api.getFileById(file_id, queryPars=params)
 
@@ -149,13 +227,15 @@ class FileGroupsContext(EntityContext, categories=[FileGroupContext]):
 class AppResultsContext(CategoryContextDirect):
     NAME = "appresults"
     ENTITY_CONTEXT = FileGroupsContext
+    LAZY_RAW_OBJECT = LazyAppResult
 
-    def list_raw(self, api: BasespaceApiFactory, page: Page):
-        params = translate_offset_and_limit_to_queryparams(page)
+    def list_raw(self, api: BasespaceApiFactory, page: Page, query: ListQuery = DEFAULT_QUERY):
+        params = translate_offset_and_limit_to_queryparams(page, query)
         return self.raw_obj.getAppResults(api.base_api, queryPars=params)
 
     @classmethod
-    def get_raw_entity_direct(cls, api: BasespaceApiFactory, result_id: str, page: Page):
+    def get_raw_entity_direct(cls, api: BasespaceApiFactory, result_id: str, page: Page,
+                              query: ListQuery = DEFAULT_QUERY):
         params = translate_offset_and_limit_to_queryparams(page)
         return api.base_api.getAppResultById(result_id, queryPars=params)
 
@@ -165,13 +245,15 @@ class AppResultsContext(CategoryContextDirect):
 class SamplesContext(CategoryContextDirect):
     NAME = "samples"
     ENTITY_CONTEXT = FileGroupsContext
+    LAZY_RAW_OBJECT = LazySample
 
-    def list_raw(self, api: BasespaceApiFactory, page: Page):
-        params = translate_offset_and_limit_to_queryparams(page)
+    def list_raw(self, api: BasespaceApiFactory, page: Page, query: ListQuery = DEFAULT_QUERY):
+        params = translate_offset_and_limit_to_queryparams(page, query)
         return self.raw_obj.getSamples(api.base_api, queryPars=params)
 
     @classmethod
-    def get_raw_entity_direct(cls, api: BasespaceApiFactory, sample_id: str, page: Page):
+    def get_raw_entity_direct(cls, api: BasespaceApiFactory, sample_id: str, page: Page,
+                              query: ListQuery = DEFAULT_QUERY):
         params = translate_offset_and_limit_to_queryparams(page)
         return api.base_api.getSampleById(sample_id, queryPars=params)
 
@@ -179,12 +261,15 @@ class SamplesContext(CategoryContextDirect):
 class SequencedFileGroupContext(CategoryContextDirect):
     NAME = "sequenced files"
     ENTITY_CONTEXT = FileContext
+    PAGED_BY_PARENT = True
+    RESOLVES_HREFS = True
 
-    def list_raw(self, api: BasespaceApiFactory, page: Page):
+    def list_raw(self, api: BasespaceApiFactory, page: Page, query: ListQuery = DEFAULT_QUERY):
         return self.raw_obj.items
 
     @classmethod
-    def get_raw_entity_direct(cls, api: BasespaceApiFactory, file_id: str, page: Page):
+    def get_raw_entity_direct(cls, api: BasespaceApiFactory, file_id: str, page: Page,
+                              query: ListQuery = DEFAULT_QUERY):
         params = translate_offset_and_limit_to_queryparams(page)
         return api.base_api.getFileById(file_id, queryPars=params)
 
@@ -197,24 +282,27 @@ class DatasetsContext(CategoryContextDirect):
     ENTITY_ID_FORMAT = re.compile("^ds.[0-9a-z]+$")
     NAME = "datasets"
     ENTITY_CONTEXT = SequencedFileGroupsContext
+    PAGED_BY_PARENT = True
 
-    def list_raw(self, api: BasespaceApiFactory, page: Page):
+    def list_raw(self, api: BasespaceApiFactory, page: Page, query: ListQuery = DEFAULT_QUERY):
         return self.raw_obj.items
 
     @classmethod
-    def get_raw_entity_direct(cls, api: BasespaceApiFactory, dataset_id: str, page: Page):
+    def get_raw_entity_direct(cls, api: BasespaceApiFactory, dataset_id: str, page: Page,
+                              query: ListQuery = DEFAULT_QUERY):
         offset, limit = translate_page_to_offset_and_limit(page)
+        filters = translate_query_to_v2_file_filters(query)
         return api.v2.get_v2_datasets_id_files(excludevcfindexfolder=False,
                                                excludebamcoveragefolder=False,
                                                excludesystemfolder=False,
                                                excludeemptyfiles=False,
-                                               filehrefcontentresolution=False,
+                                               filehrefcontentresolution=query.resolve_hrefs,
                                                turbomode=False,
                                                id=dataset_id,
-                                               sortdir='Asc',
-                                               sortby='Name',
                                                offset=offset,
-                                               limit=limit)
+                                               limit=limit,
+                                               **translate_query_to_v2_sort(query, sortdir='Asc', sortby='Name'),
+                                               **filters)
 
 class AppSessionContext(EntityContext, categories=[DatasetsContext]):
     pass
@@ -228,22 +316,22 @@ class BioSampleGroupContext(CategoryContextDirect):
     NAME = "biosamples"
     ENTITY_CONTEXT = BioSampleContext
 
-    def list_raw(self, api: BasespaceApiFactory, page: Page):
+    def list_raw(self, api: BasespaceApiFactory, page: Page, query: ListQuery = DEFAULT_QUERY):
         offset, limit = translate_page_to_offset_and_limit(page)
-        params = {'projectid': [self.raw_obj.Id], 'sortby': 'Name', 'offset': offset, 'limit': limit}
+        params = {'projectid': [self.raw_obj.Id], 'offset': offset, 'limit': limit,
+                  **translate_query_to_v2_sort(query, sortby='Name')}
         bio_sample_list = api.v2.get_v2_biosamples(**params).items
         return bio_sample_list
 
     @classmethod
-    def get_raw_entity_direct(cls, api: BasespaceApiFactory, biosample_id: str, page: Page):
+    def get_raw_entity_direct(cls, api: BasespaceApiFactory, biosample_id: str, page: Page,
+                              query: ListQuery = DEFAULT_QUERY):
         offset, limit = translate_page_to_offset_and_limit(page)
         return api.v2.get_v2_datasets(offset=offset,
                                       limit=limit,
-                                      sortby='Name',
-                                      sortdir='Asc',
-                                      include=["properties"],
+                                      **translate_query_to_v2_sort(query, sortby='Name', sortdir='Asc'),
+                                      **translate_query_to_v2_dataset_expansion(query),
                                       datasettypes=["~common.fastq"],
-                                      propertyfilters=["Input.Libraries", "Input.Runs", "BaseSpace.Metrics.FastQ"],
                                       inputbiosamples=[biosample_id])
 
 
@@ -251,15 +339,18 @@ class AppSessionsContext(CategoryContextDirect):
     NAME = "appsessions"
     ENTITY_CONTEXT = AppSessionContext
 
-    def list_raw(self, api: BasespaceApiFactory, page: Page):
+    def list_raw(self, api: BasespaceApiFactory, page: Page, query: ListQuery = DEFAULT_QUERY):
         offset, limit = translate_page_to_offset_and_limit(page)
-        params = {'sortby': 'Name', 'output_projects': [self.raw_obj.Id], 'offset': offset, 'limit': limit}
+        params = {'output_projects': [self.raw_obj.Id], 'offset': offset, 'limit': limit,
+                  **translate_query_to_v2_sort(query, sortby='Name')}
         return api.v2.get_v2_appsessions(**params).items
 
     @classmethod
-    def get_raw_entity_direct(cls, api: BasespaceApiFactory, result_id: str, page: Page):
+    def get_raw_entity_direct(cls, api: BasespaceApiFactory, result_id: str, page: Page,
+                              query: ListQuery = DEFAULT_QUERY):
         offset, limit = translate_page_to_offset_and_limit(page)
-        return api.v2.get_v2_datasets(offset=offset, limit=limit, appsessionids=[result_id])
+        return api.v2.get_v2_datasets(offset=offset, limit=limit, appsessionids=[result_id],
+                                      **translate_query_to_v2_sort(query))
 
 
 class ProjectContext(EntityContext, categories=[AppResultsContext,
@@ -272,13 +363,15 @@ class ProjectContext(EntityContext, categories=[AppResultsContext,
 class ProjectGroupContext(CategoryContextDirect):
     NAME = "projects"
     ENTITY_CONTEXT = ProjectContext
+    LAZY_RAW_OBJECT = LazyProject
 
-    def list_raw(self, api, page: Page):
-        params = translate_offset_and_limit_to_queryparams(page)
+    def list_raw(self, api, page: Page, query: ListQuery = DEFAULT_QUERY):
+        params = translate_offset_and_limit_to_queryparams(page, query)
         return api.base_api.getProjectByUser(queryPars=params)
 
     @classmethod
-    def get_raw_entity_direct(cls, api: BasespaceApiFactory, project_id: str, page: Page):
+    def get_raw_entity_direct(cls, api: BasespaceApiFactory, project_id: str, page: Page,
+                              query: ListQuery = DEFAULT_QUERY):
         params = translate_offset_and_limit_to_queryparams(page)
         return api.base_api.getProjectById(project_id, queryPars=params)
 
@@ -288,7 +381,7 @@ class UserContext(EntityContext, categories=[ProjectGroupContext]):
 
 
 def get_context_by_key_abstraction(self, key):
-    current_context = UserContext(self.basespace.base_api.getUserById('current'))
+    current_context = UserContext(self.get_current_user())
     if key == "":
         return current_context
     for tag in key.split("/"):
@@ -317,20 +410,54 @@ def get_last_direct_context(key):
     return latest_direct
 
 
-def get_context_by_key(api: BasespaceApiFactory, key: str, page: Page):
+def get_context_class_by_key(key):
+    """Resolve the context class of a key from the static hierarchy, without any API call."""
+    current_context = ROOT_CONTEXT
+    for path_step in key.split("/") if key else []:
+        current_context = current_context.get_lazy(path_step)
+    return current_context
+
+
+def get_endpoint_by_key(key):
+    """Name of the listing endpoint behind a key, the chain of its context classes."""
+    current_context = ROOT_CONTEXT
+    names = [current_context.__name__]
+    for path_step in key.split("/") if key else []:
+        current_context = current_context.get_lazy(path_step)
+        names.append(current_context.__name__)
+    return "/".join(names)
+
+
+def get_context_by_key(api: BasespaceApiFactory, key: str, page: Page, query: ListQuery = DEFAULT_QUERY,
+                       lazy: bool = False):
+    """Resolve the context of a key. With lazy, parent entities of the last one are not fetched when their id
+    is enough to go on (listing their children), their existence is then only checked by the next call."""
     rest_steps = key.split("/") if key else []
     latest_context = ROOT_CONTEXT(None)
     latest_direct = get_last_direct_context(key)
     if latest_direct is not None:
         latest_context_cls, rest_path = latest_direct
         path_steps = rest_path.split("/")
-        latest_context = latest_context_cls.get_entity_direct(api, path_steps[0], page)
         rest_steps = path_steps[1:]
+        if lazy and rest_steps:
+            latest_context = latest_context_cls.get_entity_lazy(api, path_steps[0], page, query)
+        else:
+            latest_context = latest_context_cls.get_entity_direct(api, path_steps[0], page, query)
     for path_step in rest_steps:
         latest_context = latest_context.get(api, path_step)
     return latest_context
 
 
+def is_not_found_error(error: Exception):
+    """Tell an entity that doesn't exist apart from a failed call (network, throttling, auth...)."""
+    if isinstance(error, errors.ResourceNotFound):
+        return True
+    status = getattr(error, 'status', None)
+    if status is not None:
+        return status == 404
+    return bool(NOT_FOUND_MESSAGE.search(str(error)))
+
+
 def translate_page_to_offset_and_limit(page: Page):
     offset, limit = DEFAULT_OFFSET, DEFAULT_LIMIT
     if page:
@@ -338,8 +465,77 @@ def translate_page_to_offset_and_limit(page: Page):
         limit = offset_end - offset
     return offset, limit
 
-def translate_offset_and_limit_to_queryparams(page: Page):
+def translate_offset_and_limit_to_queryparams(page: Page, query: ListQuery = DEFAULT_QUERY, **filters):
     offset, limit = translate_page_to_offset_and_limit(page)
-    params = qp({'Offset': offset, 'Limit': limit})
+    pars = {'Offset': offset, 'Limit': limit}
+    if query.ordered:
+        pars.update({'SortBy': 'Id', 'SortDir': 'Asc'})
+    pars.update(filters)
+    params = qp(pars)
     return params
 
+
+def translate_query_to_v1_file_filters(query: ListQuery):
+    filters = {}
+    if query.extensions:
+        filters['Extensions'] = ",".join(query.extensions)
+    return filters
+
+
+def translate_query_to_v2_sort(query: ListQuery, **default_sort):
+    if query.ordered:
+        return {'sortby': 'Id', 'sortdir': 'Asc'}
+    return default_sort
+
+
+def translate_query_to_v2_dataset_expansion(query: ListQuery):
+    if not query.expand:
+        return {}
+    return {'include': ["properties"], 'propertyfilters': DATASET_PROPERTY_FILTERS}
+
+
+def translate_query_to_v2_file_filters(query: ListQuery):
+    filters = {}
+    if query.extensions:
+        filters['extensions'] = ",".join(f".{extension}" for extension in query.extensions)
+    if len(query.names) == 1:
+        filters['name'] = query.names[0]
+    return filters
+
+
+def _may_be_entity_id(name: str) -> bool:
+    return any(context.validate_entity_id(name) for context in (CategoryContext, DatasetsContext))
+
+
+def list_query_from_patterns(patterns: Optional[Iterable[str]]) -> ListQuery:
+    """Translate shell-style file patterns into the part a server can filter on.
+
+    Patterns are OR-ed, so a single pattern the server can't express disables
+    the push down entirely. Extensions are reduced to their last suffix
+    (``*.fastq.gz`` -> ``gz``), the endpoints don't agree on compound ones.
+    Patterns match entity ids too, which the server name filter doesn't: a literal
+    that may be an id is never sent as a name.
+    """
+    patterns = list(patterns or ())
+    if not patterns:
+        return DEFAULT_QUERY
+    if not any(WILDCARD_CHARS.search(pattern) for pattern in patterns):
+        if len(patterns) != 1 or _may_be_entity_id(patterns[0]):
+            return DEFAULT_QUERY
+        return ListQuery(names=tuple(patterns))
+
+    extensions = []
+    for pattern in patterns:
+        match = EXTENSION_PATTERN.match(pattern)
+        if match is None:
+            return DEFAULT_QUERY
+        extension = match.group(1).rsplit(".", 1)[-1]
+        if extension not in extensions:
+            extensions.append(extension)
+    return ListQuery(extensions=tuple(extensions))
+
+
+
+def list_query_for_namespaces(namespaces: Optional[Iterable[str]], query: ListQuery = DEFAULT_QUERY) -> ListQuery:
+    """Heavy fields are only expanded when info namespaces other than basic are asked for."""
+    return query._replace(expand=bool(set(namespaces or ()) - {"basic"}))
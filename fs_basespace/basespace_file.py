@@ -0,0 +1,46 @@
+from smart_open.http import SeekableBufferedInputBase
+from smart_open.utils import make_range_string
+
+from .http_pool import http_get as shared_http_get
+
+
+class BaseSpaceFile(SeekableBufferedInputBase):
+    """ Seekable reader of a BaseSpace file over its presigned url.
+
+        readinto fills the caller's buffer through urllib3's readinto, so copy loops can reuse a single
+        preallocated buffer and the connection goes back to the pool once the body is read.
+        Requests go through http_get, the process wide keep-alive session by default, so they can be traced.
+    """
+
+    def __init__(self, url, mode="r", http_get=None, **kwargs):
+        self._http_get = http_get or shared_http_get
+        super().__init__(url, mode, **kwargs)
+
+    def _partial_request(self, start_pos=None):
+        if start_pos is not None:
+            self.headers.update({"range": make_range_string(start_pos)})
+        return self._http_get(self.url, auth=self.auth, stream=True, headers=self.headers, timeout=self.timeout)
+
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        if self.response is None or not len(view):
+            return 0
+
+        filled = 0
+        if len(self._read_buffer):
+            # bytes already buffered by a previous read()
+            chunk = self._read_buffer.read(len(view))
+            filled = len(chunk)
+            view[:filled] = chunk
+
+        while filled < len(view):
+            read = self.response.raw.readinto(view[filled:])
+            if not read:
+                break
+            filled += read
+
+        self._current_pos += filled
+        return filled
+
+    def readinto1(self, b):
+        return self.readinto(b)
@@ -0,0 +1,120 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from fs import errors
+from fs.glob import GlobMatch
+from fs.info import Info
+from fs.path import join
+from fs.wildcard import match
+
+from .basespace_context import CategoryContext
+from .basespace_context import FileContext
+from .basespace_context import MINIMAL_QUERY
+from .basespace_context import get_context_class_by_key
+from .basespace_context import is_not_found_error
+from .basespace_context import list_query_for_namespaces
+from .basespace_context import list_query_from_patterns
+
+WILDCARDS = "*?["
+
+
+def is_wildcard(segment):
+    return any(char in segment for char in WILDCARDS)
+
+
+def entity_matches(pattern, entity):
+    """Entities are matched by id, or by alias (the name shown in BaseSpace)."""
+    alias = entity.get_name()
+    return match(pattern, str(entity.get_id())) or (alias is not None and match(pattern, str(alias)))
+
+
+class BaseSpaceGlobber:
+    """ Expand a glob pattern level by level using the known BaseSpace hierarchy.
+
+        Category levels (appresults, files, datasets...) are expanded statically, literal ids are
+        followed without checking them, and only wildcard id segments are listed - concurrently on
+        the filesystem metadata pool, with the last segment pushed down as a listing filter.
+        A literal last segment is looked up as an id first, then matched against aliases like a
+        wildcard, so ``files/a.bam`` finds the files named a.bam.
+        Matches are yielded as soon as their level is listed, in no particular order.
+    """
+
+    def __init__(self, basespace_fs, pattern, namespaces=None):
+        self.fs = basespace_fs
+        self.segments = [segment for segment in pattern.strip("/").split("/") if segment]
+        self.namespaces = namespaces or ()
+
+    def __iter__(self):
+        if not self.segments:
+            return
+        executor = self.fs._get_executor()
+        pending = {executor.submit(self._expand, "/", 0)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                matches, branches = future.result()
+                yield from matches
+                for path, depth in branches:
+                    pending.add(executor.submit(self._expand, path, depth))
+
+    def _expand(self, path, depth):
+        """ Expand one directory, returns the final matches and the directories left to expand """
+        matches = []
+        branches = []
+        try:
+            context_cls = get_context_class_by_key(self.fs._path_to_key(path))
+        except (KeyError, ValueError):
+            # a literal segment the hierarchy can't hold (unknown category, malformed id)
+            return matches, branches
+        if issubclass(context_cls, FileContext):
+            return matches, branches
+
+        segment = self.segments[depth]
+        is_last = depth == len(self.segments) - 1
+
+        if not issubclass(context_cls, CategoryContext):
+            # entity level: the children are the static categories
+            for category in context_cls.CATEGORY_MAP.values():
+                if not match(segment, category.NAME):
+                    continue
+                child_path = join(path, category.NAME)
+                if is_last:
+                    matches.append(self._match(child_path, category(None)))
+                else:
+                    branches.append((child_path, depth + 1))
+            return matches, branches
+
+        if not is_wildcard(segment):
+            child_path = join(path, segment)
+            if not is_last:
+                branches.append((child_path, depth + 1))
+                return matches, branches
+            try:
+                matches.append(GlobMatch(child_path, self.fs.getinfo(child_path, self.namespaces)))
+                return matches, branches
+            except errors.ResourceNotFound:
+                # not an id of the directory, the literal may still be an alias: list it like a wildcard
+                pass
+
+        if is_last:
+            query = list_query_for_namespaces(self.namespaces, list_query_from_patterns([segment]))
+        else:
+            query = MINIMAL_QUERY
+        try:
+            entities = list(self.fs._iter_entities(self.fs._path_to_key(path), query))
+        except Exception as e:
+            # a literal parent that doesn't exist matches nothing, failed calls are not an empty result
+            if not is_not_found_error(e):
+                raise
+            return matches, branches
+        for entity in entities:
+            if not entity_matches(segment, entity):
+                continue
+            child_path = join(path, str(entity.get_id()))
+            if is_last:
+                matches.append(self._match(child_path, entity))
+            else:
+                branches.append((child_path, depth + 1))
+        return matches, branches
+
+    def _match(self, path, context):
+        return GlobMatch(path, Info(self.fs._info_from_object(context, self.namespaces)))
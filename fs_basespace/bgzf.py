@@ -0,0 +1,205 @@
+""" Streaming decompression of gzip and BGZF files.
+
+    BGZF (bgzip: *.vcf.gz, *.fastq.gz, BAM) is a series of independent gzip members of at most 64 KiB,
+    each announcing its compressed size in a 'BC' extra field. Blocks are cut from the raw stream as
+    they arrive and inflated concurrently on a thread pool (zlib releases the GIL), output stays in
+    order. Any other gzip stream is inflated sequentially with zlib.
+"""
+import io
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+GZIP_MAGIC = b"\x1f\x8b\x08"
+BGZF_HEADER_SIZE = 12  # up to and including XLEN
+BGZF_TRAILER_SIZE = 8  # CRC32, ISIZE
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """ Process wide decompression pool """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="basespace-bgzf")
+        return _executor
+
+
+def read_exactly(raw, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = raw.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def bgzf_block_size(header, extra):
+    """ Total size of a BGZF block from its header and extra field, None when it isn't one """
+    if len(header) < BGZF_HEADER_SIZE or not header.startswith(GZIP_MAGIC) or not header[3] & 4:
+        return None
+    position = 0
+    while position + 4 <= len(extra):
+        subfield_id, subfield_length = extra[position:position + 2], struct.unpack_from("<H", extra, position + 2)[0]
+        if subfield_id == b"BC" and subfield_length == 2:
+            return struct.unpack_from("<H", extra, position + 4)[0] + 1
+        position += 4 + subfield_length
+    return None
+
+
+def inflate_block(block, extra_length):
+    data = zlib.decompress(block[BGZF_HEADER_SIZE + extra_length:-BGZF_TRAILER_SIZE], -15)
+    crc, size = struct.unpack_from("<II", block, len(block) - BGZF_TRAILER_SIZE)
+    if size != len(data) or crc != zlib.crc32(data):
+        raise IOError("corrupted BGZF block")
+    return data
+
+
+class _DecompressedReader(io.RawIOBase):
+    def __init__(self, raw):
+        self._raw = raw
+        self._chunk = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def _next_chunk(self):
+        raise NotImplementedError("Should return the next decompressed chunk, b'' at the end")
+
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        while not self._chunk:
+            chunk = self._next_chunk()
+            if not chunk:
+                return 0
+            self._chunk = memoryview(chunk)
+        size = min(len(view), len(self._chunk))
+        view[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+
+class BgzfReader(_DecompressedReader):
+    """ Inflates BGZF blocks in parallel, keeping up to `window` blocks in flight """
+
+    def __init__(self, raw, head=b"", executor=None, window=None):
+        super().__init__(raw)
+        self._head = head
+        self._executor = executor or get_executor()
+        self._window = window or 2 * (os.cpu_count() or 4)
+        self._pending = deque()
+        self._eof = False
+
+    def _read(self, size):
+        data = self._head[:size]
+        self._head = self._head[size:]
+        if len(data) < size:
+            data += read_exactly(self._raw, size - len(data))
+        return data
+
+    def _submit_next_block(self):
+        header = self._read(BGZF_HEADER_SIZE)
+        if not header:
+            self._eof = True
+            return
+        extra_length = struct.unpack_from("<H", header, 10)[0] if len(header) == BGZF_HEADER_SIZE else 0
+        extra = self._read(extra_length)
+        block_size = bgzf_block_size(header, extra)
+        if block_size is None:
+            raise IOError("not a BGZF block")
+        block = header + extra + self._read(block_size - len(header) - len(extra))
+        if len(block) != block_size:
+            raise IOError("truncated BGZF block")
+        self._pending.append(self._executor.submit(inflate_block, block, extra_length))
+
+    def _next_chunk(self):
+        while not self._eof and len(self._pending) < self._window:
+            self._submit_next_block()
+        while self._pending:
+            data = self._pending.popleft().result()
+            if not self._eof:
+                self._submit_next_block()
+            if data:
+                return data
+        return b""
+
+    def close(self):
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        super().close()
+
+
+class GzipReader(_DecompressedReader):
+    """ Sequential inflation of (possibly multi member) gzip streams """
+
+    def __init__(self, raw, head=b"", chunk_size=DEFAULT_BUFFER_SIZE):
+        super().__init__(raw)
+        self._head = head
+        self._chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj(wbits=31)
+
+    def _next_chunk(self):
+        while True:
+            if self._head:
+                compressed, self._head = self._head, b""
+            else:
+                compressed = self._raw.read(self._chunk_size)
+            if not compressed:
+                return self._decompressor.flush()
+            data = self._decompressor.decompress(compressed)
+            while self._decompressor.eof and self._decompressor.unused_data:
+                unused = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(wbits=31)
+                data += self._decompressor.decompress(unused)
+            if data:
+                return data
+
+
+class _PrependedReader(_DecompressedReader):
+    """ Uncompressed data, passed through """
+
+    def __init__(self, raw, head=b"", chunk_size=DEFAULT_BUFFER_SIZE):
+        super().__init__(raw)
+        self._head = head
+        self._chunk_size = chunk_size
+
+    def _next_chunk(self):
+        if self._head:
+            data, self._head = self._head, b""
+            return data
+        return self._raw.read(self._chunk_size)
+
+
+def open_decompressed(raw, buffer_size=DEFAULT_BUFFER_SIZE, executor=None):
+    """ Wrap a binary stream in a reader of its decompressed content.
+        BGZF is inflated in parallel, plain gzip sequentially, anything else is passed through.
+    """
+    head = read_exactly(raw, BGZF_HEADER_SIZE)
+    if len(head) == BGZF_HEADER_SIZE and head.startswith(GZIP_MAGIC):
+        extra_length = struct.unpack_from("<H", head, 10)[0] if head[3] & 4 else 0
+        extra = read_exactly(raw, extra_length)
+        head += extra
+        if bgzf_block_size(head, extra) is not None:
+            reader = BgzfReader(raw, head, executor)
+        else:
+            reader = GzipReader(raw, head)
+    elif head.startswith(GZIP_MAGIC[:2]):
+        reader = GzipReader(raw, head)
+    else:
+        reader = _PrependedReader(raw, head)
+    return io.BufferedReader(reader, buffer_size)
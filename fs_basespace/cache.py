@@ -0,0 +1,158 @@
+import hashlib
+import hmac
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+_SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+
+class TTLCache:
+    """ Small thread safe mapping whose entries expire after `ttl` seconds.
+        When `maxsize` is reached the least recently used entry is evicted.
+    """
+
+    def __init__(self, maxsize=4096, ttl=60.0, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires_at = item
+            if expires_at <= self._timer():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def set(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+        expires_at = self._timer() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        if item is _MISSING:
+            return default
+        return item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def after_fork(self):
+        """ In a forked child: the lock may have been held by a thread of the parent, which doesn't exist here """
+        self._lock = threading.Lock()
+
+
+class SqliteTTLCache:
+    """ TTLCache counterpart kept in a sqlite file, shared by every process (and thread) opening the same
+        path, typically the workers of a node. Values are pickled, those which can't be are not cached.
+        Expiry uses wall clock time as it is compared across processes.
+
+        Unpickling runs code chosen by whoever wrote the file: values are signed with `secret` (HMAC-SHA256)
+        and only values signed with it are unpickled, others are ignored as missing.
+    """
+
+    _PURGE_EVERY = 1000
+
+    def __init__(self, path, ttl=300.0, timer=time.time, secret=b""):
+        self.path = path
+        self.ttl = ttl
+        self._timer = timer
+        self._secret = secret
+        self._local = threading.local()
+        self._sets = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, expires_at REAL, value BLOB)")
+
+    def _connection(self):
+        # sqlite connections can't be shared across threads, nor survive a fork
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key, default=None):
+        row = self._connection().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, self._timer())).fetchone()
+        if row is None:
+            return default
+        signature, data = row[0][:_SIGNATURE_SIZE], row[0][_SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, self._sign(data)):
+            return default
+        try:
+            return pickle.loads(data)
+        except Exception:
+            return default
+
+    def _sign(self, data):
+        return hmac.new(self._secret, data, hashlib.sha256).digest()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def set(self, key, value, ttl=None):
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        now = self._timer()
+        connection = self._connection()
+        connection.execute("INSERT OR REPLACE INTO entries (key, expires_at, value) VALUES (?, ?, ?)",
+                           (key, now + (self.ttl if ttl is None else ttl), self._sign(data) + data))
+        self._sets += 1
+        if self._sets % self._PURGE_EVERY == 0:
+            connection.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self._connection().execute("DELETE FROM entries WHERE key = ?", (key,))
+        return value
+
+    def discard(self, keys):
+        """ Remove the entries of keys, in a single transaction """
+        if not keys:
+            return
+        connection = self._connection()
+        connection.execute("BEGIN")
+        try:
+            connection.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def clear(self):
+        self._connection().execute("DELETE FROM entries")
+
+    def __len__(self):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM entries WHERE expires_at > ?", (self._timer(),)).fetchone()[0]
@@ -0,0 +1,43 @@
+""" Concurrent listing of BaseSpace trees, shared by copies, syncs, disk usage and tables.
+
+    Directories are listed on the metadata pool of the filesystem, a bounded number at a time, and handed out
+    in the order they were added: callers add the sub directories they want listed as results come in.
+"""
+from collections import deque
+
+from .basespace_context import MINIMAL_QUERY
+
+
+def _list_directory(src_fs, path, query):
+    return list(src_fs._iter_entities(src_fs._path_to_key(src_fs.validatepath(path)), query))
+
+
+class DirectoryCrawler:
+    """ Iterating yields (path, state, entities) of every directory added, breadth first. `state` is whatever
+        the caller attached to the directory with add(), for instance what it inherits from its parents.
+    """
+
+    def __init__(self, src_fs, query=MINIMAL_QUERY):
+        self._src_fs = src_fs
+        self._query = query
+        self._max_in_flight = 2 * src_fs.metadata_workers
+        self._waiting = deque()
+
+    def add(self, path, state=None):
+        self._waiting.append((path, state))
+
+    def __iter__(self):
+        executor = self._src_fs._get_executor()
+        in_flight = deque()
+        try:
+            while self._waiting or in_flight:
+                while self._waiting and len(in_flight) < self._max_in_flight:
+                    path, state = self._waiting.popleft()
+                    in_flight.append((path, state, executor.submit(_list_directory, self._src_fs, path,
+                                                                   self._query)))
+                path, state, future = in_flight.popleft()
+                yield path, state, future.result()
+        finally:
+            # when the crawl is abandoned, listings not started yet are dropped
+            for _, _, future in in_flight:
+                future.cancel()
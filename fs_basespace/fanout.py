@@ -0,0 +1,147 @@
+""" Bulk resolution of the datasets and files of many biosamples or appsessions of a project.
+
+    Walking project/biosamples/{id}/datasets/{id}/sequenced files makes one dataset query per biosample
+    and one file query per dataset, one after the other. Here the ids are batched into the multi-valued
+    inputbiosamples / appsessionids filters of a single dataset query, which is paged, and the files of
+    every dataset are listed concurrently on the metadata pool as soon as the dataset is known.
+    A dataset is attributed to its biosamples through its Input.Libraries property and to its appsession
+    through its AppSession field. A batch whose datasets can't all be attributed is queried again one id
+    at a time, the way the directory listings do.
+"""
+from concurrent.futures import as_completed
+
+from fs import errors
+from fs.info import Info
+from fs.path import join
+
+from .basespace_context import AppSessionsContext
+from .basespace_context import BioSampleGroupContext
+from .basespace_context import DatasetsContext
+from .basespace_context import FileContext
+from .basespace_context import MAX_PAGE_SIZE
+from .basespace_context import ProjectContext
+from .basespace_context import SequencedFileGroupContext
+from .basespace_context import get_context_class_by_key
+
+# ids per dataset query, keeps the query string well within url length limits
+DEFAULT_IDS_PER_QUERY = 100
+_FASTQ_DATASET_TYPES = ["~common.fastq"]
+_INPUT_LIBRARIES = "Input.Libraries"
+
+
+def _input_biosample_ids(dataset):
+    """ Ids of the biosamples a dataset was made from, None when the dataset doesn't carry them """
+    for dataset_property in getattr(getattr(dataset, "properties", None), "items", None) or ():
+        if dataset_property.name == _INPUT_LIBRARIES:
+            return {str(library.bio_sample.id) for library in dataset_property.sample_library_items or ()
+                    if getattr(library, "bio_sample", None) is not None}
+    return None
+
+
+def _appsession_ids(dataset):
+    app_session = getattr(dataset, "app_session", None)
+    return None if app_session is None else {str(app_session.id)}
+
+
+def _fetch_pages(fetch):
+    """ All the items of a paged v2 listing, fetch(page) returning one page """
+    items = []
+    offset = 0
+    while True:
+        page_items = fetch((offset, offset + MAX_PAGE_SIZE)).items or []
+        items.extend(page_items)
+        if len(page_items) < MAX_PAGE_SIZE:
+            return items
+        offset += MAX_PAGE_SIZE
+
+
+class _Fanout:
+    """ What differs between the biosample and the appsession resolutions """
+
+    def __init__(self, category, query_filters, owners_of):
+        self.category = category
+        self.query_filters = query_filters
+        self.owners_of = owners_of
+
+
+_BIOSAMPLES = _Fanout(
+    BioSampleGroupContext,
+    lambda ids: dict(inputbiosamples=ids, datasettypes=_FASTQ_DATASET_TYPES,
+                     include=["properties"], propertyfilters=[_INPUT_LIBRARIES]),
+    _input_biosample_ids)
+_APPSESSIONS = _Fanout(
+    AppSessionsContext,
+    lambda ids: dict(appsessionids=ids),
+    _appsession_ids)
+
+
+def _datasets_of_batch(src_fs, fanout, ids):
+    """ {id: [dataset]} of a batch of ids, from one paged query when the datasets can be attributed """
+    api = src_fs.basespace
+    wanted = set(ids)
+    datasets = _fetch_pages(lambda page: api.v2.get_v2_datasets(
+        offset=page[0], limit=page[1] - page[0], sortby="Id", sortdir="Asc", **fanout.query_filters(ids)))
+    by_id = {entity_id: [] for entity_id in ids}
+    for dataset in datasets:
+        owners = fanout.owners_of(dataset)
+        if owners is None:
+            break
+        for owner in owners & wanted:
+            by_id[owner].append(dataset)
+    else:
+        return by_id
+    return {entity_id: _fetch_pages(lambda page: fanout.category.get_raw_entity_direct(api, entity_id, page))
+            for entity_id in ids}
+
+
+def _dataset_files(src_fs, dataset_id):
+    api = src_fs.basespace
+    return _fetch_pages(lambda page: DatasetsContext.get_raw_entity_direct(api, dataset_id, page))
+
+
+def _resolve(src_fs, fanout, project_path, ids, namespaces, ids_per_query):
+    project_path = src_fs.validatepath(project_path)
+    try:
+        is_project = get_context_class_by_key(src_fs._path_to_key(project_path)) is ProjectContext
+    except Exception:
+        is_project = False
+    if not is_project:
+        raise errors.ResourceNotFound(project_path)
+
+    ids = list(dict.fromkeys(str(entity_id) for entity_id in ids))
+    executor = src_fs._get_executor()
+    batches = [executor.submit(_datasets_of_batch, src_fs, fanout, ids[start:start + ids_per_query])
+               for start in range(0, len(ids), ids_per_query)]
+
+    datasets_by_id = {}
+    file_listings = {}
+    for batch in as_completed(batches):
+        for entity_id, datasets in batch.result().items():
+            datasets_by_id[entity_id] = datasets
+            for dataset in datasets:
+                if dataset.id not in file_listings:
+                    file_listings[dataset.id] = executor.submit(_dataset_files, src_fs, dataset.id)
+
+    resolved = {}
+    for entity_id in ids:
+        resolved[entity_id] = {}
+        for dataset in datasets_by_id[entity_id]:
+            dataset_path = join(project_path, fanout.category.NAME, entity_id, DatasetsContext.NAME, dataset.id,
+                                SequencedFileGroupContext.NAME)
+            files = {}
+            for raw_file in file_listings[dataset.id].result():
+                info = Info(src_fs._info_from_object(FileContext(raw_file), namespaces))
+                files[join(dataset_path, info.name)] = info
+            resolved[entity_id][dataset.id] = files
+    return resolved
+
+
+def fastqs_for_biosamples(src_fs, project_path, biosample_ids, namespaces=(), ids_per_query=DEFAULT_IDS_PER_QUERY):
+    """ {biosample id: {dataset id: {file path: Info}}} of the fastq datasets of the biosamples """
+    return _resolve(src_fs, _BIOSAMPLES, project_path, biosample_ids, namespaces, ids_per_query)
+
+
+def datasets_for_appsessions(src_fs, project_path, appsession_ids, namespaces=(),
+                             ids_per_query=DEFAULT_IDS_PER_QUERY):
+    """ {appsession id: {dataset id: {file path: Info}}} of the datasets of the appsessions """
+    return _resolve(src_fs, _APPSESSIONS, project_path, appsession_ids, namespaces, ids_per_query)
@@ -0,0 +1,228 @@
+""" Node local cache of downloaded BaseSpace files, shared by the processes of a node.
+
+    Files are kept under the directory by file id: BaseSpace files don't change once uploaded, so an entry is
+    valid for as long as it is there with the expected size. The cache doesn't check BaseSpace permissions,
+    callers look entries up once the file resolved for their token (BASESPACEFS._open_cached_file). Entries
+    are read only and written by renaming a complete download into place, readers never see a partial file.
+    A lock file per download in progress (flock) makes concurrent processes and threads download a file once,
+    the others waiting for it.
+
+    The bytes held are counted in a small file updated by every download, under its own short lock. Once the
+    count exceeds the quota, the directory is scanned and the least recently used entries are removed (use is
+    recorded in their modification time), the scan setting the count right again. Open entries stay readable
+    after their removal.
+
+    Entries are put at their destination with a copy on write clone when the filesystem supports it (btrfs,
+    xfs), a copy otherwise: destinations never share the storage of an entry, they can be written and the
+    entry can be evicted.
+"""
+import fcntl
+import io
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+
+DEFAULT_FILE_CACHE_QUOTA = 100 * 1024 ** 3
+# ioctl cloning a whole file (linux), the destination shares the blocks of the source until either is written
+FICLONE = 0x40049409
+_COPY_BUFFER_SIZE = 8 * 1024 * 1024
+_UNSAFE_CHARACTERS = re.compile(r"[^A-Za-z0-9._-]")
+_PARTIAL_SUFFIX = ".part"
+_LOCKS_DIRECTORY = ".locks"
+# bytes held by the entries, also the lock of evictions
+_USAGE_NAME = "usage"
+
+
+def _partial_path(path):
+    """ Sibling of path written by this thread only, moved over path once complete """
+    return f"{path}.{os.getpid()}.{threading.get_ident()}{_PARTIAL_SUFFIX}"
+
+
+def _is_same_file(fd, path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    fd_stat = os.fstat(fd)
+    return (stat.st_dev, stat.st_ino) == (fd_stat.st_dev, fd_stat.st_ino)
+
+
+@contextmanager
+def _locked(path, remove=False):
+    """ Exclusive lock of a file, across processes and across threads. With remove, the lock file is removed
+        once done: callers that were waiting on it then lock a new file at the same path.
+    """
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # the previous holder may have removed the file while we were waiting
+            if _is_same_file(fd, path):
+                break
+        except BaseException:
+            os.close(fd)
+            raise
+        os.close(fd)
+    try:
+        yield
+    finally:
+        if remove:
+            _remove(path)
+        # closing releases the lock
+        os.close(fd)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _clone_into(source_file, destination_file):
+    """ Copy on write clone of source_file into the empty destination_file, False when not supported """
+    try:
+        destination_fd = destination_file.fileno()
+        if destination_file.tell() != 0:
+            return False
+        destination_file.flush()
+        fcntl.ioctl(destination_fd, FICLONE, source_file.fileno())
+    except (OSError, AttributeError, io.UnsupportedOperation):
+        return False
+    destination_file.seek(0, io.SEEK_END)
+    return True
+
+
+def copy_into(cached_file, file):
+    """ Write the content of an open entry into a binary file object """
+    if _clone_into(cached_file, file):
+        return
+    cached_file.seek(0)
+    shutil.copyfileobj(cached_file, file, _COPY_BUFFER_SIZE)
+
+
+def place(cached_file, destination):
+    """ Put the content of an open entry at the destination path, returns how: "clone" or "copy".
+        The destination is replaced, read only files included.
+    """
+    partial_path = _partial_path(destination)
+    try:
+        with open(partial_path, "wb") as partial_file:
+            if _clone_into(cached_file, partial_file):
+                how = "clone"
+            else:
+                cached_file.seek(0)
+                shutil.copyfileobj(cached_file, partial_file, _COPY_BUFFER_SIZE)
+                how = "copy"
+        os.replace(partial_path, destination)
+    except BaseException:
+        _remove(partial_path)
+        raise
+    return how
+
+
+class LocalFileCache:
+    """ Files keyed by BaseSpace file id, up to `quota` bytes in `directory` """
+
+    def __init__(self, directory, quota=DEFAULT_FILE_CACHE_QUOTA):
+        self.directory = directory
+        self.quota = quota
+        os.makedirs(os.path.join(directory, _LOCKS_DIRECTORY), exist_ok=True)
+
+    def _entry_name(self, file_id):
+        return _UNSAFE_CHARACTERS.sub('_', str(file_id))
+
+    def open(self, file_id, size=None):
+        """ The entry of a file opened for reading, None when it isn't cached (or doesn't have the size given) """
+        path = os.path.join(self.directory, self._entry_name(file_id))
+        try:
+            cached_file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        if size is not None and os.fstat(cached_file.fileno()).st_size != size:
+            cached_file.close()
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            # entry of another user, its use can't be recorded
+            pass
+        return cached_file
+
+    def fetch(self, file_id, size, download):
+        """ The entry of a file opened for reading. When missing, download(path) writes the file at path, once
+            on the node: callers asking for the same file meanwhile wait for it. None when the file is larger
+            than the quota.
+        """
+        cached_file = self.open(file_id, size)
+        if cached_file is not None or size > self.quota:
+            return cached_file
+        name = self._entry_name(file_id)
+        with _locked(os.path.join(self.directory, _LOCKS_DIRECTORY, name), remove=True):
+            cached_file = self.open(file_id, size)
+            if cached_file is not None:
+                return cached_file
+            path = os.path.join(self.directory, name)
+            partial_path = _partial_path(path)
+            try:
+                download(partial_path)
+                downloaded_size = os.path.getsize(partial_path)
+                if downloaded_size != size:
+                    raise IOError(f"downloaded {downloaded_size} bytes of file {file_id} instead of {size}")
+                os.chmod(partial_path, 0o444)
+                os.replace(partial_path, path)
+            except BaseException:
+                _remove(partial_path)
+                raise
+            cached_file = open(path, "rb")
+        if self._add_usage(size):
+            self.evict()
+        return cached_file
+
+    def _usage_path(self):
+        return os.path.join(self.directory, _LOCKS_DIRECTORY, _USAGE_NAME)
+
+    def _add_usage(self, size):
+        """ Count a new entry, True when the count goes over the quota or isn't known yet """
+        usage_path = self._usage_path()
+        with _locked(usage_path):
+            with open(usage_path, "r+") as usage_file:
+                usage = usage_file.read().strip()
+                if not usage:
+                    return True
+                usage = int(usage) + size
+                usage_file.seek(0)
+                usage_file.write(str(usage))
+                usage_file.truncate()
+        return usage > self.quota
+
+    def evict(self):
+        """ Remove the least recently used entries until the quota is met, and count the bytes left """
+        usage_path = self._usage_path()
+        with _locked(usage_path):
+            entries = []
+            with os.scandir(self.directory) as scanned:
+                for entry in scanned:
+                    if entry.name.startswith(".") or entry.name.endswith(_PARTIAL_SUFFIX):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.quota:
+                    break
+                _remove(path)
+                total_size -= size
+            with open(usage_path, "w") as usage_file:
+                usage_file.write(str(total_size))
+
+    def usage(self):
+        """ Bytes held by the entries """
+        with os.scandir(self.directory) as scanned:
+            return sum(entry.stat().st_size for entry in scanned
+                       if not entry.name.startswith(".") and not entry.name.endswith(_PARTIAL_SUFFIX))
@@ -0,0 +1,202 @@
+""" BAI / TBI / CSI index parsing and region to byte range resolution.
+
+    Offsets in these indexes are BGZF virtual offsets: the compressed offset of a block in the upper
+    48 bits, the offset inside its decompressed content in the lower 16 bits.
+"""
+import gzip
+import struct
+import zlib
+from typing import Dict, List, NamedTuple, Tuple
+
+from .bgzf import BGZF_HEADER_SIZE, bgzf_block_size, inflate_block, read_exactly
+
+BAI_MAGIC = b"BAI\1"
+TBI_MAGIC = b"TBI\1"
+CSI_MAGIC = b"CSI\1"
+BAM_MAGIC = b"BAM\1"
+INDEX_EXTENSIONS = (".bai", ".csi", ".tbi")
+MAX_BGZF_BLOCK_SIZE = 65536
+
+Chunk = Tuple[int, int]
+
+
+class ReferenceIndex(NamedTuple):
+    bins: Dict[int, List[Chunk]]
+    # smallest virtual offset of each bin (CSI) or of each 16 kbp window (BAI/TBI linear index)
+    bin_offsets: Dict[int, int]
+    linear_offsets: List[int]
+
+
+class GenomicIndex(NamedTuple):
+    min_shift: int
+    depth: int
+    references: List[ReferenceIndex]
+    # contig names when the index carries them (tabix), otherwise they come from the BAM header
+    names: List[str]
+
+    def ref_id(self, contig):
+        try:
+            return self.names.index(contig)
+        except ValueError:
+            raise KeyError(f"unknown contig: {contig}")
+
+    def chunks(self, ref_id, start, end):
+        """ Merged (begin, end) virtual offset chunks holding the records overlapping [start, end) """
+        reference = self.references[ref_id]
+        pseudo_bin = ((1 << (self.depth * 3 + 3)) - 1) // 7 + 1
+        min_offset = self._min_offset(reference, start)
+        chunks = sorted(chunk
+                        for bin_id in reg2bins(start, end, self.min_shift, self.depth)
+                        if bin_id != pseudo_bin
+                        for chunk in reference.bins.get(bin_id, ())
+                        if chunk[1] > min_offset)
+        merged = []
+        for chunk_begin, chunk_end in chunks:
+            if merged and chunk_begin <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], chunk_end))
+            else:
+                merged.append((chunk_begin, chunk_end))
+        return merged
+
+    def _min_offset(self, reference, start):
+        window = start >> self.min_shift
+        if reference.linear_offsets:
+            return reference.linear_offsets[min(window, len(reference.linear_offsets) - 1)]
+        leaf_bin = ((1 << (self.depth * 3)) - 1) // 7 + window
+        return reference.bin_offsets.get(leaf_bin, 0)
+
+
+def reg2bins(start, end, min_shift=14, depth=5):
+    """ Bins that may hold features overlapping [start, end), as in the SAM/CSI specifications """
+    bins = []
+    end -= 1
+    first_bin_of_level = 0
+    shift = min_shift + depth * 3
+    for level in range(depth + 1):
+        bins.extend(range(first_bin_of_level + (start >> shift), first_bin_of_level + (end >> shift) + 1))
+        shift -= 3
+        first_bin_of_level += 1 << (level * 3)
+    return bins
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.position)
+        self.position += struct.calcsize(fmt)
+        return values
+
+    def read(self, size):
+        data = self.data[self.position:self.position + size]
+        self.position += size
+        return data
+
+
+def _parse_tabix_names(reader, l_nm):
+    return [name.decode() for name in reader.read(l_nm).split(b"\0") if name]
+
+
+def _parse_references(reader, n_ref, with_bin_offsets):
+    references = []
+    for _ in range(n_ref):
+        bins, bin_offsets = {}, {}
+        n_bin, = reader.unpack("<i")
+        for _ in range(n_bin):
+            if with_bin_offsets:
+                bin_id, bin_offset, n_chunk = reader.unpack("<IQi")
+                bin_offsets[bin_id] = bin_offset
+            else:
+                bin_id, n_chunk = reader.unpack("<Ii")
+            chunk_values = reader.unpack(f"<{2 * n_chunk}Q")
+            bins[bin_id] = list(zip(chunk_values[::2], chunk_values[1::2]))
+        linear_offsets = []
+        if not with_bin_offsets:
+            n_intv, = reader.unpack("<i")
+            linear_offsets = list(reader.unpack(f"<{n_intv}Q"))
+        references.append(ReferenceIndex(bins, bin_offsets, linear_offsets))
+    return references
+
+
+def parse_index(data):
+    """ Parse a .bai, .tbi or .csi index (the two latter being BGZF compressed) """
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    reader = _Reader(data)
+    magic = reader.read(4)
+    if magic == BAI_MAGIC:
+        n_ref, = reader.unpack("<i")
+        return GenomicIndex(14, 5, _parse_references(reader, n_ref, False), [])
+    if magic == TBI_MAGIC:
+        n_ref, _format, _col_seq, _col_beg, _col_end, _meta, _skip, l_nm = reader.unpack("<8i")
+        names = _parse_tabix_names(reader, l_nm)
+        return GenomicIndex(14, 5, _parse_references(reader, n_ref, False), names)
+    if magic == CSI_MAGIC:
+        min_shift, depth, l_aux = reader.unpack("<3i")
+        aux = _Reader(reader.read(l_aux))
+        names = []
+        if l_aux >= 28:
+            *_, l_nm = aux.unpack("<7i")
+            names = _parse_tabix_names(aux, l_nm)
+        n_ref, = reader.unpack("<i")
+        return GenomicIndex(min_shift, depth, _parse_references(reader, n_ref, True), names)
+    raise ValueError("not a BAI, TBI or CSI index")
+
+
+def read_bam_reference_names(stream):
+    """ Reference names from the header of a decompressed BAM stream, only the header is read """
+    def unpack_int():
+        return struct.unpack("<i", read_exactly(stream, 4))[0]
+
+    if read_exactly(stream, 4) != BAM_MAGIC:
+        raise ValueError("not a BAM file")
+    read_exactly(stream, unpack_int())
+    names = []
+    for _ in range(unpack_int()):
+        names.append(read_exactly(stream, unpack_int()).rstrip(b"\0").decode())
+        unpack_int()
+    return names
+
+
+def chunk_byte_ranges(chunks, file_size, coalesce_gap):
+    """ Compressed byte ranges covering the chunks, ranges closer than coalesce_gap are merged """
+    ranges = []
+    for chunk_begin, chunk_end in chunks:
+        # the block the chunk ends in has to be fetched entirely, it is at most 64 KiB
+        byte_range = (chunk_begin >> 16, min((chunk_end >> 16) + MAX_BGZF_BLOCK_SIZE, file_size))
+        if ranges and byte_range[0] <= ranges[-1][1] + coalesce_gap:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], byte_range[1]))
+        else:
+            ranges.append(byte_range)
+    return ranges
+
+
+def decompress_chunk(fetched, chunk):
+    """ Decompressed bytes of a virtual offset chunk, `fetched` maps range starts to their bytes """
+    chunk_begin, chunk_end = chunk
+    block_offset, end_block_offset = chunk_begin >> 16, chunk_end >> 16
+    range_start = max(start for start in fetched if start <= block_offset)
+    data = fetched[range_start]
+
+    output = bytearray()
+    position = block_offset - range_start
+    while True:
+        if range_start + position == end_block_offset and not chunk_end & 0xffff:
+            break
+        header = data[position:position + BGZF_HEADER_SIZE]
+        extra_length, = struct.unpack_from("<H", header, 10)
+        extra = data[position + BGZF_HEADER_SIZE:position + BGZF_HEADER_SIZE + extra_length]
+        block_size = bgzf_block_size(header, extra)
+        if block_size is None:
+            raise zlib.error("not a BGZF block")
+        block = inflate_block(data[position:position + block_size], extra_length)
+        if range_start + position == end_block_offset:
+            output += block[:chunk_end & 0xffff]
+            break
+        output += block
+        position += block_size
+        if position >= len(data):
+            break
+    return bytes(output[chunk_begin & 0xffff:])
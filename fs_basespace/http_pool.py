@@ -0,0 +1,155 @@
+""" Process wide keep-alive sessions of the data path.
+
+    Presigned url reads (openbin handles, download parts, range reads) all go through one requests session
+    per process, so files opened one after the other reuse the TCP and TLS connections of the previous ones
+    instead of paying a handshake each. Up to `max_connections_per_host` idle connections are kept per host;
+    more concurrent requests to a host still get a connection, closed once released. Connections opened and
+    requests made are counted by host, see metrics().
+"""
+import os
+import threading
+import weakref
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 32
+DEFAULT_MAX_HOSTS = 16
+
+# connections are the handshakes made, the other requests were served over a kept-alive connection
+HttpMetrics = namedtuple("HttpMetrics", ["requests", "connections", "reused", "by_host"])
+HostMetrics = namedtuple("HostMetrics", ["requests", "connections"])
+
+# pools reset in forked children, see _after_fork_in_child
+_live_pools = weakref.WeakSet()
+
+
+class _Counters:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._connections = {}
+
+    def count_request(self, host):
+        with self._lock:
+            self._requests[host] = self._requests.get(host, 0) + 1
+
+    def count_connection(self, host):
+        with self._lock:
+            self._connections[host] = self._connections.get(host, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            hosts = set(self._requests) | set(self._connections)
+            by_host = {host: HostMetrics(self._requests.get(host, 0), self._connections.get(host, 0))
+                       for host in sorted(hosts)}
+        requests_made = sum(host.requests for host in by_host.values())
+        connections = sum(host.connections for host in by_host.values())
+        return HttpMetrics(requests_made, connections, max(requests_made - connections, 0), by_host)
+
+
+def _counting_pool_class(pool_class, counters):
+
+    class CountingConnectionPool(pool_class):
+
+        def _new_conn(self):
+            counters.count_connection(self.host)
+            return super()._new_conn()
+
+    return CountingConnectionPool
+
+
+class _CountingAdapter(HTTPAdapter):
+
+    def __init__(self, counters, **kwargs):
+        self._counters = counters
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        # a copy, urllib3's mapping is shared by every pool manager
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool_class(HTTPConnectionPool, self._counters),
+            "https": _counting_pool_class(HTTPSConnectionPool, self._counters),
+        }
+
+
+class HttpSessionPool:
+    """ Keep-alive session shared by the threads of a process, rebuilt in forked children """
+
+    def __init__(self, max_connections_per_host=DEFAULT_MAX_CONNECTIONS_PER_HOST, max_hosts=DEFAULT_MAX_HOSTS):
+        self.max_connections_per_host = max_connections_per_host
+        self.max_hosts = max_hosts
+        self._lock = threading.Lock()
+        self._pid = None
+        self._session = None
+        self._counters = _Counters()
+        _live_pools.add(self)
+
+    def after_fork(self):
+        """ Run in a forked child: locks held by parent threads at fork time would never be released there, and
+            connections inherited from the parent are not usable, nor counted. The session is dropped without
+            closing it, its connection pools have locks of their own.
+        """
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = os.getpid()
+        self._counters = _Counters()
+
+    def _get_session(self):
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    if self._pid != os.getpid():
+                        # connections inherited from the parent process are not usable, nor counted here
+                        self._counters = _Counters()
+                    session = requests.Session()
+                    adapter = _CountingAdapter(self._counters, pool_connections=self.max_hosts,
+                                               pool_maxsize=self.max_connections_per_host)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+                    self._pid = os.getpid()
+        return self._session
+
+    def get(self, url, **kwargs):
+        """ requests.get over the shared connections """
+        session = self._get_session()
+        self._counters.count_request(urlsplit(url).hostname)
+        return session.get(url, **kwargs)
+
+    def metrics(self):
+        """ HttpMetrics of the requests made by this process """
+        self._get_session()
+        return self._counters.snapshot()
+
+    def close(self):
+        """ Close the kept-alive connections, the next request opens new ones """
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+
+SESSIONS = HttpSessionPool()
+
+
+def http_get(url, **kwargs):
+    """ requests.get over the process wide connections of SESSIONS """
+    return SESSIONS.get(url, **kwargs)
+
+
+def metrics():
+    return SESSIONS.metrics()
+
+
+def _after_fork_in_child():
+    for pool in list(_live_pools):
+        pool.after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,58 @@
+import functools
+import threading
+
+
+class LazyRawObject:
+    """ Stands for a raw v1 entity known by its id only.
+
+        Listing its children goes straight to the id based api call (LIST_CALLS maps the raw object
+        method to it), any other attribute fetches the entity once, on first access.
+    """
+
+    LIST_CALLS = {}
+    # name of the api model class it stands for, listings of a placeholder and of the entity are the same
+    RAW_TYPE = None
+
+    def __init__(self, entity_id, fetch):
+        self.Id = entity_id
+        # looked up as a fallback of Id (v2 spelling), must not trigger the fetch either
+        self.id = entity_id
+        self._fetch = fetch
+        self._raw = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._raw is None:
+                self._raw = self._fetch()
+            return self._raw
+
+    def _list_by_id(self, api_method, api, queryPars=None):
+        return getattr(api, api_method)(self.Id, queryPars=queryPars)
+
+    def __getattr__(self, name):
+        # only reached for attributes the placeholder doesn't hold
+        if name.startswith("__") or name in ("_raw", "_fetch", "_lock"):
+            raise AttributeError(name)
+        if name in self.LIST_CALLS:
+            return functools.partial(self._list_by_id, self.LIST_CALLS[name])
+        return getattr(self._load(), name)
+
+    def __reduce__(self):
+        # the fetch closure holds live api clients, and pickling must not trigger the fetch
+        raise TypeError("lazy entity placeholders can't be pickled")
+
+
+class LazyProject(LazyRawObject):
+    LIST_CALLS = {"getAppResults": "getAppResultsByProject", "getSamples": "getSamplesByProject"}
+    RAW_TYPE = "Project"
+
+
+class LazyAppResult(LazyRawObject):
+    LIST_CALLS = {"getFiles": "getAppResultFiles"}
+    RAW_TYPE = "AppResult"
+
+
+class LazySample(LazyRawObject):
+    LIST_CALLS = {"getFiles": "getSampleFilesById"}
+    RAW_TYPE = "Sample"
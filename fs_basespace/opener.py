@@ -7,17 +7,93 @@ from __future__ import unicode_literals
 
 __all__ = ['BASESPACEFSOpener']
 
+import re
+
 from fs.opener import Opener
 from fs.opener.errors import OpenerError
 
 from ._basespacefs import BASESPACEFS
 
+_SIZE_PATTERN = re.compile(r"^(\d+)\s*([kmg]i?b?)?$", re.IGNORECASE)
+_SIZE_UNITS = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def _positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise ValueError("must be a positive integer")
+    return number
+
+
+def _non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise ValueError("must not be negative")
+    return number
+
+
+def _non_negative_float(value):
+    number = float(value)
+    if not number >= 0:
+        raise ValueError("must not be negative")
+    return number
+
+
+def _size(value):
+    """ A byte count, with an optional K / M / G (binary) unit: 65536, 64K, 8MiB """
+    match = _SIZE_PATTERN.match(value.strip())
+    if match is None:
+        raise ValueError("must be a size in bytes, optionally followed by K, M or G")
+    number = int(match.group(1)) * _SIZE_UNITS.get((match.group(2) or " ")[0].lower(), 1)
+    if number <= 0:
+        raise ValueError("must be a positive size")
+    return number
+
+
+def _boolean(value):
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError("must be true or false")
+
+
+# query parameters of the fs url: basespace://{key}:{secret}:{token}@{server}?download_workers=8!/projects
+URL_PARAMETERS = {
+    "metadata_workers": _positive_int,
+    "download_workers": _positive_int,
+    "part_size": _size,
+    "read_ahead": _size,
+    "download_memory": _size,
+    "cache_size": _non_negative_int,
+    "negative_cache_ttl": _non_negative_float,
+    "metadata_cache_path": str,
+    "metadata_cache_ttl": _non_negative_float,
+    "resolve_file_hrefs": _boolean,
+    "file_cache_path": str,
+    "file_cache_quota": _size,
+}
+
+
+def parse_url_parameters(params):
+    options = {}
+    for name, value in params.items():
+        if name not in URL_PARAMETERS:
+            raise OpenerError(f"Unknown basespace url parameter: {name}. "
+                              f"Supported: {', '.join(sorted(URL_PARAMETERS))}")
+        try:
+            options[name] = URL_PARAMETERS[name](value)
+        except ValueError as e:
+            raise OpenerError(f"Invalid basespace url parameter {name}={value}: {e}")
+    return options
+
 
 class BASESPACEFSOpener(Opener):
     protocols = ['basespace']
 
     def open_fs(self, fs_url, parse_result, writeable, create, cwd):
         client_secret, _, access_token = parse_result.password.partition(":")
+        options = parse_url_parameters(parse_result.params)
 
         try:
             basespace_fs = BASESPACEFS(
@@ -25,7 +101,8 @@ class BASESPACEFSOpener(Opener):
                 client_id=parse_result.username,
                 client_secret=client_secret,
                 access_token=access_token,
-                basespace_server=parse_result.resource
+                basespace_server=parse_result.resource,
+                **options
             )
         except ValueError as v:
             raise OpenerError(f'Could not open file system with given path. Reason: {v}')
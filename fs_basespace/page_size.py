@@ -0,0 +1,94 @@
+""" Per endpoint page sizes for the listings.
+
+    Every endpoint starts with the page size known to be safe everywhere. When a listing fills a page,
+    the next page probes twice that size, up to a ceiling, until the server refuses one (an error) or
+    silently caps it (a short page followed by more entities): the largest size accepted is then the
+    server maximum for that endpoint. Latency is measured on full pages, the size used is the one with
+    the best entities per second among those whose page latency fits the budget.
+"""
+import threading
+
+DEFAULT_LATENCY_BUDGET = 5.0
+MIN_PAGE_SIZE = 128
+# weight of the latest measure in the moving average of the page latency
+_SMOOTHING = 0.3
+
+
+class _Endpoint:
+    def __init__(self, initial):
+        self.accepted = initial
+        self.max_known = False
+        self.latencies = {}
+
+
+class PageSizer:
+
+    def __init__(self, initial, ceiling, latency_budget=DEFAULT_LATENCY_BUDGET):
+        self.initial = initial
+        self.ceiling = max(ceiling, initial)
+        self.latency_budget = latency_budget
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _endpoint(self, endpoint):
+        state = self._endpoints.get(endpoint)
+        if state is None:
+            state = self._endpoints[endpoint] = _Endpoint(self.initial)
+        return state
+
+    def size(self, endpoint):
+        """ Page size giving the best throughput within the latency budget """
+        with self._lock:
+            state = self._endpoint(endpoint)
+            within_budget = {size: latency for size, latency in state.latencies.items()
+                             if latency <= self.latency_budget and size <= state.accepted}
+            if within_budget:
+                return max(within_budget, key=lambda size: size / max(within_budget[size], 1e-6))
+            if state.latencies:
+                # every measured size is over budget, try smaller pages
+                return max(MIN_PAGE_SIZE, min(state.latencies) // 2)
+            return state.accepted
+
+    def next_size(self, endpoint, current):
+        """ Size of the page following a full one of `current` entities, bigger while probing """
+        with self._lock:
+            state = self._endpoint(endpoint)
+            if not state.max_known and current >= state.accepted and current * 2 <= self.ceiling:
+                return current * 2
+        return self.size(endpoint)
+
+    def is_probe(self, endpoint, size):
+        with self._lock:
+            return size > self._endpoint(endpoint).accepted
+
+    def record(self, endpoint, size, count, elapsed):
+        """ A page of `size` returned `count` entities in `elapsed` seconds """
+        with self._lock:
+            state = self._endpoint(endpoint)
+            if count == size:
+                state.accepted = max(state.accepted, size)
+                if size >= self.ceiling:
+                    state.max_known = True
+                previous = state.latencies.get(size)
+                state.latencies[size] = elapsed if previous is None else (
+                    previous + _SMOOTHING * (elapsed - previous))
+
+    def refused(self, endpoint, size):
+        """ The server failed a probe of `size`, the largest size accepted so far is its maximum """
+        with self._lock:
+            state = self._endpoint(endpoint)
+            if size > state.accepted:
+                state.max_known = True
+
+    def capped(self, endpoint, size):
+        """ The server returned a short page of `size` entities although there were more """
+        with self._lock:
+            state = self._endpoint(endpoint)
+            state.max_known = True
+            state.accepted = size
+            state.latencies = {measured: latency for measured, latency in state.latencies.items()
+                               if measured <= size}
+
+    def after_fork(self):
+        """ Fresh lock in a forked child, as TTLCache.after_fork """
+        self._lock = threading.Lock()
@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """ Coalesce identical concurrent calls.
+
+        The first caller of a key runs the call, callers arriving while it is in flight wait for it
+        and get the same result, or the same exception. Nothing is kept once the call is over.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def after_fork(self):
+        """ In a forked child: calls in flight belong to threads of the parent, they will never complete here """
+        self._lock = threading.Lock()
+        self._calls = {}
@@ -0,0 +1,130 @@
+""" Incremental mirror of a BaseSpace subtree into another filesystem.
+
+    A manifest stored in the destination records, for every mirrored file, the remote metadata it was
+    copied from. A sync downloads only the files that are new or whose metadata changed, skips the ones
+    still uploading, and checkpoints the manifest as copies complete, so an interrupted sync resumes
+    where it stopped.
+"""
+import json
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from fs import errors
+from fs.path import abspath
+from fs.path import join
+from fs.path import normpath
+
+from .transfer import _iter_files
+from .transfer import copy_file
+
+MANIFEST_NAME = ".basespace_manifest.json"
+MANIFEST_VERSION = 1
+_CHECKPOINT_EVERY = 50
+
+logger = logging.getLogger("BaseSpaceFs")
+
+SyncResult = namedtuple("SyncResult", ["copied", "unchanged", "uploading"])
+
+
+def _remote_entry(file_context):
+    created = file_context.get_date_created()
+    return {
+        "id": str(file_context.get_id()),
+        "size": file_context.get_size(),
+        "created": str(created) if created is not None else None,
+        "status": file_context.get_upload_status(),
+    }
+
+
+def read_manifest(dst_fs, manifest_path):
+    try:
+        manifest = json.loads(dst_fs.readtext(manifest_path))
+    except errors.ResourceNotFound:
+        return {}
+    except ValueError:
+        logger.warning(f"ignoring unreadable sync manifest {manifest_path}")
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def write_manifest(dst_fs, manifest_path, files):
+    """ Write the manifest next to its final path then move it over, readers never see a partial one """
+    temporary_path = manifest_path + ".tmp"
+    dst_fs.writetext(temporary_path, json.dumps({"version": MANIFEST_VERSION, "files": files}, sort_keys=True))
+    dst_fs.move(temporary_path, manifest_path, overwrite=True)
+
+
+def _is_unchanged(dst_fs, target_path, entry, mirrored):
+    if mirrored is None or any(mirrored.get(field) != entry[field] for field in ("id", "size", "created")):
+        return False
+    try:
+        return entry["size"] is None or dst_fs.getinfo(target_path, namespaces=["details"]).size == entry["size"]
+    except errors.ResourceNotFound:
+        return False
+
+
+def sync(src_fs, src_path, dst_fs, dst_path="/", workers=None, manifest_name=MANIFEST_NAME):
+    """ Mirror src_path of a BASESPACEFS into dst_path of dst_fs, see the module documentation.
+        Files removed from BaseSpace are dropped from the manifest but left in the destination.
+    """
+    workers = workers or src_fs.download_workers
+    src_path = abspath(normpath(src_path))
+    dst_fs.makedirs(dst_path, recreate=True)
+    manifest_path = join(dst_path, manifest_name)
+    mirrored = read_manifest(dst_fs, manifest_path)
+    files = dict(mirrored)
+    seen = set()
+    result = SyncResult([], [], [])
+    lock = threading.Lock()
+    completed_since_checkpoint = 0
+
+    def on_copied(relative_path, entry):
+        nonlocal completed_since_checkpoint
+        with lock:
+            files[relative_path] = entry
+            result.copied.append(relative_path)
+            completed_since_checkpoint += 1
+            if completed_since_checkpoint >= _CHECKPOINT_EVERY:
+                write_manifest(dst_fs, manifest_path, files)
+                completed_since_checkpoint = 0
+
+    def copy(path, target_path, relative_path, entry, file_context):
+        copy_file(src_fs, path, dst_fs, target_path, skip_same_size=False, context=file_context)
+        on_copied(relative_path, entry)
+
+    futures = set()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="basespace-sync") as executor:
+            for path, file_context in _iter_files(src_fs, src_path):
+                relative_path = path[len(src_path):].lstrip("/")
+                target_path = join(dst_path, relative_path)
+                if file_context is None:
+                    dst_fs.makedirs(target_path, recreate=True)
+                    continue
+
+                seen.add(relative_path)
+                entry = _remote_entry(file_context)
+                if entry["status"] not in (None, "complete"):
+                    logger.debug(f"sync skipped, upload not complete: {path}")
+                    result.uploading.append(relative_path)
+                elif _is_unchanged(dst_fs, target_path, entry, mirrored.get(relative_path)):
+                    result.unchanged.append(relative_path)
+                else:
+                    futures.add(executor.submit(copy, path, target_path, relative_path, entry, file_context))
+                    if len(futures) >= 2 * workers:
+                        # bounded backlog, failures surface early
+                        done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+            for future in futures:
+                future.result()
+        for relative_path in set(files) - seen:
+            del files[relative_path]
+    finally:
+        with lock:
+            write_manifest(dst_fs, manifest_path, files)
+    return result
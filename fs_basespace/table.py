@@ -0,0 +1,124 @@
+""" Columnar listings of BaseSpace directories and trees.
+
+    Rows are appended straight from the listed entities to per column lists, no Info objects are made,
+    and handed out in batches: plain column lists, NumPy arrays or Arrow record batches. Arrow and NumPy
+    are optional (`pip install fs-basespace[arrow]`), they are only imported when asked for.
+"""
+from fs.path import abspath
+from fs.path import join
+from fs.path import normpath
+
+from .basespace_context import CategoryContext
+from .basespace_context import FileContext
+from .basespace_context import MINIMAL_QUERY
+from .crawl import DirectoryCrawler
+
+COLUMNS = ("id", "name", "parent", "size", "created", "is_dir", "qc_status")
+OUTPUTS = ("columns", "numpy", "arrow")
+DEFAULT_BATCH_SIZE = 10000
+# missing sizes in NumPy batches, directories have none
+NUMPY_MISSING_SIZE = -1
+
+
+def _import_optional(module_name, extra):
+    try:
+        return __import__(module_name, fromlist=["_"])
+    except ImportError:
+        raise ImportError(f"{module_name} is required for this output, install fs-basespace[{extra}]")
+
+
+def arrow_schema():
+    pa = _import_optional("pyarrow", "arrow")
+    return pa.schema([
+        ("id", pa.string()),
+        ("name", pa.string()),
+        ("parent", pa.string()),
+        ("size", pa.int64()),
+        ("created", pa.string()),
+        ("is_dir", pa.bool_()),
+        ("qc_status", pa.string()),
+    ])
+
+
+def _to_numpy(columns):
+    np = _import_optional("numpy", "numpy")
+    return {
+        "id": np.array(columns["id"], dtype=object),
+        "name": np.array(columns["name"], dtype=object),
+        "parent": np.array(columns["parent"], dtype=object),
+        "size": np.array([NUMPY_MISSING_SIZE if size is None else size for size in columns["size"]], dtype=np.int64),
+        "created": np.array(columns["created"], dtype=object),
+        "is_dir": np.array(columns["is_dir"], dtype=bool),
+        "qc_status": np.array(columns["qc_status"], dtype=object),
+    }
+
+
+def _to_arrow(columns):
+    pa = _import_optional("pyarrow", "arrow")
+    return pa.RecordBatch.from_pydict(columns, schema=arrow_schema())
+
+
+_CONVERTERS = {"columns": lambda columns: columns, "numpy": _to_numpy, "arrow": _to_arrow}
+
+
+def _new_columns():
+    return {column: [] for column in COLUMNS}
+
+
+def _append_row(columns, entity, parent):
+    is_dir = not isinstance(entity, FileContext)
+    # category directories (appresults, files...) carry nothing but their name
+    is_category = isinstance(entity, CategoryContext)
+    created = None if is_category else entity.get_date_created()
+    columns["id"].append(str(entity.get_id()))
+    columns["name"].append(entity.get_name())
+    columns["parent"].append(parent)
+    columns["size"].append(None if is_dir else entity.get_size())
+    columns["created"].append(None if created is None else str(created))
+    columns["is_dir"].append(is_dir)
+    columns["qc_status"].append(None if is_category else getattr(entity.raw_obj, "qc_status", None))
+
+
+def _iter_directories(src_fs, path, recursive):
+    """ Yields (path, entities) of the directory and, when recursive, of every directory below it.
+        Sub directories are listed concurrently on the metadata pool, a bounded number at a time.
+    """
+    if not recursive:
+        yield path, src_fs._iter_entities(src_fs._path_to_key(src_fs.validatepath(path)), MINIMAL_QUERY)
+        return
+
+    crawler = DirectoryCrawler(src_fs)
+    crawler.add(path)
+    for directory, _, entities in crawler:
+        for entity in entities:
+            if not isinstance(entity, FileContext):
+                crawler.add(join(directory, str(entity.get_id())))
+        yield directory, entities
+
+
+def iter_table_batches(src_fs, path, recursive=False, batch_size=DEFAULT_BATCH_SIZE, output="columns"):
+    """ Stream the listing of path (and of its whole tree when recursive) as column batches of COLUMNS """
+    if output not in OUTPUTS:
+        raise ValueError(f"output must be one of {', '.join(OUTPUTS)}")
+    convert = _CONVERTERS[output]
+    path = abspath(normpath(path))
+    columns = _new_columns()
+    rows = 0
+    for directory, entities in _iter_directories(src_fs, path, recursive):
+        for entity in entities:
+            _append_row(columns, entity, directory)
+            rows += 1
+            if rows == batch_size:
+                yield convert(columns)
+                columns = _new_columns()
+                rows = 0
+    if rows:
+        yield convert(columns)
+
+
+def write_parquet(batches, where, **writer_options):
+    """ Write arrow batches from iter_table_batches to a Parquet file (a path or a writable binary file) """
+    pq = _import_optional("pyarrow.parquet", "arrow")
+    with pq.ParquetWriter(where, arrow_schema(), **writer_options) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
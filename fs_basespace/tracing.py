@@ -0,0 +1,371 @@
+""" Record and replay of the BaseSpace traffic of a BASESPACEFS, to profile it offline.
+
+    A TraceRecorder wraps the v1 and v2 api clients and the http requests of the data path. Every
+    call is kept with its start time, latency and size, and its result for api calls. Data requests
+    are kept twice: up to their response headers ("http"), and up to the end of their body or their
+    close ("http-body", with the bytes read). Secrets and presigned url signatures are redacted at any
+    depth, results holding objects the redactor doesn't know are not kept. File contents are not kept,
+    only their sizes. The trace is a gzipped pickle.
+
+    A TraceReplayer serves the same calls from a trace, with the recorded latencies (scaled by
+    latency_scale), body reads included. Data requests return zeros of the recorded length. No
+    BaseSpace access is needed.
+
+        fs = BASESPACEFS(..., tracer=TraceRecorder("run.trace"))
+        ...
+        fs.close()  # writes the trace
+        fs = BASESPACEFS(..., tracer=TraceReplayer("run.trace", latency_scale=0.5))
+"""
+import copy
+import datetime
+import decimal
+import gzip
+import os
+import pickle
+import re
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+
+import requests
+
+from .http_pool import http_get as shared_http_get
+
+TRACE_VERSION = 1
+REDACTED = "<redacted>"
+_URL_QUERY = re.compile(r"(https?://[^\s'\"?]+)\?[^\s'\"]*")
+# fields holding credentials, whatever their value
+_SECRET_NAME = re.compile(r"token|secret|password|authorization|credential|signature|api_?key", re.IGNORECASE)
+_PLAIN_TYPES = (int, float, bool, bytes, datetime.date, datetime.time, datetime.timedelta, decimal.Decimal)
+
+TraceEvent = namedtuple("TraceEvent", ["kind", "key", "started", "elapsed", "size", "result", "error"])
+
+
+class TraceMiss(LookupError):
+    """ The replayed run made a call that isn't in the trace """
+
+
+def _call_key(method, args, kwargs):
+    arguments = [_normalize(arg) for arg in args]
+    arguments += [f"{name}={_normalize(value)}" for name, value in sorted(kwargs.items())]
+    return f"{method}({', '.join(arguments)})"
+
+
+def _normalize(value):
+    """ Stable text of a call argument, identical when recording and replaying """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_normalize(item) for item in value) + "]"
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{key!r}: {_normalize(item)}" for key, item in sorted(value.items())) + "}"
+    if hasattr(value, "getParameterDict"):
+        return _normalize(value.getParameterDict())
+    entity_id = getattr(value, "Id", getattr(value, "id", None))
+    return f"{type(value).__name__}({entity_id})"
+
+
+def _http_key(url, headers):
+    headers = {name.lower(): value for name, value in (headers or {}).items()}
+    return f"GET {url.split('?', 1)[0]} range={headers.get('range')}"
+
+
+class _Redactor:
+    def __init__(self, secrets):
+        self._secrets = [secret for secret in secrets if secret]
+
+    def add(self, *secrets):
+        self._secrets.extend(secret for secret in secrets if secret and secret not in self._secrets)
+
+    def text(self, text):
+        text = _URL_QUERY.sub(rf"\1?{REDACTED}", text)
+        for secret in self._secrets:
+            text = text.replace(secret, REDACTED)
+        return text
+
+    def value(self, value, memo=None):
+        """ Redacted copy of an api result. Raises TypeError for objects it can't look into. """
+        if isinstance(value, str):
+            return self.text(value)
+        if value is None or isinstance(value, _PLAIN_TYPES):
+            return value
+        memo = {} if memo is None else memo
+        if id(value) in memo:
+            return memo[id(value)]
+        if isinstance(value, list):
+            redacted = memo[id(value)] = []
+            redacted.extend(self.value(item, memo) for item in value)
+        elif isinstance(value, tuple):
+            items = [self.value(item, memo) for item in value]
+            redacted = type(value)(*items) if hasattr(value, "_fields") else type(value)(items)
+        elif isinstance(value, (set, frozenset)):
+            redacted = type(value)(self.value(item, memo) for item in value)
+        elif isinstance(value, dict):
+            redacted = memo[id(value)] = {}
+            for key, item in value.items():
+                redacted[key] = self._field(str(key), item, memo)
+        elif hasattr(value, "__dict__") and not hasattr(value, "__slots__"):
+            redacted = memo[id(value)] = copy.copy(value)
+            for name, item in vars(value).items():
+                setattr(redacted, name, self._field(name, item, memo))
+        else:
+            raise TypeError(f"{type(value).__name__} can't be redacted")
+        return redacted
+
+    def _field(self, name, item, memo):
+        if "configuration" in name:
+            # sdk models keep a reference to the client configuration, credentials included
+            return None
+        if item is not None and _SECRET_NAME.search(name):
+            return REDACTED
+        return self.value(item, memo)
+
+
+class _TracedApi:
+    """ Proxy of an api client recording every method call """
+
+    def __init__(self, api, recorder, kind):
+        self._api = api
+        self._recorder = recorder
+        self._kind = kind
+
+    def __getattr__(self, name):
+        attribute = getattr(self._api, name)
+        if not callable(attribute):
+            return attribute
+
+        def traced(*args, **kwargs):
+            return self._recorder.call(self._kind, _call_key(name, args, kwargs), attribute, *args, **kwargs)
+
+        return traced
+
+
+class _ReplayedApi:
+    def __init__(self, replayer, kind):
+        self._replayer = replayer
+        self._kind = kind
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        def replayed(*args, **kwargs):
+            return self._replayer.replay(self._kind, _call_key(name, args, kwargs))
+
+        return replayed
+
+
+class _ApiFactory:
+    """ Stands for a BasespaceApiFactory, with traced or replayed clients """
+
+    def __init__(self, basespace_server, access_token, base_api, v2):
+        self.basespace_server = basespace_server
+        self.access_token = access_token
+        self.base_api = base_api
+        self.v2 = v2
+
+
+class TraceRecorder:
+
+    def __init__(self, path, secrets=()):
+        self.path = path
+        self._redactor = _Redactor(secrets)
+        self._lock = threading.Lock()
+        self._events = []
+        self._origin = time.monotonic()
+
+    def api_factory(self, create, basespace_server, access_token, client_secret):
+        """ Api clients made by create(), traced """
+        self._redactor.add(access_token, client_secret)
+        factory = create()
+        return _ApiFactory(basespace_server, access_token,
+                           _TracedApi(factory.base_api, self, "v1"), _TracedApi(factory.v2, self, "v2"))
+
+    def _add(self, kind, key, started, elapsed, size, result=None, error=None):
+        event = TraceEvent(kind, self._redactor.text(key), started - self._origin, elapsed, size, result,
+                           None if error is None else self._redactor.text(repr(error)))
+        with self._lock:
+            self._events.append(event)
+
+    def call(self, kind, key, fn, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._add(kind, key, started, time.monotonic() - started, 0, error=e)
+            raise
+        elapsed = time.monotonic() - started
+        try:
+            data = pickle.dumps(self._redactor.value(result), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # not redactable or not picklable, only the timing is kept
+            data = None
+        self._add(kind, key, started, elapsed, len(data or b""), result=data)
+        return result
+
+    def http_get(self, url, headers=None, **kwargs):
+        """ Shared session get recording the time to the response headers and the content length,
+            then the time to the end of the body
+        """
+        started = time.monotonic()
+        key = _http_key(url, headers)
+        try:
+            response = shared_http_get(url, headers=headers, **kwargs)
+        except Exception as e:
+            self._add("http", key, started, time.monotonic() - started, 0, error=e)
+            raise
+        size = int(response.headers.get("Content-Length", -1))
+        self._add("http", key, started, time.monotonic() - started, size,
+                  result=(response.status_code, response.headers.get("Accept-Ranges")))
+        self._trace_body(response, key, started)
+        return response
+
+    def _trace_body(self, response, key, started):
+        """ Add the "http-body" event once the body is read to its end, or when the response is closed """
+        raw = response.raw
+        read, close = raw.read, response.close
+        state = {"size": 0, "done": False}
+
+        def finish():
+            if not state["done"]:
+                state["done"] = True
+                self._add("http-body", key, started, time.monotonic() - started, state["size"])
+
+        def traced_read(amt=None, *args, **kwargs):
+            data = read(amt, *args, **kwargs)
+            state["size"] += len(data)
+            if amt is None or not data or getattr(raw, "length_remaining", None) == 0:
+                finish()
+            return data
+
+        def traced_close():
+            finish()
+            close()
+
+        # urllib3's readinto and stream read through read
+        raw.read = traced_read
+        response.close = traced_close
+
+    def save(self):
+        """ Write the trace, through a temporary file so an interrupted save keeps the previous one """
+        with self._lock:
+            events = list(self._events)
+        temporary_path = f"{self.path}.tmp"
+        with gzip.open(temporary_path, "wb") as trace_file:
+            pickle.dump({"version": TRACE_VERSION, "events": events}, trace_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, self.path)
+
+    def close(self):
+        self.save()
+
+
+def load_trace(path):
+    with gzip.open(path, "rb") as trace_file:
+        trace = pickle.load(trace_file)
+    if trace.get("version") != TRACE_VERSION:
+        raise ValueError(f"unsupported trace version: {trace.get('version')}")
+    return trace["events"]
+
+
+class TraceReplayer:
+
+    def __init__(self, path, latency_scale=1.0, sleep=time.sleep):
+        self.path = path
+        self.latency_scale = latency_scale
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._calls = defaultdict(deque)
+        for event in load_trace(path):
+            self._calls[(event.kind, event.key)].append(event)
+
+    def api_factory(self, create, basespace_server, access_token, client_secret):
+        """ Replayed api clients, create is not called """
+        return _ApiFactory(basespace_server, access_token, _ReplayedApi(self, "v1"), _ReplayedApi(self, "v2"))
+
+    def _next_event(self, kind, key):
+        with self._lock:
+            events = self._calls.get((kind, key))
+            if not events:
+                raise TraceMiss(f"{kind} {key}")
+            # calls are served in their recorded order, the last one answers any extra identical call
+            return events.popleft() if len(events) > 1 else events[0]
+
+    def replay(self, kind, key):
+        event = self._next_event(kind, key)
+        self._sleep(event.elapsed * self.latency_scale)
+        if event.error is not None:
+            raise IOError(event.error)
+        if event.result is None:
+            raise TraceMiss(f"{kind} {key}: result was not recorded")
+        return pickle.loads(event.result)
+
+    def http_get(self, url, headers=None, **kwargs):
+        event = self._next_event("http", _http_key(url, headers))
+        self._sleep(event.elapsed * self.latency_scale)
+        if event.error is not None:
+            raise requests.ConnectionError(event.error)
+        status_code, accept_ranges = event.result
+        body_delay = 0
+        if self._calls.get(("http-body", event.key)):
+            # the rest of the body time is spent when its last byte is read
+            body_delay = max(self._next_event("http-body", event.key).elapsed - event.elapsed, 0) * self.latency_scale
+        return _ReplayedResponse(status_code, event.size, accept_ranges, lambda: self._sleep(body_delay))
+
+    def close(self):
+        pass
+
+
+class _ZeroStream:
+    """ Response body made of zeros, on_end() is called when its last byte is read """
+
+    def __init__(self, size, on_end=None):
+        self._remaining = max(size, 0)
+        self._on_end = on_end
+
+    def _served(self, size):
+        self._remaining -= size
+        if not self._remaining and self._on_end is not None:
+            on_end, self._on_end = self._on_end, None
+            on_end()
+
+    def readinto(self, b):
+        size = min(len(b), self._remaining)
+        memoryview(b)[:size] = bytes(size)
+        self._served(size)
+        return size
+
+    def read(self, size=-1):
+        size = self._remaining if size is None or size < 0 else min(size, self._remaining)
+        self._served(size)
+        return bytes(size)
+
+    def close(self):
+        self._remaining = 0
+        self._on_end = None
+
+
+class _ReplayedResponse:
+    def __init__(self, status_code, size, accept_ranges, on_end=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = {"Content-Length": str(size)} if size >= 0 else {}
+        if accept_ranges:
+            self.headers["Accept-Ranges"] = accept_ranges
+        self.raw = _ZeroStream(size, on_end)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} replayed error")
+
+    def iter_content(self, chunk_size=1):
+        while chunk := self.raw.read(chunk_size):
+            yield chunk
+
+    def close(self):
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
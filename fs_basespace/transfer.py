@@ -0,0 +1,303 @@
+""" Fast copy of BaseSpace files into other filesystems.
+
+    Files are resolved once, fetched in ranges with large reusable buffers and written with positional
+    writes when the destination has a system path; other destinations get a single stream to upload
+    (multipart on filesystems such as S3FS). BASESPACEFS.copy_to and copydir_to go through it, fs.copy is
+    left alone and copies through openbin.
+    With a node file cache, files are fetched into it and put at the destination from there.
+
+    Downloads go through a WritePipeline: network readers fill a bounded pool of reusable buffers and a
+    writer thread drains them, so a slow disk doesn't stall the sockets and a slow network doesn't leave
+    the disk idle. Readers wait for a free buffer once the pool (the memory ceiling) is in use.
+"""
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fs import errors
+from fs.path import abspath
+from fs.path import join
+from fs.path import normpath
+
+from .basespace_context import CategoryContext, FileContext
+from .basespace_file import BaseSpaceFile
+from .crawl import DirectoryCrawler
+from .file_cache import _partial_path
+from .file_cache import _remove
+from .file_cache import place
+from .http_pool import http_get as shared_http_get
+
+DEFAULT_BUFFER_SIZE = 8 * 1024 * 1024
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+_HTTP_TIMEOUT = 60
+
+logger = logging.getLogger("BaseSpaceFs")
+
+_tlocal = threading.local()
+
+
+def _get_buffer(size):
+    """ One buffer per thread, reused by every part the thread copies """
+    buffer = getattr(_tlocal, "buffer", None)
+    if buffer is None or len(buffer) < size:
+        buffer = _tlocal.buffer = bytearray(size)
+    return memoryview(buffer)[:size]
+
+
+def _fill(raw, view):
+    filled = 0
+    while filled < len(view):
+        read = raw.readinto(view[filled:])
+        if not read:
+            break
+        filled += read
+    return filled
+
+
+class WritePipeline:
+    """ Hands the data of readers over to a writer thread calling write_at(offset, view).
+
+        Buffers come from a pool of up to max(2, memory_limit // buffer_size) reused bytearrays, allocated
+        as needed, feed() waits for one to be written back when they are all in use. Chunks are written in
+        the order they were fed: a single reader suits sequential files, concurrent readers need positional
+        writes.
+        Used as a context manager: leaving it waits for the last writes and raises the writer's error.
+    """
+
+    def __init__(self, write_at, buffer_size=DEFAULT_BUFFER_SIZE, memory_limit=DEFAULT_MEMORY_LIMIT):
+        self._write_at = write_at
+        self.buffer_size = buffer_size
+        self._free = queue.Queue()
+        self._capacity = max(2, memory_limit // buffer_size)
+        self._allocated = 0
+        self._allocate_lock = threading.Lock()
+        self._filled = queue.Queue()
+        self._error = None
+        self._writer = threading.Thread(target=self._drain, name="basespace-writer", daemon=True)
+        self._writer.start()
+
+    def _drain(self):
+        while (item := self._filled.get()) is not None:
+            offset, buffer, size = item
+            try:
+                if self._error is None:
+                    self._write_at(offset, buffer[:size])
+            except Exception as e:
+                # buffers are still given back, so readers never wait on a dead writer
+                self._error = e
+            finally:
+                self._free.put(buffer)
+
+    def _acquire(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._allocate_lock:
+            if self._allocated < self._capacity:
+                self._allocated += 1
+                return memoryview(bytearray(self.buffer_size))
+        return self._free.get()
+
+    def feed(self, raw, offset=0, end=None):
+        """ Read raw (anything with readinto) into pool buffers until end, or its end of data when None """
+        while end is None or offset < end:
+            buffer = self._acquire()
+            if self._error is not None:
+                self._free.put(buffer)
+                raise IOError(f"write failed: {self._error}")
+            wanted = self.buffer_size if end is None else min(self.buffer_size, end - offset)
+            try:
+                filled = _fill(raw, buffer[:wanted])
+            except BaseException:
+                self._free.put(buffer)
+                raise
+            if not filled:
+                self._free.put(buffer)
+                if end is None:
+                    return offset
+                raise IOError(f"unexpected end of data at offset {offset} of {end}")
+            self._filled.put((offset, buffer, filled))
+            offset += filled
+        return offset
+
+    def close(self):
+        if self._writer.is_alive():
+            self._filled.put(None)
+            self._writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self._error is None:
+            # nothing more is written once a reader failed
+            self._error = exc_value
+            self.close()
+            return
+        self.close()
+        if exc_type is None and self._error is not None:
+            raise IOError(f"write failed: {self._error}") from self._error
+
+
+def _range_request(url, start, end, http_get):
+    headers = {"Range": f"bytes={start}-{end - 1}", "Accept-Encoding": "identity"}
+    response = http_get(url, headers=headers, stream=True, timeout=_HTTP_TIMEOUT)
+    try:
+        response.raise_for_status()
+        if start and response.status_code != 206:
+            raise IOError(f"range requests are not supported for {url}")
+    except Exception:
+        response.close()
+        raise
+    return response
+
+
+def read_range_into(url, start, end, write_at, buffer_size=DEFAULT_BUFFER_SIZE, http_get=shared_http_get):
+    """ Fetch the bytes [start, end) of url, handing every filled buffer to write_at(offset, view) """
+    with _range_request(url, start, end, http_get) as response:
+        buffer = _get_buffer(min(buffer_size, end - start))
+        offset = start
+        while offset < end:
+            filled = _fill(response.raw, buffer[:min(len(buffer), end - offset)])
+            if not filled:
+                raise IOError(f"unexpected end of data at offset {offset} of {end}")
+            write_at(offset, buffer[:filled])
+            offset += filled
+
+
+def read_range(url, start, end, buffer_size=DEFAULT_BUFFER_SIZE, http_get=shared_http_get):
+    """ The bytes [start, end) of url """
+    data = bytearray(end - start)
+
+    def write_at(offset, view):
+        data[offset - start:offset - start + len(view)] = view
+
+    read_range_into(url, start, end, write_at, buffer_size, http_get)
+    return data
+
+
+def _pwrite_all(fd, view, offset):
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def download_to_syspath(url, size, sys_path, part_size, workers, buffer_size=DEFAULT_BUFFER_SIZE,
+                        http_get=shared_http_get, memory_limit=DEFAULT_MEMORY_LIMIT):
+    """ Download url into a local file, parts are fetched concurrently and written in place by a writer thread.
+        The parts go to a sibling file moved over sys_path once complete: an interrupted download leaves sys_path
+        as it was, never a full size file with holes.
+    """
+    partial_path = _partial_path(sys_path)
+    try:
+        _download_parts(url, size, partial_path, part_size, workers, buffer_size, http_get, memory_limit)
+        os.replace(partial_path, sys_path)
+    except BaseException:
+        _remove(partial_path)
+        raise
+
+
+def _download_parts(url, size, sys_path, part_size, workers, buffer_size, http_get, memory_limit):
+    fd = os.open(sys_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        os.ftruncate(fd, size)
+        parts = [(start, min(start + part_size, size)) for start in range(0, size, part_size)]
+        # small files don't need full sized buffers
+        buffer_size = max(1, min(buffer_size, size))
+        with WritePipeline(lambda offset, view: _pwrite_all(fd, view, offset), buffer_size, memory_limit) as pipeline:
+
+            def copy_part(part):
+                start, end = part
+                with _range_request(url, start, end, http_get) as response:
+                    pipeline.feed(response.raw, start, end)
+
+            if len(parts) <= 1 or workers <= 1:
+                for part in parts:
+                    copy_part(part)
+            else:
+                with ThreadPoolExecutor(max_workers=min(workers, len(parts))) as executor:
+                    list(executor.map(copy_part, parts))
+    finally:
+        os.close(fd)
+
+
+def _has_same_size(dst_fs, dst_path, size):
+    try:
+        return dst_fs.getinfo(dst_path, namespaces=["details"]).size == size
+    except errors.ResourceNotFound:
+        return False
+
+
+def copy_file(src_fs, src_path, dst_fs, dst_path, skip_same_size=True, context=None):
+    """ Copy a single BaseSpace file into dst_fs, returns False when it was skipped.
+        `context` is the file context when it is already known, from a listing for instance.
+    """
+    # a file of the node cache is copied without asking BaseSpace for its url
+    cached_file = src_fs._open_cached_file(src_path, context)
+    if cached_file is not None:
+        size = os.fstat(cached_file.fileno()).st_size
+        if skip_same_size and _has_same_size(dst_fs, dst_path, size):
+            cached_file.close()
+            logger.debug(f"copy skipped, same size at destination: {src_path}")
+            return False
+    else:
+        resolved = src_fs._resolve_file(src_path, context)
+        if skip_same_size and resolved.size is not None and _has_same_size(dst_fs, dst_path, resolved.size):
+            logger.debug(f"copy skipped, same size at destination: {src_path}")
+            return False
+        cached_file = src_fs._fetch_cached_file(src_path, resolved)
+
+    if cached_file is not None:
+        with cached_file:
+            if dst_fs.hassyspath(dst_path):
+                place(cached_file, dst_fs.getsyspath(dst_path))
+            else:
+                dst_fs.upload(dst_path, cached_file)
+    elif dst_fs.hassyspath(dst_path) and resolved.size is not None:
+        download_to_syspath(resolved.url, resolved.size, dst_fs.getsyspath(dst_path),
+                            src_fs.part_size, src_fs.download_workers, http_get=src_fs._http_get,
+                            memory_limit=src_fs.download_memory)
+    else:
+        with BaseSpaceFile(resolved.url, "rb", buffer_size=DEFAULT_BUFFER_SIZE, timeout=_HTTP_TIMEOUT,
+                           http_get=src_fs._http_get) as read_file:
+            dst_fs.upload(dst_path, read_file)
+    return True
+
+
+def _iter_files(src_fs, src_path):
+    """ Walk a BaseSpace tree listing every page, yields the fs paths of directories and files with their context.
+        Directories are listed concurrently on the metadata pool of src_fs, a directory comes before its content.
+    """
+    crawler = DirectoryCrawler(src_fs)
+    crawler.add(src_path)
+    for dir_path, _, entities in crawler:
+        yield dir_path, None
+        for entity in entities:
+            entity_path = join(dir_path, str(entity.get_id()))
+            if isinstance(entity, FileContext):
+                yield entity_path, entity
+            elif isinstance(entity, CategoryContext) or entity.CATEGORY_MAP:
+                crawler.add(entity_path)
+
+
+def copy_dir(src_fs, src_path, dst_fs, dst_path, workers=None, skip_same_size=True):
+    """ Copy a BaseSpace directory tree into dst_fs, files are copied concurrently.
+        Returns the number of files actually copied.
+    """
+    workers = workers or src_fs.download_workers
+    src_path = abspath(normpath(src_path))
+    futures = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="basespace-copy") as executor:
+        for path, file_context in _iter_files(src_fs, src_path):
+            relative_path = path[len(src_path):].lstrip("/")
+            target_path = join(dst_path, relative_path)
+            if file_context is not None:
+                futures.append(executor.submit(copy_file, src_fs, path, dst_fs, target_path, skip_same_size,
+                                               file_context))
+            else:
+                dst_fs.makedirs(target_path, recreate=True)
+    return sum(1 for future in futures if future.result())
@@ -0,0 +1,108 @@
+""" Disk usage of BaseSpace trees.
+
+    Directories are listed concurrently on the metadata pool and file sizes are summed straight from the
+    listing pages, no file is looked up on its own. Every entity directory whose listing entry carries a
+    signature (its modification date and total size) has the byte counts of its subtree cached under it:
+    a later crawl reuses them as long as the signature is unchanged and only lists the subtrees that changed.
+"""
+from collections import namedtuple
+
+from fs.path import abspath
+from fs.path import iteratepath
+from fs.path import join
+from fs.path import normpath
+
+from .basespace_context import CategoryContext
+from .basespace_context import FileContext
+from .crawl import DirectoryCrawler
+
+# partial totals of a crawl, bytes and file counts by group path, complete once the last directory is counted
+DiskUsage = namedtuple("DiskUsage", ["totals", "files", "directories", "complete"])
+
+
+def _signature(entity):
+    if isinstance(entity, (FileContext, CategoryContext)):
+        return None
+    modified, total_size = entity.get_date_modified(), entity.get_total_size()
+    if modified is None and total_size is None:
+        return None
+    return str(modified), total_size
+
+
+def group_of(path, by):
+    """ Path of the entity the bytes of a directory are counted for: the entity listed under the first
+        `by` category of the path (by="appresults" -> /projects/1/appresults/10), None when there is none.
+    """
+    parts = iteratepath(path)
+    if by in parts[:-1]:
+        return abspath(join(*parts[:parts.index(by) + 2]))
+    return None
+
+
+class _Crawl:
+
+    def __init__(self, path, by):
+        self.path = path
+        self.by = by
+        self.totals = {}
+        self.files = 0
+        self.directories = 0
+        # signed subtrees being listed: path -> (signature, {directory: (bytes, files)})
+        self.fresh = {}
+
+    def count(self, directory, size, files, signed_parents):
+        group = group_of(directory, self.by) if self.by else None
+        if group is not None or size:
+            # bytes outside of any group are counted for the crawled path
+            group = group or self.path
+            self.totals[group] = self.totals.get(group, 0) + size
+        self.files += files
+        self.directories += 1
+        for parent in signed_parents:
+            self.fresh[parent][1][directory] = (size, files)
+
+    def snapshot(self, complete=False):
+        return DiskUsage(dict(self.totals), self.files, self.directories, complete)
+
+
+def iter_du(src_fs, path, by=None):
+    """ Yields a DiskUsage after every directory counted, the last one complete """
+    path = abspath(normpath(path))
+    cache = src_fs._du_cache
+    crawl = _Crawl(path, by)
+    crawler = DirectoryCrawler(src_fs)
+    # the signed directories above a directory, their cached totals include it
+    crawler.add(path, ())
+    for directory, signed_parents, entities in crawler:
+        size = files = 0
+        for entity in entities:
+            if isinstance(entity, FileContext):
+                size += entity.get_size() or 0
+                files += 1
+                continue
+            child = join(directory, str(entity.get_id()))
+            signature = _signature(entity)
+            cached = cache.get(child) if signature is not None else None
+            if cached is not None and cached[0] == signature:
+                for cached_directory, (cached_size, cached_files) in cached[1].items():
+                    crawl.count(cached_directory, cached_size, cached_files, signed_parents)
+                continue
+            if signature is not None:
+                crawl.fresh[child] = (signature, {})
+                crawler.add(child, signed_parents + (child,))
+            else:
+                crawler.add(child, signed_parents)
+        crawl.count(directory, size, files, signed_parents)
+        yield crawl.snapshot()
+
+    # only subtrees crawled to the end are cached
+    for subtree, entry in crawl.fresh.items():
+        cache.set(subtree, entry)
+    yield crawl.snapshot(complete=True)
+
+
+def du(src_fs, path, by=None):
+    usage = None
+    for usage in iter_du(src_fs, path, by):
+        pass
+    return usage
@@ -36,6 +36,7 @@ setup(
     classifiers=CLASSIFIERS,
     description="Illumina Basespace filesystem for PyFilesystem2",
     install_requires=REQUIREMENTS,
+    extras_require={"arrow": ["pyarrow"], "numpy": ["numpy"]},
     license="MIT",
     long_description=DESCRIPTION,
     packages=find_packages(),
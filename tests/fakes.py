@@ -0,0 +1,263 @@
+# coding: utf-8
+
+"""
+    Offline stand-ins of the BaseSpace api clients, to run a BASESPACEFS without BaseSpace
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+
+from fs_basespace.cache import TTLCache
+
+FILES_URL = "https://files.example"
+
+
+class RawEntity:
+    """ v1 entity with the fields of the api responses """
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class RawFile(RawEntity):
+
+    def getFileUrl(self, api):
+        api.record("getFileUrl", self.Id)
+        return f"{api.files_url}/{self.Id}"
+
+
+class RawFileGroup(RawEntity):
+    """ appresult or sample """
+
+    def getFiles(self, api, queryPars=None):
+        return api.list_files(self.Id, queryPars)
+
+
+class RawProject(RawEntity):
+
+    def getAppResults(self, api, queryPars=None):
+        return api.getAppResultsByProject(self.Id, queryPars)
+
+    def getSamples(self, api, queryPars=None):
+        return api.getSamplesByProject(self.Id, queryPars)
+
+
+def _page(entities, queryPars):
+    params = queryPars.getParameterDict() if queryPars is not None else {}
+    offset = params.get("Offset", 0)
+    return entities[offset:offset + params.get("Limit", 512)]
+
+
+class FakeBaseApi:
+    """ v1 client over a static tree: {project id: {"appresults": {id: {file id: (name, size)}},
+        "samples": {id: {file id: (name, size)}}}}. Every call is recorded in `calls` with its parameters.
+    """
+
+    def __init__(self, projects, files_url=FILES_URL):
+        self.files_url = files_url
+        self.calls = []
+        self._lock = threading.Lock()
+        self.projects = {}
+        self.groups = {}
+        self.files = {}
+        self.group_files = {}
+        self.project_groups = {}
+        for project_id, categories in projects.items():
+            self.projects[project_id] = RawProject(Id=project_id, Name=f"project {project_id}",
+                                                   DateCreated="2020-01-01", UserOwnedBy="1")
+            for category in ("appresults", "samples"):
+                groups = self.project_groups[(project_id, category)] = []
+                for group_id, files in categories.get(category, {}).items():
+                    group = RawFileGroup(Id=group_id, Name=f"{category} {group_id}", DateCreated="2020-01-01")
+                    self.groups[group_id] = group
+                    groups.append(group)
+                    self.group_files[group_id] = []
+                    for file_id, (name, size) in files.items():
+                        # v1 hrefs are api paths, not download urls
+                        raw_file = RawFile(Id=file_id, Name=name, Size=size, DateCreated="2020-01-02",
+                                           UploadStatus="complete", HrefContent=f"v1pre3/files/{file_id}/content")
+                        self.files[file_id] = raw_file
+                        self.group_files[group_id].append(raw_file)
+
+    def record(self, method, *args, queryPars=None):
+        with self._lock:
+            self.calls.append((method, args, dict(queryPars.getParameterDict()) if queryPars is not None else None))
+
+    def calls_of(self, method):
+        with self._lock:
+            return [call for call in self.calls if call[0] == method]
+
+    @staticmethod
+    def _get(entities, entity_id):
+        if entity_id not in entities:
+            raise Exception(f"404 Not Found: {entity_id}")
+        return entities[entity_id]
+
+    def getUserById(self, user_id):
+        self.record("getUserById", user_id)
+        return RawEntity(Id="1", Name="user")
+
+    def getProjectByUser(self, queryPars=None):
+        self.record("getProjectByUser", queryPars=queryPars)
+        return _page(list(self.projects.values()), queryPars)
+
+    def getProjectById(self, project_id, queryPars=None):
+        self.record("getProjectById", project_id, queryPars=queryPars)
+        return self._get(self.projects, project_id)
+
+    def getAppResultsByProject(self, project_id, queryPars=None):
+        self.record("getAppResultsByProject", project_id, queryPars=queryPars)
+        return _page(self.project_groups.get((project_id, "appresults"), []), queryPars)
+
+    def getSamplesByProject(self, project_id, queryPars=None):
+        self.record("getSamplesByProject", project_id, queryPars=queryPars)
+        return _page(self.project_groups.get((project_id, "samples"), []), queryPars)
+
+    def getAppResultById(self, group_id, queryPars=None):
+        self.record("getAppResultById", group_id, queryPars=queryPars)
+        return self._get(self.groups, group_id)
+
+    def getSampleById(self, group_id, queryPars=None):
+        self.record("getSampleById", group_id, queryPars=queryPars)
+        return self._get(self.groups, group_id)
+
+    def list_files(self, group_id, queryPars=None):
+        self.record("getFiles", group_id, queryPars=queryPars)
+        files = self._get(self.group_files, group_id)
+        extensions = (queryPars.getParameterDict() if queryPars is not None else {}).get("Extensions")
+        if extensions:
+            files = [raw_file for raw_file in files if raw_file.Name.rsplit(".", 1)[-1] in extensions.split(",")]
+        return _page(files, queryPars)
+
+    def getAppResultFiles(self, group_id, queryPars=None):
+        return self.list_files(group_id, queryPars)
+
+    def getSampleFilesById(self, group_id, queryPars=None):
+        return self.list_files(group_id, queryPars)
+
+    def getFileById(self, file_id, queryPars=None):
+        self.record("getFileById", file_id, queryPars=queryPars)
+        return self._get(self.files, file_id)
+
+
+class FakeV2Api:
+    """ v2 client over static datasets: {dataset id: {file id: (name, size)}}, calls recorded as in FakeBaseApi """
+
+    def __init__(self, datasets, files_url=FILES_URL):
+        self.files_url = files_url
+        self.calls = []
+        self.datasets = datasets
+
+    def get_v2_datasets(self, **params):
+        self.calls.append(("get_v2_datasets", params))
+        return RawEntity(items=[RawEntity(id=dataset_id, name=f"dataset {dataset_id}", date_created="2020-01-01")
+                                for dataset_id in self.datasets])
+
+    def get_v2_datasets_id_files(self, id, **params):
+        self.calls.append(("get_v2_datasets_id_files", dict(params, id=id)))
+        if id not in self.datasets:
+            raise Exception(f"404 Not Found: {id}")
+        # presigned urls only when asked for, api urls otherwise
+        resolved = params.get("filehrefcontentresolution")
+        files = [RawEntity(id=file_id, name=name, size=size, date_created="2020-01-02", upload_status="complete",
+                           href_content=f"{self.files_url}/{file_id}" if resolved
+                           else f"https://api.example/v2/files/{file_id}/content")
+                 for file_id, (name, size) in self.datasets[id].items()]
+        if "name" in params:
+            files = [raw_file for raw_file in files if raw_file.name == params["name"]]
+        offset = params.get("offset", 0)
+        return RawEntity(items=files[offset:offset + params.get("limit", 512)])
+
+
+class FakeApiFactory:
+
+    def __init__(self, base_api, basespace_server, access_token, v2=None):
+        self.base_api = base_api
+        self.v2 = v2
+        self.basespace_server = basespace_server
+        self.access_token = access_token
+
+
+def use_fake_api(test_case, base_api, v2=None):
+    """ Filesystems created until the end of the test talk to base_api (and v2) """
+    patcher = mock.patch("fs_basespace._basespacefs.BasespaceApiFactory",
+                         lambda client_id, client_secret, server, token: FakeApiFactory(base_api, server, token, v2))
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
+
+
+class FakeFs:
+    """ Side of BASESPACEFS used by the listing helpers (table, du, fanout), over a static tree of contexts:
+        {key: [entity contexts]}. Listed keys are recorded in `listed`.
+    """
+
+    metadata_workers = 2
+
+    def __init__(self, tree=None, v2=None):
+        self.tree = tree or {}
+        self.listed = []
+        self.basespace = SimpleNamespace(v2=v2)
+        self._du_cache = TTLCache()
+        self.executor = ThreadPoolExecutor(max_workers=self.metadata_workers)
+
+    def validatepath(self, path):
+        return path
+
+    def _path_to_key(self, path):
+        return path.strip("/")
+
+    def _iter_entities(self, key, query=None):
+        self.listed.append(key)
+        return iter(self.tree[key])
+
+    def _get_executor(self):
+        return self.executor
+
+    def _info_from_object(self, obj, namespaces):
+        return {"basic": {"name": obj.get_id(), "is_dir": False, "alias": obj.get_name()}}
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class _FileHandler(BaseHTTPRequestHandler):
+    """ keep-alive GET of server.files with byte ranges, as the presigned urls of BaseSpace files """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        data = self.server.files.get(self.path.lstrip("/").split("?")[0])
+        if data is None:
+            self.send_error(404)
+            return
+        start, end = 0, len(data)
+        if "Range" in self.headers:
+            first, last = self.headers["Range"].split("=")[1].split("-")
+            start, end = int(first), int(last) + 1 if last else len(data)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        self.wfile.write(data[start:end])
+
+    def log_message(self, *args):
+        pass
+
+
+class FileServer:
+    """ Local http server of file contents by file id, to pass as files_url of a FakeBaseApi """
+
+    def __init__(self, files):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _FileHandler)
+        self._server.files = files
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -37,6 +37,24 @@ FILE_2_ID = 11710715827
 FILE_2_SIZE_IN_BYTES = 50934554
 FILE_2_NAME = 'Myeloid-RNA-Brain-Rep1_S1_L001_R2_001.fastq.gz'
 
+# query parameters expanding the properties of datasets
+DATASET_PROJECTION_PARAMETERS = {'include', 'propertyfilters'}
+
+
+def query_without_projection(recorded, sent):
+    """ The dataset requests were recorded expanded. A basic-only listing asks for the same datasets without their
+        properties, the recorded response holds everything it reads.
+    """
+    def selection(request):
+        return sorted((name, value) for name, value in request.query if name not in DATASET_PROJECTION_PARAMETERS)
+    assert selection(recorded) == selection(sent)
+
+
+# replays basic-only dataset listings from the expanded recordings, the exact requests are checked offline
+# by tests/test_basespacefs.py
+projection_vcr = vcr.VCR(match_on=['method', 'scheme', 'host', 'port', 'path', 'query_without_projection'])
+projection_vcr.register_matcher('query_without_projection', query_without_projection)
+
 
 class TestBaseSpace(unittest.TestCase):
     connection_template = '{scheme}://{client_key}:{client_secret}:{app_token}@{server}!/'
@@ -271,7 +289,7 @@ class TestBaseSpace(unittest.TestCase):
             basespace_fs.getinfo(no_such_folder_name)
 
     # listdir
-    @vcr.use_cassette('listdir/existing_dir_datasets_v2.yaml', cassette_library_dir=cassette_lib_dir)
+    @projection_vcr.use_cassette('listdir/existing_dir_datasets_v2.yaml', cassette_library_dir=cassette_lib_dir)
     def test_listdir_existing_dir_datasets(self):
         # prepare
         expected_list = [EMEDGENE_DATASET_ID]
@@ -626,7 +644,7 @@ class TestBaseSpace(unittest.TestCase):
 
         self.assertGreaterEqual(len(resources), 24)
 
-    @vcr.use_cassette('scandir/biosample_folder_v2.yaml', cassette_library_dir=cassette_lib_dir)
+    @projection_vcr.use_cassette('scandir/biosample_folder_v2.yaml', cassette_library_dir=cassette_lib_dir)
     def test_scandir_biosample_folder(self):
         # prepare
         expected_list = [{'name': 'datasets', 'directory': True, 'alias': 'datasets'}]
@@ -652,7 +670,7 @@ class TestBaseSpace(unittest.TestCase):
 
         self.assertListEqual(resources, expected_list)
 
-    @vcr.use_cassette('scandir/datasets_folder_v2.yaml', cassette_library_dir=cassette_lib_dir)
+    @projection_vcr.use_cassette('scandir/datasets_folder_v2.yaml', cassette_library_dir=cassette_lib_dir)
     def test_scandir_datasets_folder(self):
         # prepare
         expected_list = [
@@ -925,7 +943,7 @@ class TestBaseSpace(unittest.TestCase):
         self.assertGreaterEqual(len(full_resources_list), len(expected_list))
         self.assertListEqual(full_resources_list, expected_list)
 
-    @vcr.use_cassette('scandir/datasets_folder_pagination_v2.yaml', cassette_library_dir=cassette_lib_dir)
+    @projection_vcr.use_cassette('scandir/datasets_folder_pagination_v2.yaml', cassette_library_dir=cassette_lib_dir)
     def test_scandir_datasets_folder_pagination(self):
         # prepare
         expected_list = [
@@ -0,0 +1,152 @@
+# coding: utf-8
+
+"""
+    Offline tests of the basespace context layer helpers
+"""
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from fs.errors import ResourceNotFound
+
+from fs_basespace.basespace_context import DEFAULT_QUERY
+from fs_basespace.basespace_context import FileGroupContext
+from fs_basespace.basespace_context import MINIMAL_QUERY
+from fs_basespace.basespace_context import ListQuery
+from fs_basespace.basespace_context import is_not_found_error
+from fs_basespace.basespace_context import list_query_for_namespaces
+from fs_basespace.basespace_context import list_query_from_patterns
+from fs_basespace.basespace_context import translate_offset_and_limit_to_queryparams
+from fs_basespace.basespace_context import translate_query_to_v1_file_filters
+from fs_basespace.basespace_context import translate_query_to_v2_dataset_expansion
+from fs_basespace.basespace_context import translate_query_to_v2_file_filters
+from fs_basespace.basespace_context import translate_query_to_v2_sort
+from fs_basespace.lazy_entity import LazyAppResult, LazySample
+
+from tests.fakes import FakeApiFactory, RawEntity
+
+
+class TestListQuery(unittest.TestCase):
+
+    def test_no_patterns(self):
+        self.assertEqual(list_query_from_patterns(None), DEFAULT_QUERY)
+        self.assertEqual(list_query_from_patterns([]), DEFAULT_QUERY)
+
+    def test_extension_patterns(self):
+        query = list_query_from_patterns(['*.bam', '*.fastq.gz', '*.vcf.gz'])
+        self.assertEqual(query, ListQuery(extensions=('bam', 'gz')))
+
+    def test_literal_name(self):
+        query = list_query_from_patterns(['sample.bam'])
+        self.assertEqual(query, ListQuery(names=('sample.bam',)))
+
+    def test_literal_id_is_not_a_name(self):
+        self.assertEqual(list_query_from_patterns(['12345']), DEFAULT_QUERY)
+        self.assertEqual(list_query_from_patterns(['ds.ac82a306af3847f2b53ecb695bc22400']), DEFAULT_QUERY)
+
+    def test_unsupported_pattern_disables_push_down(self):
+        self.assertEqual(list_query_from_patterns(['*.bam', 'S1_*']), DEFAULT_QUERY)
+        self.assertEqual(list_query_from_patterns(['a.bam', 'b.bam']), DEFAULT_QUERY)
+
+    def test_v1_query_parameters(self):
+        query = ListQuery(extensions=('bam', 'gz'))
+        params = translate_offset_and_limit_to_queryparams((10, 20), query, **translate_query_to_v1_file_filters(query))
+        self.assertEqual(params.getParameterDict(), {'Offset': 10, 'Limit': 10, 'Extensions': 'bam,gz'})
+
+    def test_v1_ordered_query_parameters(self):
+        params = translate_offset_and_limit_to_queryparams((0, 5), ListQuery(ordered=True))
+        self.assertEqual(params.getParameterDict(), {'Offset': 0, 'Limit': 5, 'SortBy': 'Id', 'SortDir': 'Asc'})
+
+    def test_v2_sort(self):
+        self.assertEqual(translate_query_to_v2_sort(DEFAULT_QUERY, sortby='Name'), {'sortby': 'Name'})
+        self.assertEqual(translate_query_to_v2_sort(DEFAULT_QUERY), {})
+        self.assertEqual(translate_query_to_v2_sort(ListQuery(ordered=True), sortby='Name'),
+                         {'sortby': 'Id', 'sortdir': 'Asc'})
+
+    def test_v2_file_filters(self):
+        self.assertEqual(translate_query_to_v2_file_filters(DEFAULT_QUERY), {})
+        self.assertEqual(translate_query_to_v2_file_filters(ListQuery(extensions=('bam',), names=('a.bam',))),
+                         {'extensions': '.bam', 'name': 'a.bam'})
+
+    def test_namespaces_projection(self):
+        self.assertEqual(list_query_for_namespaces(None), MINIMAL_QUERY)
+        self.assertEqual(list_query_for_namespaces(['basic']), MINIMAL_QUERY)
+        self.assertEqual(list_query_for_namespaces(['basic', 'details']), DEFAULT_QUERY)
+        self.assertEqual(list_query_for_namespaces([], ListQuery(extensions=('bam',))),
+                         ListQuery(extensions=('bam',), expand=False))
+
+    def test_v2_dataset_expansion(self):
+        self.assertEqual(translate_query_to_v2_dataset_expansion(MINIMAL_QUERY), {})
+        self.assertEqual(translate_query_to_v2_dataset_expansion(DEFAULT_QUERY)['include'], ['properties'])
+
+
+class ApiError(Exception):
+    def __init__(self, status):
+        super().__init__(f"status {status}")
+        self.status = status
+
+
+class TestNotFoundError(unittest.TestCase):
+
+    def test_not_found(self):
+        self.assertTrue(is_not_found_error(ResourceNotFound('projects/1')))
+        self.assertTrue(is_not_found_error(ApiError(404)))
+        self.assertTrue(is_not_found_error(Exception('Error with api server 404: Not Found')))
+        self.assertTrue(is_not_found_error(Exception('BASESPACE.NOT_FOUND')))
+
+    def test_failed_call(self):
+        self.assertFalse(is_not_found_error(ApiError(500)))
+        self.assertFalse(is_not_found_error(Exception('Read timed out')))
+
+
+class _Group(RawEntity):
+
+    def getFiles(self, api, queryPars=None):
+        # both listings must be in flight at once
+        self.barrier.wait(timeout=5)
+        return [RawEntity(Id=f"{self.kind}-file", Name="a.bam")]
+
+
+class AppResult(_Group):
+    kind = "appresult"
+
+
+class Sample(_Group):
+    kind = "sample"
+
+
+class TestListFlights(unittest.TestCase):
+
+    def list_files(self, *groups):
+        api = FakeApiFactory(None, "https://api.example", "token")
+        with ThreadPoolExecutor(len(groups)) as executor:
+            listings = executor.map(lambda group: FileGroupContext(group).list(api, (0, 10)), groups)
+            return [[entity.get_id() for entity in listing] for listing in listings]
+
+    def test_parents_of_different_types_with_the_same_id(self):
+        barrier = threading.Barrier(2)
+
+        listings = self.list_files(AppResult(Id="10", barrier=barrier), Sample(Id="10", barrier=barrier))
+
+        self.assertEqual(listings, [["appresult-file"], ["sample-file"]])
+
+    def test_lazy_parents_of_different_types_with_the_same_id(self):
+        calls = []
+
+        def list_by_id(group_id, queryPars=None):
+            calls.append(group_id)
+            barrier.wait(timeout=5)
+            return [RawEntity(Id="file", Name="a.bam")]
+
+        barrier = threading.Barrier(2)
+        api = FakeApiFactory(RawEntity(getAppResultFiles=list_by_id, getSampleFilesById=list_by_id),
+                             "https://api.example", "token")
+        lazy_appresult = LazyAppResult("10", fetch=None)
+        lazy_sample = LazySample("10", fetch=None)
+        with ThreadPoolExecutor(2) as executor:
+            listings = list(executor.map(lambda group: FileGroupContext(group).list(api, (0, 10)),
+                                         [lazy_appresult, lazy_sample]))
+
+        self.assertEqual(calls, ["10", "10"])
+        self.assertEqual([[entity.get_id() for entity in listing] for listing in listings], [["file"], ["file"]])
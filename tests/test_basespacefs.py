@@ -0,0 +1,546 @@
+# coding: utf-8
+
+"""
+    Offline tests of BASESPACEFS over fake api clients
+"""
+
+import io
+import multiprocessing
+import os
+import pickle
+import shutil
+import threading
+import tempfile
+import unittest
+
+import fs._bulk
+import fs.copy
+from fs.memoryfs import MemoryFS
+from fs.osfs import OSFS
+
+from fs.errors import FSError, ResourceNotFound
+
+from fs_basespace import BASESPACEFS
+from fs_basespace.basespace_context import DATASET_PROPERTY_FILTERS, DEFAULT_LIMIT, FLIGHTS, MAX_PAGE_SIZE
+
+from tests.fakes import FakeBaseApi, FakeV2Api, FileServer, use_fake_api
+
+
+def make_fs(**options):
+    return BASESPACEFS(client_id="id", client_secret="secret", access_token="token", **options)
+
+
+def file_tree(count):
+    return {f"{index}": (f"f{index}.bam", index) for index in range(1000, 1000 + count)}
+
+
+class TestCurrentUser(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeBaseApi({"1": {"appresults": {"10": file_tree(2)}}})
+        use_fake_api(self, self.api)
+        self.fs = make_fs()
+        self.addCleanup(self.fs.close)
+
+    def test_looked_up_once_across_threads(self):
+        barrier = threading.Barrier(4)
+        users = []
+
+        def lookup():
+            barrier.wait()
+            users.append(self.fs.get_current_user())
+
+        threads = [threading.Thread(target=lookup) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.fs.listdir("/projects/1/appresults/10/files")
+
+        self.assertEqual(len(users), 4)
+        self.assertTrue(all(user is users[0] for user in users))
+        self.assertEqual(self.api.calls_of("getUserById"), [("getUserById", ("current",), None)])
+
+    def test_looked_up_again_when_the_token_changes(self):
+        self.fs.get_current_user()
+        self.fs.access_token = "other token"
+
+        self.assertEqual(self.fs.get_current_user().Id, "1")
+        self.assertEqual(len(self.api.calls_of("getUserById")), 2)
+        self.assertEqual(self.fs.basespace.access_token, "other token")
+
+
+class TestListingPages(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeBaseApi({"1": {"appresults": {"10": file_tree(1500)}}})
+        use_fake_api(self, self.api)
+        self.fs = make_fs()
+
+    def tearDown(self):
+        self.fs.close()
+
+    def pages(self):
+        return [(params["Offset"], params["Limit"]) for _, _, params in self.api.calls_of("getFiles")]
+
+    def test_scandir_first_page_keeps_the_default_size(self):
+        names = [info.name for info in self.fs.scandir("/projects/1/appresults/10/files")]
+
+        self.assertEqual(len(names), 1500)
+        self.assertEqual(self.pages(), [(0, DEFAULT_LIMIT), (DEFAULT_LIMIT, MAX_PAGE_SIZE)])
+
+    def test_scandir_first_page_is_not_measured(self):
+        list(self.fs.scandir("/projects/1/appresults/10/files"))
+        self.api.calls.clear()
+
+        self.fs.listdir("/projects/1/appresults/10/files")
+
+        self.assertEqual(self.pages()[0], (0, MAX_PAGE_SIZE))
+
+
+class TestIterdir(unittest.TestCase):
+
+    def setUp(self):
+        # the server returns ids in numeric order
+        self.api = FakeBaseApi({"1": {"appresults": {"10": {"9": ("b.bam", 1), "10": ("a.bam", 1)}}}})
+        use_fake_api(self, self.api)
+        self.fs = make_fs()
+        self.addCleanup(self.fs.close)
+
+    def test_server_order_unlike_listdir(self):
+        path = "/projects/1/appresults/10/files"
+
+        self.assertEqual(list(self.fs.iterdir(path)), ["9", "10"])
+        self.assertEqual(self.fs.listdir(path), ["10", "9"])
+        self.assertEqual(sorted(self.fs.iterdir(path)), self.fs.listdir(path))
+
+
+class TestGetinfoMany(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeBaseApi({"1": {"appresults": {"10": file_tree(20), "11": file_tree(2)}}})
+        use_fake_api(self, self.api)
+        self.fs = make_fs()
+        self.addCleanup(self.fs.close)
+
+    def test_siblings_are_resolved_from_one_listing(self):
+        paths = [f"/projects/1/appresults/10/files/{file_id}" for file_id in range(1000, 1010)]
+        paths += ["/projects/1/appresults/11/files/1000", "/projects/1/appresults/11/files/1001"]
+
+        results = self.fs.getinfo_many(paths, namespaces=["details"])
+
+        self.assertEqual([info.name for info in results], [path.rsplit("/", 1)[1] for path in paths])
+        self.assertEqual(results[3].size, 1003)
+        self.assertEqual([args for _, args, _ in self.api.calls_of("getFiles")], [("10",)])
+        self.assertEqual(sorted(args for _, args, _ in self.api.calls_of("getFileById")), [("1000",), ("1001",)])
+
+    def test_missing_paths_in_mixed_input(self):
+        siblings = [f"/projects/1/appresults/10/files/{file_id}" for file_id in range(1000, 1008)]
+        paths = (["/projects/1/appresults/10/files/9999"] + siblings[::-1]
+                 + ["/projects/1/appresults/11/files/9999", "/projects/1/appresults/11/files/1001", siblings[0]])
+
+        results = self.fs.getinfo_many(paths)
+
+        self.assertIsInstance(results[0], ResourceNotFound)
+        self.assertEqual([info.name for info in results[1:9]], [str(file_id) for file_id in range(1007, 999, -1)])
+        self.assertIsInstance(results[9], ResourceNotFound)
+        self.assertEqual(results[10].name, "1001")
+        # a path given twice gets its info twice
+        self.assertEqual(results[11].name, "1000")
+        self.assertEqual(len(self.api.calls_of("getFiles")), 1)
+
+
+class TestGlob(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeBaseApi({"1": {"appresults": {"10": {"100": ("a.bam", 1), "101": ("b.vcf", 2)}},
+                                      "samples": {"20": {"200": ("c.bam", 3)}}}})
+        use_fake_api(self, self.api)
+        self.fs = make_fs()
+        self.addCleanup(self.fs.close)
+
+    def glob(self, pattern):
+        return sorted(glob_match.path for glob_match in self.fs.iglob(pattern))
+
+    def test_wildcard_segments(self):
+        self.assertEqual(self.glob("projects/1/appresults/*/files/*.bam"), ["/projects/1/appresults/10/files/100"])
+        self.assertEqual(self.glob("projects/*/s*/20/files/*"), ["/projects/1/samples/20/files/200"])
+
+    def test_literal_segments(self):
+        self.assertEqual(self.glob("projects/1/appresults/10/files/101"), ["/projects/1/appresults/10/files/101"])
+        self.assertEqual(self.glob("projects/1/appresults/10/files/102"), [])
+        # not an entity id or category of its level
+        self.assertEqual(self.glob("projects/1/appresults/a.bam/files/*"), [])
+        self.assertEqual(self.glob("projects/1/results/*"), [])
+
+    def test_literal_last_segment_matches_aliases(self):
+        self.assertEqual(self.glob("projects/1/appresults/10/files/a.bam"), ["/projects/1/appresults/10/files/100"])
+        self.assertEqual(self.glob("projects/1/appresults/*/files/b.vcf"), ["/projects/1/appresults/10/files/101"])
+        self.assertEqual(self.glob("projects/1/appresults/10/files/c.bam"), [])
+
+    def test_missing_parent(self):
+        self.assertEqual(self.glob("projects/1/appresults/99/files/*"), [])
+        self.assertEqual(self.glob("projects/2/appresults/*/files/*"), [])
+
+    def test_failed_listing_is_raised(self):
+        def list_files(group_id, queryPars=None):
+            raise Exception("503 Service Unavailable")
+
+        self.api.list_files = list_files
+
+        with self.assertRaises(Exception):
+            self.glob("projects/1/appresults/*/files/*.bam")
+
+
+class TestFilterdir(unittest.TestCase):
+    FILES_PATH = "/projects/1/appsessions/5/datasets/ds.abc/sequenced files"
+
+    def setUp(self):
+        self.v2 = FakeV2Api({"ds.abc": {"123": ("a.bam", 10), "124": ("b.bam", 5)}})
+        use_fake_api(self, FakeBaseApi({"1": {}}), self.v2)
+        self.fs = make_fs()
+        self.addCleanup(self.fs.close)
+
+    def names_filter(self):
+        return [params.get("name") for method, params in self.v2.calls if method == "get_v2_datasets_id_files"]
+
+    def test_v2_filter_by_name(self):
+        self.assertEqual([info.name for info in self.fs.filterdir(self.FILES_PATH, files=["b.bam"])], ["124"])
+        self.assertEqual(self.names_filter(), ["b.bam"])
+
+    def test_v2_filter_by_id(self):
+        self.assertEqual([info.name for info in self.fs.filterdir(self.FILES_PATH, files=["123"])], ["123"])
+        self.assertEqual(self.names_filter(), [None])
+
+
+class TestResolveFileHrefs(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeBaseApi({"1": {"appresults": {"10": {"100": ("a.bam", 10)}}}})
+        self.v2 = FakeV2Api({"ds.abc": {"123": ("a.bam", 10)}})
+        use_fake_api(self, self.api, self.v2)
+        self.fs = make_fs(resolve_file_hrefs=True)
+        self.addCleanup(self.fs.close)
+
+    def test_v2_dataset_listings_cache_download_urls(self):
+        files_path = "/projects/1/appsessions/5/datasets/ds.abc/sequenced files"
+        self.fs.listdir(files_path)
+
+        self.assertEqual(self.fs.geturl(f"{files_path}/123"), "https://files.example/123")
+        resolutions = [params["filehrefcontentresolution"] for method, params in self.v2.calls
+                       if method == "get_v2_datasets_id_files"]
+        self.assertEqual(resolutions, [True])
+        self.assertEqual(self.api.calls_of("getFileById"), [])
+
+    def test_v1_hrefs_are_not_download_urls(self):
+        self.fs.listdir("/projects/1/appresults/10/files")
+
+        self.assertEqual(self.fs.geturl("/projects/1/appresults/10/files/100"), "https://files.example/100")
+        self.assertEqual(len(self.api.calls_of("getFileUrl")), 1)
+
+
+class TestDatasetListings(unittest.TestCase):
+    DATASETS_PATH = "/projects/1/biosamples/7/datasets"
+
+    def setUp(self):
+        self.v2 = FakeV2Api({"ds.abc": {}})
+        use_fake_api(self, FakeBaseApi({"1": {}}), self.v2)
+        self.fs = make_fs()
+        self.addCleanup(self.fs.close)
+
+    def dataset_queries(self):
+        return [params for method, params in self.v2.calls if method == "get_v2_datasets"]
+
+    def test_basic_listings_do_not_expand_properties(self):
+        self.assertEqual(self.fs.listdir(self.DATASETS_PATH), ["ds.abc"])
+        self.assertEqual([info.name for info in self.fs.scandir(self.DATASETS_PATH)], ["ds.abc"])
+
+        for params in self.dataset_queries():
+            self.assertEqual(params["inputbiosamples"], ["7"])
+            self.assertEqual(params["datasettypes"], ["~common.fastq"])
+            self.assertNotIn("include", params)
+            self.assertNotIn("propertyfilters", params)
+
+    def test_detailed_listings_expand_properties(self):
+        list(self.fs.scandir(self.DATASETS_PATH, namespaces=["details"]))
+
+        params, = self.dataset_queries()
+        self.assertEqual(params["include"], ["properties"])
+        self.assertEqual(params["propertyfilters"], DATASET_PROPERTY_FILTERS)
+
+    def test_page_sizes(self):
+        # the first scandir page keeps the default size, explicit pages are sent as asked
+        self.fs.listdir(self.DATASETS_PATH)
+        list(self.fs.scandir(self.DATASETS_PATH))
+        list(self.fs.scandir(self.DATASETS_PATH, page=(0, 5)))
+
+        self.assertEqual([(params["offset"], params["limit"]) for params in self.dataset_queries()],
+                         [(0, MAX_PAGE_SIZE), (0, DEFAULT_LIMIT), (0, 5)])
+        self.assertEqual({(params["sortby"], params["sortdir"]) for params in self.dataset_queries()},
+                         {("Name", "Asc")})
+
+
+class TestCopy(unittest.TestCase):
+    CONTENTS = {"100": b"first file", "101": b"second file content"}
+
+    def setUp(self):
+        self.contents = dict(self.CONTENTS)
+        self.server = FileServer(self.contents)
+        self.addCleanup(self.server.close)
+        self.api = FakeBaseApi({"1": {"appresults": {"10": {"100": ("a.bam", 10), "101": ("b.bam", 19)}}}},
+                               files_url=self.server.url)
+        use_fake_api(self, self.api)
+        self.fs = make_fs()
+        self.addCleanup(self.fs.close)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_fs_copy_is_not_patched(self):
+        self.assertEqual(fs.copy.copy_file_internal.__module__, "fs.copy")
+        self.assertIs(fs._bulk.copy_file_internal, fs.copy.copy_file_internal)
+        self.fs.copy_to("/projects/1/appresults/10/files/100", MemoryFS(), "a.bam")
+        self.assertEqual(fs.copy.copy_file_internal.__module__, "fs.copy")
+
+    def test_fs_copy_overwrites_files_of_the_same_size(self):
+        for dst_fs in (MemoryFS(), OSFS(self.directory)):
+            with self.subTest(dst_fs=dst_fs), dst_fs:
+                dst_fs.writebytes("a.bam", b"x" * 10)
+
+                fs.copy.copy_file(self.fs, "/projects/1/appresults/10/files/100", dst_fs, "a.bam")
+
+                self.assertEqual(dst_fs.readbytes("a.bam"), b"first file")
+
+    def test_fs_copy_dir_with_workers_overwrites(self):
+        dst_fs = MemoryFS()
+        dst_fs.writebytes("100", b"x" * 10)
+
+        fs.copy.copy_dir(self.fs, "/projects/1/appresults/10/files", dst_fs, "/", workers=2)
+
+        self.assertEqual(dst_fs.readbytes("100"), b"first file")
+        self.assertEqual(dst_fs.readbytes("101"), b"second file content")
+
+    def test_copy_to(self):
+        dst_fs = OSFS(self.directory)
+        dst_fs.writebytes("a.bam", b"x" * 10)
+
+        self.assertFalse(self.fs.copy_to("/projects/1/appresults/10/files/100", dst_fs, "a.bam", skip_same_size=True))
+        self.assertEqual(dst_fs.readbytes("a.bam"), b"x" * 10)
+        self.assertTrue(self.fs.copy_to("/projects/1/appresults/10/files/100", dst_fs, "a.bam"))
+        self.assertEqual(dst_fs.readbytes("a.bam"), b"first file")
+
+    def test_failed_copies_leave_nothing_to_skip(self):
+        dst_fs = OSFS(self.directory)
+        del self.contents["100"]
+
+        with self.assertRaises(Exception):
+            self.fs.copy_to("/projects/1/appresults/10/files/100", dst_fs, "a.bam")
+
+        self.assertEqual(os.listdir(self.directory), [])
+        self.contents["100"] = self.CONTENTS["100"]
+        self.assertTrue(self.fs.copy_to("/projects/1/appresults/10/files/100", dst_fs, "a.bam", skip_same_size=True))
+        self.assertEqual(dst_fs.readbytes("a.bam"), b"first file")
+
+    def test_copydir_to_skips_only_on_request(self):
+        dst_fs = MemoryFS()
+        dst_fs.makedirs("10/files")
+        dst_fs.writebytes("10/files/100", b"x" * 10)
+
+        self.assertEqual(self.fs.copydir_to("/projects/1/appresults", dst_fs, "/", skip_same_size=True), 1)
+        self.assertEqual(dst_fs.readbytes("10/files/100"), b"x" * 10)
+        self.assertEqual(self.fs.copydir_to("/projects/1/appresults", dst_fs, "/"), 2)
+        self.assertEqual(dst_fs.readbytes("10/files/100"), b"first file")
+
+
+class TestDownload(unittest.TestCase):
+    DATA = bytes(range(256)) * 40
+
+    def setUp(self):
+        self.server = FileServer({"100": self.DATA})
+        self.addCleanup(self.server.close)
+        use_fake_api(self, FakeBaseApi({"1": {"appresults": {"10": {"100": ("a.bam", len(self.DATA))}}}},
+                                       files_url=self.server.url))
+        self.fs = make_fs()
+        self.addCleanup(self.fs.close)
+
+    def test_download_chunk_size(self):
+        for chunk_size in (1, 1000, len(self.DATA), 2 * len(self.DATA)):
+            with self.subTest(chunk_size=chunk_size):
+                output = io.BytesIO()
+                self.fs.download("/projects/1/appresults/10/files/100", output, chunk_size=chunk_size)
+                self.assertEqual(output.getvalue(), self.DATA)
+
+    def test_downloads_share_a_connection(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        before = self.fs.http_metrics()
+        for _ in range(3):
+            self.fs.download("/projects/1/appresults/10/files/100", io.BytesIO())
+        self.fs.copy_to("/projects/1/appresults/10/files/100", OSFS(directory), "a.bam")
+        after = self.fs.http_metrics()
+
+        self.assertEqual(after.requests - before.requests, 4)
+        self.assertLessEqual(after.connections - before.connections, 1)
+
+
+class TestFileCache(unittest.TestCase):
+    DATA = b"cached content"
+    PATH = "/projects/1/appresults/10/files/100"
+
+    def setUp(self):
+        self.server = FileServer({"100": self.DATA})
+        self.addCleanup(self.server.close)
+        self.api = FakeBaseApi({"1": {"appresults": {"10": {"100": ("a.bam", len(self.DATA))}}}},
+                               files_url=self.server.url)
+        use_fake_api(self, self.api)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.fs = make_fs(file_cache_path=os.path.join(self.directory, "cache"))
+        self.addCleanup(self.fs.close)
+
+    def test_hits_are_not_downloaded_again(self):
+        self.fs.download(self.PATH, io.BytesIO())
+        self.assertEqual(len(self.api.calls_of("getFileUrl")), 1)
+        self.api.calls.clear()
+        # another process of the node
+        other_fs = make_fs(file_cache_path=os.path.join(self.directory, "cache"))
+        self.addCleanup(other_fs.close)
+
+        with other_fs.openbin(self.PATH) as cached_file:
+            self.assertEqual(cached_file.read(), self.DATA)
+        output = io.BytesIO()
+        other_fs.download(self.PATH, output)
+        self.assertEqual(output.getvalue(), self.DATA)
+        self.assertTrue(other_fs.copy_to(self.PATH, OSFS(self.directory), "a.bam"))
+
+        # the path is still resolved, for its existence and size
+        self.assertEqual(self.api.calls_of("getFileUrl"), [])
+        self.assertTrue(self.api.calls_of("getFileById"))
+        with open(os.path.join(self.directory, "a.bam"), "rb") as copied_file:
+            self.assertEqual(copied_file.read(), self.DATA)
+        self.assertNotEqual(os.stat(os.path.join(self.directory, "a.bam")).st_ino,
+                            os.stat(os.path.join(self.directory, "cache", "100")).st_ino)
+
+    def test_only_file_paths_are_looked_up(self):
+        self.fs.download(self.PATH, io.BytesIO())
+
+        # an appresult with the id of a cached file
+        self.assertIsNone(self.fs._open_cached_file("/projects/1/appresults/100"))
+
+    def test_entries_are_not_served_by_id_alone(self):
+        self.fs.download(self.PATH, io.BytesIO())
+        other_fs = BASESPACEFS(client_id="id", client_secret="secret", access_token="other token",
+                               file_cache_path=os.path.join(self.directory, "cache"))
+        self.addCleanup(other_fs.close)
+        # a token that can't read the file: BaseSpace answers 404
+        del self.api.files["100"]
+
+        self.assertIsNone(other_fs._open_cached_file(self.PATH))
+        with self.assertRaises(FSError):
+            other_fs.openbin(self.PATH)
+        with self.assertRaises(FSError):
+            other_fs.download(self.PATH, io.BytesIO())
+
+    def test_entries_of_another_size_are_not_served(self):
+        self.fs.download(self.PATH, io.BytesIO())
+        self.api.files["100"].Size = 5
+        other_fs = make_fs(file_cache_path=os.path.join(self.directory, "other cache"))
+        self.addCleanup(other_fs.close)
+
+        self.assertIsNone(self.fs._open_cached_file(self.PATH, other_fs.get_context_by_path(self.PATH)))
+
+
+class TestProcesses(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeBaseApi({"1": {"appresults": {"10": {"100": ("a.bam", 1)}}}})
+        use_fake_api(self, self.api)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.fs = make_fs(metadata_cache_path=os.path.join(self.directory, "metadata.db"))
+        self.addCleanup(self.fs.close)
+
+    def test_pickle(self):
+        self.fs.listdir("/projects/1/appresults/10/files")
+
+        unpickled = pickle.loads(pickle.dumps(self.fs))
+        self.addCleanup(unpickled.close)
+
+        self.assertEqual(unpickled.listdir("/projects/1/appresults/10/files"), ["100"])
+        self.assertEqual(unpickled._shared_cache.path, self.fs._shared_cache.path)
+
+    def test_changed_tokens_are_pickled_and_scope_the_shared_cache(self):
+        self.fs.listdir("/projects/1/appresults/10/files")
+        old_scope = self.fs._shared_cache_state()[0]
+        self.fs.access_token = "new token"
+
+        unpickled = pickle.loads(pickle.dumps(self.fs))
+        self.addCleanup(unpickled.close)
+
+        self.assertEqual(unpickled.access_token, "new token")
+        self.assertEqual(unpickled._shared_cache_state()[0], self.fs._shared_cache_state()[0])
+        self.assertNotEqual(self.fs._shared_cache_state()[0], old_scope)
+        # entries cached for the old token aren't used for the new one
+        self.api.calls.clear()
+        self.assertEqual(unpickled.listdir("/projects/1/appresults/10/files"), ["100"])
+        self.assertEqual(len(self.api.calls_of("getFiles")), 1)
+
+    def test_fork_while_locks_are_held(self):
+        self.fs.listdir("/projects/1/appresults/10/files")
+        release = threading.Event()
+        held = threading.Barrier(3)
+
+        def hold_locks():
+            with self.fs._lock, self.fs._url_cache._lock, self.fs._missing_cache._lock, \
+                    self.fs._page_sizer._lock, self.fs._executor_lock:
+                held.wait()
+                release.wait()
+
+        def in_flight():
+            held.wait()
+            release.wait()
+            return []
+
+        holder = threading.Thread(target=hold_locks)
+        holder.start()
+        # a listing in flight in the parent
+        leader = threading.Thread(target=FLIGHTS.do, args=(("key",), in_flight))
+        leader.start()
+        try:
+            held.wait()
+
+            def child():
+                assert FLIGHTS.do(("key",), lambda: ["child"]) == ["child"]
+                assert self.fs.listdir("/projects/1/appresults/10/files") == ["100"]
+                assert self.fs.getinfo("/projects/1/appresults/10/files/100").name == "100"
+                assert list(self.fs.scandir("/projects/1/appresults"))[0].name == "10"
+
+            process = multiprocessing.get_context("fork").Process(target=child)
+            process.start()
+            process.join(timeout=30)
+            if process.is_alive():
+                process.kill()
+                self.fail("the child is stuck on a lock of the parent")
+            self.assertEqual(process.exitcode, 0)
+        finally:
+            release.set()
+            holder.join()
+            leader.join()
+
+    def test_missing_paths_are_shared(self):
+        other_fs = make_fs(metadata_cache_path=os.path.join(self.directory, "metadata.db"))
+        self.addCleanup(other_fs.close)
+        with self.assertRaises(ResourceNotFound):
+            self.fs.getinfo("/projects/1/appresults/10/files/101")
+        self.api.calls.clear()
+
+        with self.assertRaises(ResourceNotFound):
+            other_fs.getinfo("/projects/1/appresults/10/files/101")
+        self.assertEqual(self.api.calls, [])
+
+        # the file is uploaded, and seen by a listing of the first process
+        raw_file = self.api.files["100"]
+        self.api.group_files["10"].append(type(raw_file)(**dict(vars(raw_file), Id="101")))
+        self.api.files["101"] = self.api.group_files["10"][-1]
+        self.fs.listdir("/projects/1/appresults/10/files")
+
+        self.assertEqual(other_fs.getinfo("/projects/1/appresults/10/files/101").name, "101")
@@ -0,0 +1,55 @@
+# coding: utf-8
+
+"""
+    Offline tests of the gzip / BGZF decompression
+"""
+
+import gzip
+import io
+import os
+import struct
+import unittest
+import zlib
+
+from fs_basespace.bgzf import BgzfReader, GzipReader, open_decompressed
+
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def bgzf_compress(data, block_size=65280):
+    blocks = []
+    for start in range(0, len(data), block_size):
+        chunk = data[start:start + block_size]
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        cdata = compressor.compress(chunk) + compressor.flush()
+        header = b"\x1f\x8b\x08\x04" + b"\x00" * 4 + b"\x00\xff" + struct.pack("<H", 6)
+        extra = b"BC" + struct.pack("<HH", 2, len(cdata) + 25)
+        blocks.append(header + extra + cdata + struct.pack("<II", zlib.crc32(chunk), len(chunk)))
+    return b"".join(blocks) + BGZF_EOF
+
+
+class TestDecompression(unittest.TestCase):
+
+    def setUp(self):
+        self.data = b"".join(b"@read%d\nACGT\n+\nFFFF\n" % i for i in range(20000)) + os.urandom(100000)
+
+    def test_bgzf_is_inflated_in_order(self):
+        stream = open_decompressed(io.BytesIO(bgzf_compress(self.data, block_size=10000)))
+
+        self.assertIsInstance(stream.raw, BgzfReader)
+        self.assertEqual(stream.read(), self.data)
+
+    def test_gzip_falls_back_to_streaming(self):
+        stream = open_decompressed(io.BytesIO(gzip.compress(self.data) + gzip.compress(b"second member")))
+
+        self.assertIsInstance(stream.raw, GzipReader)
+        self.assertEqual(stream.read(), self.data + b"second member")
+
+    def test_uncompressed_is_passed_through(self):
+        self.assertEqual(open_decompressed(io.BytesIO(self.data)).read(), self.data)
+
+    def test_truncated_bgzf(self):
+        stream = open_decompressed(io.BytesIO(bgzf_compress(self.data)[:-100]))
+
+        with self.assertRaises(IOError):
+            stream.read()
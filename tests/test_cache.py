@@ -0,0 +1,127 @@
+# coding: utf-8
+
+"""
+    Offline tests of the metadata caches
+"""
+
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from fs_basespace.cache import SqliteTTLCache
+from fs_basespace.cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = TTLCache(maxsize=2, ttl=10, timer=self.timer)
+
+    def test_get_and_expire(self):
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIn('a', self.cache)
+
+        self.timer.now = 10
+        self.assertIsNone(self.cache.get('a'))
+        self.assertNotIn('a', self.cache)
+
+    def test_lru_eviction(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(len(self.cache), 2)
+
+    def test_pop(self):
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.pop('a'), 1)
+        self.assertIsNone(self.cache.pop('a'))
+
+
+class TestTTLCacheAfterFork(unittest.TestCase):
+
+    def test_lock_held_at_fork_time_is_replaced(self):
+        cache = TTLCache()
+        cache.set('a', 1)
+        cache._lock.acquire()
+
+        cache.after_fork()
+
+        self.assertEqual(cache.get('a'), 1)
+
+
+class TestSqliteTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'metadata.db')
+        self.timer = FakeTimer()
+        self.cache = SqliteTTLCache(self.path, ttl=10, timer=self.timer)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_and_expire(self):
+        self.cache.set('a', {'Id': '1', 'Size': 10})
+        self.assertEqual(self.cache.get('a'), {'Id': '1', 'Size': 10})
+        self.assertEqual(len(self.cache), 1)
+
+        self.timer.now = 10
+        self.assertIsNone(self.cache.get('a'))
+        self.assertNotIn('a', self.cache)
+
+    def test_shared_by_every_opener_of_the_file(self):
+        self.cache.set('a', [1, 2])
+        other = SqliteTTLCache(self.path, ttl=10, timer=self.timer)
+        results = []
+        thread = threading.Thread(target=lambda: results.append(other.get('a')))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(results, [[1, 2]])
+
+    def test_unpicklable_values_are_not_cached(self):
+        self.cache.set('a', threading.Lock())
+        self.assertNotIn('a', self.cache)
+
+    def test_pop(self):
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.pop('a'), 1)
+        self.assertIsNone(self.cache.pop('a'))
+
+    def test_discard(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.cache.discard(['a', 'c', 'd'])
+        self.cache.discard([])
+
+        self.assertEqual([key for key in ('a', 'b', 'c') if key in self.cache], ['b'])
+
+    def test_only_signed_values_are_unpickled(self):
+        signed = SqliteTTLCache(self.path, ttl=10, timer=self.timer, secret=b'secret')
+        signed.set('a', 1)
+        other = SqliteTTLCache(self.path, ttl=10, timer=self.timer, secret=b'other secret')
+        # written by anyone able to write the file
+        with sqlite3.connect(self.path) as connection:
+            connection.execute("INSERT INTO entries (key, expires_at, value) VALUES (?, ?, ?)",
+                               ('b', 100, pickle.dumps(2)))
+
+        self.assertEqual(signed.get('a'), 1)
+        self.assertIsNone(other.get('a'))
+        self.assertIsNone(signed.get('b'))
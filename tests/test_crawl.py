@@ -0,0 +1,75 @@
+# coding: utf-8
+
+"""
+    Offline tests of the concurrent directory crawler
+"""
+
+import threading
+import unittest
+from types import SimpleNamespace
+
+from fs_basespace.basespace_context import FileContext, FileGroupsContext
+from fs_basespace.crawl import DirectoryCrawler
+
+from tests.fakes import FakeFs
+
+
+def make_tree():
+    groups = [FileGroupsContext(SimpleNamespace(Id=str(group_id))) for group_id in (10, 11)]
+    tree = {"appresults": groups}
+    for group in groups:
+        tree[f"appresults/{group.get_id()}"] = [FileContext(SimpleNamespace(Id=f"{group.get_id()}0", Size=1))]
+    return tree
+
+
+class TestDirectoryCrawler(unittest.TestCase):
+
+    def setUp(self):
+        self.fs = FakeFs(make_tree())
+        self.addCleanup(self.fs.close)
+
+    def test_breadth_first_with_state(self):
+        crawler = DirectoryCrawler(self.fs)
+        crawler.add("/appresults", 0)
+        listed = []
+        for path, depth, entities in crawler:
+            listed.append((path, depth, [entity.get_id() for entity in entities]))
+            for entity in entities:
+                if not isinstance(entity, FileContext):
+                    crawler.add(f"{path}/{entity.get_id()}", depth + 1)
+
+        self.assertEqual(listed, [("/appresults", 0, ["10", "11"]),
+                                  ("/appresults/10", 1, ["100"]),
+                                  ("/appresults/11", 1, ["110"])])
+
+    def test_directories_are_listed_concurrently(self):
+        # each listing waits for the other one: listings one after the other would time out
+        barrier = threading.Barrier(2, timeout=5)
+        iter_entities = self.fs._iter_entities
+
+        def concurrent_iter_entities(key, query=None):
+            if key != "appresults":
+                barrier.wait()
+            return iter_entities(key, query)
+
+        self.fs._iter_entities = concurrent_iter_entities
+        crawler = DirectoryCrawler(self.fs)
+        crawler.add("/appresults/10")
+        crawler.add("/appresults/11")
+
+        self.assertEqual([path for path, _, _ in crawler], ["/appresults/10", "/appresults/11"])
+
+    def test_listings_in_flight_are_bounded(self):
+        submitted = []
+        submit = self.fs.executor.submit
+        self.fs.executor.submit = lambda *args: submitted.append(args) or submit(*args)
+        crawler = DirectoryCrawler(self.fs)
+        for _ in range(10):
+            crawler.add("/appresults")
+
+        listings = iter(crawler)
+        next(listings)
+
+        # the first listing was handed out, up to 2 * metadata_workers were submitted
+        self.assertEqual(len(submitted), 2 * self.fs.metadata_workers)
+        self.assertEqual(len(list(listings)), 9)
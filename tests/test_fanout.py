@@ -0,0 +1,87 @@
+# coding: utf-8
+
+"""
+    Offline tests of the bulk biosample and appsession resolution
+"""
+
+import unittest
+from types import SimpleNamespace
+
+from fs import errors
+
+from fs_basespace.fanout import datasets_for_appsessions, fastqs_for_biosamples
+
+from tests.fakes import FakeFs
+
+
+def make_dataset(dataset_id, biosample_ids, appsession_id, with_properties=True):
+    """ (v2 dataset, its biosample ids) """
+    libraries = SimpleNamespace(name="Input.Libraries", sample_library_items=[
+        SimpleNamespace(bio_sample=SimpleNamespace(id=biosample_id)) for biosample_id in biosample_ids])
+    dataset = SimpleNamespace(id=dataset_id, properties=SimpleNamespace(items=[libraries]) if with_properties else None,
+                              app_session=SimpleNamespace(id=appsession_id))
+    return dataset, biosample_ids
+
+
+class FakeV2:
+
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self.calls = []
+
+    def get_v2_datasets(self, offset, limit, inputbiosamples=None, appsessionids=None, **filters):
+        self.calls.append(("datasets", tuple(inputbiosamples or appsessionids)))
+        items = [dataset for dataset, biosample_ids in self.datasets
+                 if set(inputbiosamples or ()) & set(biosample_ids) or dataset.app_session.id in (appsessionids or ())]
+        return SimpleNamespace(items=items[offset:offset + limit])
+
+    def get_v2_datasets_id_files(self, id, offset, limit, **filters):
+        self.calls.append(("files", id))
+        return SimpleNamespace(items=[SimpleNamespace(id=f"{id}-{index}", name=f"R{index}.fastq.gz", size=index)
+                                      for index in (1, 2)][offset:offset + limit])
+
+
+class TestFanout(unittest.TestCase):
+
+    def setUp(self):
+        self.v2 = FakeV2([make_dataset("ds.1", ["1"], "10"), make_dataset("ds.2", ["2"], "10"),
+                          make_dataset("ds.3", ["1", "3"], "20")])
+        self.fs = FakeFs(v2=self.v2)
+
+    def tearDown(self):
+        self.fs.close()
+
+    def test_biosamples_share_dataset_queries(self):
+        resolved = fastqs_for_biosamples(self.fs, "/projects/5", ["1", "2", "3", "4"], ids_per_query=3)
+
+        self.assertEqual(list(resolved), ["1", "2", "3", "4"])
+        self.assertEqual(sorted(resolved["1"]), ["ds.1", "ds.3"])
+        self.assertEqual(resolved["4"], {})
+        self.assertEqual(list(resolved["3"]["ds.3"]), [
+            "/projects/5/biosamples/3/datasets/ds.3/sequenced files/ds.3-1",
+            "/projects/5/biosamples/3/datasets/ds.3/sequenced files/ds.3-2",
+        ])
+        self.assertEqual([call for call in self.v2.calls if call[0] == "datasets"],
+                         [("datasets", ("1", "2", "3")), ("datasets", ("4",))])
+        # ds.3 belongs to two biosamples, its files are listed once
+        self.assertEqual(sorted(call[1] for call in self.v2.calls if call[0] == "files"), ["ds.1", "ds.2", "ds.3"])
+
+    def test_appsessions(self):
+        resolved = datasets_for_appsessions(self.fs, "/projects/5", ["10", "20"])
+
+        self.assertEqual(sorted(resolved["10"]), ["ds.1", "ds.2"])
+        self.assertIn("/projects/5/appsessions/20/datasets/ds.3/sequenced files/ds.3-1", resolved["20"]["ds.3"])
+
+    def test_datasets_without_their_biosamples_are_queried_one_by_one(self):
+        self.v2.datasets = [make_dataset("ds.1", ["1"], "10", with_properties=False), make_dataset("ds.2", ["2"], "10")]
+
+        resolved = fastqs_for_biosamples(self.fs, "/projects/5", ["1", "2"])
+
+        self.assertEqual(sorted(resolved["1"]), ["ds.1"])
+        self.assertEqual(sorted(resolved["2"]), ["ds.2"])
+        self.assertEqual([call for call in self.v2.calls if call[0] == "datasets"],
+                         [("datasets", ("1", "2")), ("datasets", ("1",)), ("datasets", ("2",))])
+
+    def test_project_path_expected(self):
+        with self.assertRaises(errors.ResourceNotFound):
+            fastqs_for_biosamples(self.fs, "/projects/5/biosamples", ["1"])
@@ -0,0 +1,163 @@
+# coding: utf-8
+
+"""
+    Offline tests of the node local file cache
+"""
+
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from fs_basespace.file_cache import LocalFileCache, copy_into, place
+
+
+def _writer(data, downloads=None, delay=0):
+    def download(path):
+        if downloads is not None:
+            downloads.append(path)
+        time.sleep(delay)
+        with open(path, "wb") as downloaded_file:
+            downloaded_file.write(data)
+    return download
+
+
+def _fetch_in_process(directory, log_path):
+    def download(path):
+        with open(log_path, "a") as log:
+            log.write("downloaded\n")
+        time.sleep(0.2)
+        with open(path, "wb") as downloaded_file:
+            downloaded_file.write(b"x" * 100)
+
+    with LocalFileCache(directory).fetch("FIL1", 100, download) as cached_file:
+        assert cached_file.read() == b"x" * 100
+
+
+class TestLocalFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = LocalFileCache(os.path.join(self.directory, "cache"), quota=1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fetch_then_open(self):
+        downloads = []
+        with self.cache.fetch("FIL1", 5, _writer(b"12345", downloads)) as cached_file:
+            self.assertEqual(cached_file.read(), b"12345")
+        with self.cache.fetch("FIL1", 5, _writer(b"12345", downloads)) as cached_file:
+            self.assertEqual(cached_file.read(), b"12345")
+
+        self.assertEqual(len(downloads), 1)
+        self.assertIsNone(self.cache.open("FIL1", 6))
+        self.assertIsNone(self.cache.open("FIL2"))
+        with self.cache.open("FIL1") as cached_file:
+            self.assertEqual(cached_file.read(), b"12345")
+        # lock files go with their download
+        self.assertEqual(os.listdir(os.path.join(self.cache.directory, ".locks")), ["usage"])
+
+    def test_failed_downloads_are_not_cached(self):
+        with self.assertRaises(IOError):
+            self.cache.fetch("FIL1", 10, _writer(b"short"))
+
+        self.assertIsNone(self.cache.open("FIL1", 10))
+        self.assertEqual(os.listdir(self.cache.directory), [".locks"])
+
+    def test_concurrent_threads_download_once(self):
+        downloads = []
+        results = []
+
+        def fetch():
+            with self.cache.fetch("FIL1", 100, _writer(b"x" * 100, downloads, delay=0.1)) as cached_file:
+                results.append(cached_file.read())
+
+        threads = [threading.Thread(target=fetch) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(downloads), 1)
+        self.assertEqual(results, [b"x" * 100] * 4)
+        self.assertEqual(os.listdir(os.path.join(self.cache.directory, ".locks")), ["usage"])
+
+    def test_concurrent_processes_download_once(self):
+        log_path = os.path.join(self.directory, "downloads.log")
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=_fetch_in_process, args=(self.cache.directory, log_path))
+                     for _ in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        self.assertEqual([process.exitcode for process in processes], [0, 0, 0])
+        with open(log_path) as log:
+            self.assertEqual(log.read(), "downloaded\n")
+
+    def test_least_recently_used_are_evicted(self):
+        for index, file_id in enumerate(["FIL1", "FIL2", "FIL3"]):
+            self.cache.fetch(file_id, 400, _writer(b"x" * 400)).close()
+            os.utime(os.path.join(self.cache.directory, file_id), (index, index))
+            if file_id == "FIL2":
+                # FIL1 is used again
+                self.cache.open("FIL1", 400).close()
+
+        self.assertIsNotNone(self.cache.open("FIL1", 400))
+        self.assertIsNone(self.cache.open("FIL2", 400))
+        self.assertIsNotNone(self.cache.open("FIL3", 400))
+        self.assertLessEqual(self.cache.usage(), 1000)
+
+    def test_the_directory_is_scanned_over_the_quota_only(self):
+        scans = []
+        scandir = os.scandir
+
+        def counted_scandir(path):
+            scans.append(path)
+            return scandir(path)
+
+        with mock.patch("fs_basespace.file_cache.os.scandir", counted_scandir):
+            # the first download counts what is there
+            for file_id in ("FIL1", "FIL2", "FIL3"):
+                self.cache.fetch(file_id, 300, _writer(b"x" * 300)).close()
+            self.assertEqual(len(scans), 1)
+
+            self.cache.fetch("FIL4", 300, _writer(b"x" * 300)).close()
+            self.assertEqual(len(scans), 2)
+
+        self.assertLessEqual(self.cache.usage(), 1000)
+        with open(os.path.join(self.cache.directory, ".locks", "usage")) as usage_file:
+            self.assertEqual(int(usage_file.read()), self.cache.usage())
+
+    def test_files_over_the_quota_are_not_cached(self):
+        downloads = []
+
+        self.assertIsNone(self.cache.fetch("FIL1", 2000, _writer(b"x" * 2000, downloads)))
+        self.assertEqual(downloads, [])
+
+    def test_place_and_copy(self):
+        with self.cache.fetch("FIL1", 5, _writer(b"12345")) as cached_file:
+            destination = os.path.join(self.directory, "copy")
+            self.assertIn(place(cached_file, destination), ("clone", "copy"))
+            with open(destination, "rb") as placed_file:
+                self.assertEqual(placed_file.read(), b"12345")
+            # the destination doesn't share the entry
+            self.assertFalse(os.path.samefile(destination, cached_file.name))
+            with open(destination, "ab") as placed_file:
+                placed_file.write(b"6")
+            os.chmod(destination, 0o444)
+            # read only files are replaced too
+            place(cached_file, destination)
+            with open(destination, "rb") as placed_file:
+                self.assertEqual(placed_file.read(), b"12345")
+
+            output = io.BytesIO()
+            copy_into(cached_file, output)
+            self.assertEqual(output.getvalue(), b"12345")
@@ -0,0 +1,79 @@
+# coding: utf-8
+
+"""
+    Offline tests of the BAI / CSI index parsing and region resolution
+"""
+
+import io
+import struct
+import unittest
+
+from fs_basespace.genomic_index import (GenomicIndex, ReferenceIndex, chunk_byte_ranges, decompress_chunk,
+                                        parse_index, read_bam_reference_names, reg2bins)
+from tests.test_bgzf import bgzf_compress
+
+
+def bai(references):
+    """ A BAI holding, per reference, {bin: [chunks]} and no linear index """
+    data = b"BAI\1" + struct.pack("<i", len(references))
+    for bins in references:
+        data += struct.pack("<i", len(bins))
+        for bin_id, chunks in bins.items():
+            data += struct.pack("<Ii", bin_id, len(chunks))
+            for chunk in chunks:
+                data += struct.pack("<QQ", *chunk)
+        data += struct.pack("<i", 0)
+    return data
+
+
+def virtual_offset(compressed, block_size, uoffset):
+    """ Virtual offset of a position of the decompressed content, blocks holding block_size bytes each """
+    block_index, within = divmod(uoffset, block_size)
+    block_offset = 0
+    for _ in range(block_index):
+        block_offset += struct.unpack_from("<H", compressed, block_offset + 16)[0] + 1
+    return block_offset << 16 | within
+
+
+class TestGenomicIndex(unittest.TestCase):
+
+    def test_reg2bins_follows_the_specification(self):
+        self.assertEqual(reg2bins(0, 1), [0, 1, 9, 73, 585, 4681])
+        self.assertIn(4681 + (1000000 >> 14), reg2bins(1000000, 1000001))
+
+    def test_parse_bai_and_resolve_chunks(self):
+        index = parse_index(bai([{4681: [(100, 200)], 4682: [(150, 400)], 5000: [(900, 1000)]}, {}]))
+
+        self.assertEqual(index.min_shift, 14)
+        self.assertEqual(len(index.references), 2)
+        self.assertEqual(index.chunks(0, 0, 20000), [(100, 400)])
+        self.assertEqual(index.chunks(1, 0, 20000), [])
+
+    def test_linear_index_skips_chunks_before_the_region(self):
+        reference = ReferenceIndex({0: [(10, 50), (500, 600)]}, {}, [0, 100])
+        index = GenomicIndex(14, 5, [reference], ["chr1"])
+
+        self.assertEqual(index.chunks(index.ref_id("chr1"), 16384, 16385), [(500, 600)])
+        with self.assertRaises(KeyError):
+            index.ref_id("chr2")
+
+    def test_bam_reference_names(self):
+        header = b"BAM\1" + struct.pack("<i", 3) + b"@HD" + struct.pack("<i", 2)
+        for name in (b"chr1", b"chrM"):
+            header += struct.pack("<i", len(name) + 1) + name + b"\0" + struct.pack("<i", 1000)
+
+        self.assertEqual(read_bam_reference_names(io.BytesIO(header + b"records")), ["chr1", "chrM"])
+
+    def test_decompress_chunk_from_fetched_ranges(self):
+        content = bytes(range(256)) * 1000
+        block_size = 10000
+        compressed = bgzf_compress(content, block_size=block_size)
+
+        chunks = [(virtual_offset(compressed, block_size, 1234), virtual_offset(compressed, block_size, 25000)),
+                  (virtual_offset(compressed, block_size, 200000), virtual_offset(compressed, block_size, 200100))]
+        ranges = chunk_byte_ranges(chunks, len(compressed), coalesce_gap=0)
+        fetched = {start: compressed[start:end] for start, end in ranges}
+
+        self.assertEqual(decompress_chunk(fetched, chunks[0]), content[1234:25000])
+        self.assertEqual(decompress_chunk(fetched, chunks[1]), content[200000:200100])
+        self.assertEqual(len(chunk_byte_ranges(chunks, len(compressed), coalesce_gap=len(compressed))), 1)
@@ -0,0 +1,137 @@
+# coding: utf-8
+
+"""
+    Offline tests of the shared keep-alive connections of the data path
+"""
+
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fs_basespace.basespace_file import BaseSpaceFile
+from fs_basespace.http_pool import HttpSessionPool
+from fs_basespace.transfer import read_range
+
+DATA = bytes(range(256)) * 64
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        start, end = 0, len(DATA)
+        if "Range" in self.headers:
+            first, last = self.headers["Range"].split("=")[1].split("-")
+            start, end = int(first), int(last) + 1 if last else len(DATA)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(DATA)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        self.wfile.write(DATA[start:end])
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/file?X-Amz-Signature=signature"
+        self.pool = HttpSessionPool(max_connections_per_host=2)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_files_opened_in_turn_share_a_connection(self):
+        for _ in range(5):
+            with BaseSpaceFile(self.url, "rb", http_get=self.pool.get) as read_file:
+                self.assertEqual(read_file.read(), DATA)
+        self.assertEqual(read_range(self.url, 10, 20, http_get=self.pool.get), DATA[10:20])
+
+        metrics = self.pool.metrics()
+        self.assertEqual((metrics.requests, metrics.connections, metrics.reused), (6, 1, 5))
+        self.assertEqual(metrics.by_host["127.0.0.1"].connections, 1)
+
+    def test_readinto(self):
+        for _ in range(3):
+            with BaseSpaceFile(self.url, "rb", http_get=self.pool.get) as read_file:
+                self.assertEqual(read_file.read(10), DATA[:10])
+                buffer = bytearray(1000)
+                self.assertEqual(read_file.readinto(buffer), 1000)
+                self.assertEqual(bytes(buffer), DATA[10:1010])
+                read_file.seek(len(DATA) - 6)
+                self.assertEqual(read_file.readinto(buffer), 6)
+                self.assertEqual(bytes(buffer[:6]), DATA[-6:])
+                self.assertEqual(read_file.readinto(buffer), 0)
+
+        # the connection went back to the pool at the end of every body read with readinto
+        self.assertEqual(self.pool.metrics().connections, 1)
+
+    def test_connections_kept_per_host_are_bounded(self):
+        barrier = threading.Barrier(4)
+
+        def read():
+            with BaseSpaceFile(self.url, "rb", http_get=self.pool.get) as read_file:
+                barrier.wait()
+                return read_file.read()
+
+        for _ in range(2):
+            threads = [threading.Thread(target=read) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # 4 concurrent reads open 4 connections, 2 of them are kept for the next round
+        self.assertEqual(self.pool.metrics().connections, 6)
+
+    def test_close(self):
+        read_range(self.url, 0, 10, http_get=self.pool.get)
+        self.pool.close()
+        read_range(self.url, 0, 10, http_get=self.pool.get)
+
+        self.assertEqual(self.pool.metrics()[:3], (2, 2, 0))
+
+    def test_fork_while_the_lock_is_held(self):
+        read_range(self.url, 0, 10, http_get=self.pool.get)
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with self.pool._lock:
+                held.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        try:
+            held.wait()
+            pid = os.fork()
+            if pid == 0:
+                ok = False
+                try:
+                    ok = read_range(self.url, 10, 20, http_get=self.pool.get) == DATA[10:20]
+                    # the parent's connection and counts are not inherited
+                    ok = ok and self.pool.metrics()[:2] == (1, 1)
+                finally:
+                    os._exit(0 if ok else 1)
+            deadline = time.monotonic() + 10
+            while (waited := os.waitpid(pid, os.WNOHANG)) == (0, 0) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            if waited == (0, 0):
+                os.kill(pid, 9)
+                os.waitpid(pid, 0)
+                self.fail("the forked child is stuck")
+            self.assertEqual(os.waitstatus_to_exitcode(waited[1]), 0)
+        finally:
+            release.set()
+            holder.join()
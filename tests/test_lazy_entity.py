@@ -0,0 +1,58 @@
+# coding: utf-8
+
+"""
+    Offline tests of the lazy entity placeholders
+"""
+
+import pickle
+import unittest
+from types import SimpleNamespace
+
+from fs_basespace.lazy_entity import LazyAppResult, LazyProject
+
+
+class FakeApi:
+    def __init__(self):
+        self.calls = []
+
+    def getAppResultsByProject(self, project_id, queryPars=None):
+        self.calls.append(('getAppResultsByProject', project_id, queryPars))
+        return ['10', '11']
+
+    def getAppResultFiles(self, result_id, queryPars=None):
+        self.calls.append(('getAppResultFiles', result_id, queryPars))
+        return ['1000']
+
+
+class TestLazyEntity(unittest.TestCase):
+
+    def setUp(self):
+        self.fetched = []
+
+    def fetch(self):
+        self.fetched.append(True)
+        return SimpleNamespace(Id='1', Name='project 1', UserOwnedBy='me')
+
+    def test_children_are_listed_by_id(self):
+        api = FakeApi()
+        project = LazyProject('1', self.fetch)
+
+        self.assertEqual(project.getAppResults(api, queryPars='params'), ['10', '11'])
+        self.assertEqual(LazyAppResult('10', self.fetch).getFiles(api), ['1000'])
+        self.assertEqual(api.calls, [('getAppResultsByProject', '1', 'params'), ('getAppResultFiles', '10', None)])
+        self.assertEqual((project.Id, project.id), ('1', '1'))
+        self.assertEqual(self.fetched, [])
+
+    def test_other_attributes_fetch_the_entity_once(self):
+        project = LazyProject('1', self.fetch)
+
+        self.assertEqual(project.Name, 'project 1')
+        self.assertEqual(project.UserOwnedBy, 'me')
+        self.assertEqual(len(self.fetched), 1)
+        with self.assertRaises(AttributeError):
+            project.getSamplesById
+
+    def test_not_picklable(self):
+        with self.assertRaises(TypeError):
+            pickle.dumps(LazyProject('1', self.fetch))
+        self.assertEqual(self.fetched, [])
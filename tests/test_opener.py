@@ -0,0 +1,38 @@
+# coding: utf-8
+
+"""
+    Offline tests of the basespace:// url parameters
+"""
+
+import unittest
+
+from fs.opener.errors import OpenerError
+from fs.opener.parse import parse_fs_url
+
+from fs_basespace.opener import parse_url_parameters
+
+
+class TestUrlParameters(unittest.TestCase):
+
+    def test_parameters_are_converted(self):
+        parse_result = parse_fs_url('basespace://id:secret:token@server?download_workers=8&part_size=32M'
+                                    '&read_ahead=256KiB&negative_cache_ttl=0&resolve_file_hrefs=true!/projects')
+
+        self.assertEqual(parse_result.path, '/projects')
+        self.assertEqual(parse_url_parameters(parse_result.params), {
+            'download_workers': 8,
+            'part_size': 32 * 1024 * 1024,
+            'read_ahead': 256 * 1024,
+            'negative_cache_ttl': 0.0,
+            'resolve_file_hrefs': True,
+        })
+
+    def test_invalid_values(self):
+        for params in ({'download_workers': '0'}, {'part_size': '12X'}, {'metadata_cache_ttl': '-1'},
+                       {'resolve_file_hrefs': 'maybe'}):
+            with self.assertRaises(OpenerError):
+                parse_url_parameters(params)
+
+    def test_unknown_parameter(self):
+        with self.assertRaises(OpenerError):
+            parse_url_parameters({'workers': '4'})
@@ -0,0 +1,51 @@
+# coding: utf-8
+
+"""
+    Offline tests of the adaptive listing page sizes
+"""
+
+import unittest
+
+from fs_basespace.page_size import PageSizer
+
+
+class TestPageSizer(unittest.TestCase):
+
+    def setUp(self):
+        self.sizer = PageSizer(initial=1024, ceiling=4096, latency_budget=1.0)
+
+    def test_starts_with_the_initial_size(self):
+        self.assertEqual(self.sizer.size('files'), 1024)
+        self.assertFalse(self.sizer.is_probe('files', 1024))
+
+    def test_full_pages_probe_bigger_ones_up_to_the_ceiling(self):
+        self.sizer.record('files', 1024, 1024, 0.2)
+        self.assertEqual(self.sizer.next_size('files', 1024), 2048)
+        self.assertTrue(self.sizer.is_probe('files', 2048))
+
+        self.sizer.record('files', 2048, 2048, 0.3)
+        self.sizer.record('files', 4096, 4096, 0.5)
+        self.assertEqual(self.sizer.next_size('files', 4096), 4096)
+        self.assertEqual(self.sizer.size('files'), 4096)
+
+    def test_refused_probe_fixes_the_maximum(self):
+        self.sizer.record('files', 1024, 1024, 0.2)
+        self.sizer.refused('files', 2048)
+
+        self.assertEqual(self.sizer.next_size('files', 1024), 1024)
+        self.assertEqual(self.sizer.size('biosamples'), 1024)
+
+    def test_silent_cap(self):
+        self.sizer.record('files', 2048, 2048, 0.2)
+        self.sizer.capped('files', 1500)
+
+        self.assertEqual(self.sizer.size('files'), 1500)
+        self.assertFalse(self.sizer.is_probe('files', 1500))
+
+    def test_latency_budget(self):
+        self.sizer.record('files', 1024, 1024, 0.5)
+        self.sizer.record('files', 2048, 2048, 3.0)
+        self.assertEqual(self.sizer.size('files'), 1024)
+
+        self.sizer.record('datasets', 1024, 1024, 2.0)
+        self.assertEqual(self.sizer.size('datasets'), 512)
@@ -0,0 +1,49 @@
+# coding: utf-8
+
+"""
+    Offline tests of the request coalescing
+"""
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from fs_basespace.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.calls = 0
+        self.release = threading.Event()
+
+    def _slow_call(self, value):
+        self.calls += 1
+        self.release.wait(5)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def _run_concurrently(self, value, count=8):
+        with ThreadPoolExecutor(count) as executor:
+            futures = [executor.submit(self.flights.do, 'key', self._slow_call, value) for _ in range(count)]
+            while self.flights.in_flight() == 0:
+                pass
+            threading.Timer(0.2, self.release.set).start()
+            return futures
+
+    def test_identical_calls_share_one_result(self):
+        futures = self._run_concurrently('result')
+
+        self.assertEqual([future.result() for future in futures], ['result'] * 8)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flights.in_flight(), 0)
+
+    def test_identical_calls_share_the_exception(self):
+        futures = self._run_concurrently(KeyError('missing'))
+
+        for future in futures:
+            with self.assertRaises(KeyError):
+                future.result()
+        self.assertEqual(self.calls, 1)
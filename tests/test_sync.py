@@ -0,0 +1,138 @@
+# coding: utf-8
+
+"""
+    Offline tests of the incremental mirror of a BaseSpace subtree
+"""
+
+import shutil
+import tempfile
+import threading
+import unittest
+
+from fs.memoryfs import MemoryFS
+from fs.osfs import OSFS
+
+from fs_basespace import BASESPACEFS
+from fs_basespace.sync import MANIFEST_NAME, read_manifest
+
+from tests.fakes import FakeBaseApi, FileServer, use_fake_api
+
+SRC_PATH = "/projects/1/appresults"
+
+
+def make_fs(**options):
+    return BASESPACEFS(client_id="id", client_secret="secret", access_token="token", **options)
+
+
+class TestSync(unittest.TestCase):
+
+    def setUp(self):
+        self.contents = {"100": b"first file", "101": b"second file content", "110": b"third"}
+        self.server = FileServer(self.contents)
+        self.addCleanup(self.server.close)
+        self.api = FakeBaseApi({"1": {"appresults": {"10": {"100": ("a.bam", 10), "101": ("b.bam", 19)},
+                                                     "11": {"110": ("c.bam", 5)}}}},
+                               files_url=self.server.url)
+        use_fake_api(self, self.api)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.dst_fs = OSFS(self.directory)
+        self.addCleanup(self.dst_fs.close)
+
+    def sync(self, dst_fs=None, **options):
+        # a new filesystem per sync, as separate runs of a mirror job
+        with make_fs() as src_fs:
+            return src_fs.sync(SRC_PATH, dst_fs or self.dst_fs, "/mirror", **options)
+
+    def manifest(self):
+        return read_manifest(self.dst_fs, f"/mirror/{MANIFEST_NAME}")
+
+    def test_first_sync_copies_everything_and_writes_the_manifest(self):
+        result = self.sync()
+
+        self.assertEqual(sorted(result.copied), ["10/files/100", "10/files/101", "11/files/110"])
+        self.assertEqual((result.unchanged, result.uploading), ([], []))
+        self.assertEqual(self.dst_fs.readbytes("/mirror/10/files/101"), b"second file content")
+        manifest = self.manifest()
+        self.assertEqual(sorted(manifest), ["10/files/100", "10/files/101", "11/files/110"])
+        self.assertEqual(manifest["10/files/101"]["id"], "101")
+        self.assertEqual(manifest["10/files/101"]["size"], 19)
+
+    def test_unchanged_files_are_not_downloaded_again(self):
+        self.sync()
+        self.api.calls.clear()
+
+        result = self.sync()
+
+        self.assertEqual(result.copied, [])
+        self.assertEqual(sorted(result.unchanged), ["10/files/100", "10/files/101", "11/files/110"])
+        self.assertEqual(self.api.calls_of("getFileUrl"), [])
+
+    def test_changed_files_are_copied_again(self):
+        self.sync()
+        self.contents["100"] = b"first file, longer"
+        self.api.files["100"].Size = 18
+
+        result = self.sync()
+
+        self.assertEqual(result.copied, ["10/files/100"])
+        self.assertEqual(self.dst_fs.readbytes("/mirror/10/files/100"), b"first file, longer")
+        self.assertEqual(self.manifest()["10/files/100"]["size"], 18)
+
+    def test_files_altered_in_the_destination_are_copied_again(self):
+        self.sync()
+        self.dst_fs.writebytes("/mirror/11/files/110", b"truncated, then rewritten")
+
+        result = self.sync()
+
+        self.assertEqual(result.copied, ["11/files/110"])
+        self.assertEqual(self.dst_fs.readbytes("/mirror/11/files/110"), b"third")
+
+    def test_deleted_files_leave_the_manifest_not_the_destination(self):
+        self.sync()
+        self.api.group_files["10"].remove(self.api.files["101"])
+
+        result = self.sync()
+
+        self.assertEqual(sorted(result.unchanged), ["10/files/100", "11/files/110"])
+        self.assertNotIn("10/files/101", self.manifest())
+        self.assertEqual(self.dst_fs.readbytes("/mirror/10/files/101"), b"second file content")
+
+    def test_files_still_uploading_are_skipped(self):
+        self.api.files["101"].UploadStatus = "pending"
+
+        result = self.sync()
+
+        self.assertEqual(result.uploading, ["10/files/101"])
+        self.assertFalse(self.dst_fs.exists("/mirror/10/files/101"))
+        self.assertNotIn("10/files/101", self.manifest())
+
+    def test_interrupted_sync_keeps_the_completed_copies(self):
+        del self.contents["110"]
+
+        with self.assertRaises(Exception):
+            self.sync(workers=1)
+
+        self.assertEqual(sorted(self.manifest()), ["10/files/100", "10/files/101"])
+        self.contents["110"] = b"third"
+        self.api.calls.clear()
+
+        result = self.sync()
+
+        self.assertEqual(result.copied, ["11/files/110"])
+        self.assertEqual(len(self.api.calls_of("getFileUrl")), 1)
+
+    def test_directories_are_listed_concurrently(self):
+        # each listing of files waits for the other one: a sequential walk would time out
+        barrier = threading.Barrier(2, timeout=5)
+        list_files = self.api.list_files
+
+        def concurrent_list_files(group_id, queryPars=None):
+            barrier.wait()
+            return list_files(group_id, queryPars)
+
+        self.api.list_files = concurrent_list_files
+
+        result = self.sync(MemoryFS())
+
+        self.assertEqual(len(result.copied), 3)
@@ -0,0 +1,75 @@
+# coding: utf-8
+
+"""
+    Offline tests of the columnar listings
+"""
+
+import unittest
+from types import SimpleNamespace
+
+from fs_basespace.basespace_context import FileContext, FileGroupsContext
+from fs_basespace.table import COLUMNS, NUMPY_MISSING_SIZE, iter_table_batches
+
+from tests.fakes import FakeFs
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def make_tree():
+    app_result = FileGroupsContext(SimpleNamespace(Id="10", Name="ar", DateCreated="2020-01-01"))
+    files = [FileContext(SimpleNamespace(Id=str(1000 + i), Name=f"f{i}.bam", Size=i * 10, DateCreated="2020-01-02",
+                                         qc_status="passed" if i else None)) for i in range(5)]
+    return {
+        "appresults": [app_result],
+        "appresults/10": app_result.list(None, None),
+        "appresults/10/files": files,
+    }
+
+
+class TestTable(unittest.TestCase):
+
+    def setUp(self):
+        self.fs = FakeFs(make_tree())
+        self.addCleanup(self.fs.close)
+
+    def test_listing_columns(self):
+        batches = list(iter_table_batches(self.fs, "appresults/10/files", batch_size=3))
+
+        self.assertEqual([len(batch["id"]) for batch in batches], [3, 2])
+        self.assertEqual(tuple(batches[0]), COLUMNS)
+        self.assertEqual(batches[1]["size"], [30, 40])
+        self.assertEqual(batches[0]["qc_status"], [None, "passed", "passed"])
+        self.assertEqual(set(batches[0]["parent"]), {"/appresults/10/files"})
+
+    def test_recursive_walk(self):
+        batch, = iter_table_batches(self.fs, "appresults", recursive=True)
+
+        self.assertEqual(batch["id"], ["10", "files", "1000", "1001", "1002", "1003", "1004"])
+        self.assertEqual(batch["is_dir"], [True, True, False, False, False, False, False])
+        self.assertEqual(batch["created"][:2], ["2020-01-01", None])
+
+    def test_unknown_output(self):
+        with self.assertRaises(ValueError):
+            next(iter_table_batches(self.fs, "appresults", output="csv"))
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_numpy_output(self):
+        batch, = iter_table_batches(self.fs, "appresults", recursive=True, output="numpy")
+
+        self.assertEqual(batch["size"].dtype, numpy.int64)
+        self.assertEqual(batch["size"][0], NUMPY_MISSING_SIZE)
+
+    @unittest.skipUnless(pyarrow, "pyarrow is not installed")
+    def test_arrow_output(self):
+        batch, = iter_table_batches(self.fs, "appresults", recursive=True, output="arrow")
+
+        self.assertEqual(batch.num_rows, 7)
+        self.assertEqual(batch.column("size").null_count, 2)
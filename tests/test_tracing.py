@@ -0,0 +1,156 @@
+# coding: utf-8
+
+"""
+    Offline tests of the record and replay of api traffic
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from fs_basespace.basespace_file import BaseSpaceFile
+from fs_basespace.tracing import REDACTED
+from fs_basespace.tracing import TraceMiss
+from fs_basespace.tracing import TraceRecorder
+from fs_basespace.tracing import TraceReplayer
+from fs_basespace.tracing import load_trace
+
+from tests.fakes import FileServer
+
+
+class _Entity:
+    def __init__(self, entity_id, href):
+        self.Id = entity_id
+        self.Href = href
+        self.api_configuration = {"token": "secret-token"}
+
+
+class _Slotted:
+    __slots__ = ("value",)
+
+
+class _Api:
+    def __init__(self):
+        self.calls = 0
+
+    def getNested(self):
+        nested = {"level": 0, "url": "https://s3/deep?X-Amz-Signature=signature"}
+        for level in range(1, 10):
+            nested = {"level": level, "child": [nested]}
+        return {"tree": nested, "auth": {"access_token": "other-token", "Authorization": "Bearer other"}}
+
+    def getOpaque(self):
+        return {"opaque": _Slotted()}
+
+    def getFileById(self, entity_id, queryPars=None):
+        self.calls += 1
+        if entity_id == "404":
+            raise IOError("404 Not Found")
+        return _Entity(entity_id, f"https://s3/{entity_id}?X-Amz-Signature=signature&token=secret-token")
+
+
+class _Factory:
+    def __init__(self):
+        self.base_api = _Api()
+        self.v2 = None
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "run.trace")
+        self.factory = _Factory()
+        recorder = TraceRecorder(self.path)
+        api = recorder.api_factory(lambda: self.factory, "https://api.basespace.illumina.com", "secret-token", None)
+        self.recorded = api.base_api.getFileById("1")
+        with self.assertRaises(IOError):
+            api.base_api.getFileById("404")
+        recorder.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_trace_is_redacted(self):
+        events = load_trace(self.path)
+
+        self.assertEqual([event.key for event in events], ["getFileById('1')", "getFileById('404')"])
+        self.assertIn("404 Not Found", events[1].error)
+        with open(self.path, "rb") as trace_file:
+            self.assertNotIn(b"secret-token", trace_file.read())
+
+    def test_replay_serves_the_recorded_calls(self):
+        sleeps = []
+        replayer = TraceReplayer(self.path, latency_scale=0.5, sleep=sleeps.append)
+        api = replayer.api_factory(None, "https://api.basespace.illumina.com", "secret-token", None)
+
+        entity = api.base_api.getFileById("1")
+        self.assertEqual(entity.Id, "1")
+        self.assertEqual(entity.Href, f"https://s3/1?{REDACTED}")
+        self.assertIsNone(entity.api_configuration)
+        with self.assertRaises(IOError):
+            api.base_api.getFileById("404")
+        with self.assertRaises(TraceMiss):
+            api.base_api.getFileById("2")
+        self.assertEqual(len(sleeps), 2)
+        self.assertEqual(self.factory.base_api.calls, 2)
+
+    def test_deep_values_and_secret_fields_are_redacted(self):
+        recorder = TraceRecorder(self.path)
+        api = recorder.api_factory(lambda: self.factory, "https://api.basespace.illumina.com", "secret-token", None)
+        result = api.base_api.getNested()
+        api.base_api.getOpaque()
+        recorder.close()
+
+        with open(self.path, "rb") as trace_file:
+            content = trace_file.read()
+        self.assertNotIn(b"other-token", content)
+        replayer = TraceReplayer(self.path, sleep=lambda seconds: None)
+        replayed = replayer.api_factory(None, None, None, None).base_api
+        redacted = replayed.getNested()
+        self.assertEqual(redacted["auth"], {"access_token": REDACTED, "Authorization": REDACTED})
+        leaf = redacted["tree"]
+        while "child" in leaf:
+            leaf = leaf["child"][0]
+        self.assertEqual(leaf["url"], f"https://s3/deep?{REDACTED}")
+        self.assertEqual(result["auth"]["access_token"], "other-token")
+        # only the timing of results that can't be redacted is kept
+        with self.assertRaises(TraceMiss):
+            replayed.getOpaque()
+
+
+class TestHttpTracing(unittest.TestCase):
+    DATA = b"x" * 100000
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.server = FileServer({"file": self.DATA})
+        self.addCleanup(self.server.close)
+        self.path = os.path.join(self.directory, "run.trace")
+
+    def test_body_read_time_is_recorded_and_replayed(self):
+        recorder = TraceRecorder(self.path)
+        url = f"{self.server.url}/file?X-Amz-Signature=signature"
+        with BaseSpaceFile(url, "rb", http_get=recorder.http_get) as read_file:
+            self.assertEqual(len(read_file.read()), len(self.DATA))
+        recorder.close()
+
+        events = {event.kind: event for event in load_trace(self.path)}
+        self.assertEqual(events["http-body"].size, len(self.DATA))
+        self.assertGreaterEqual(events["http-body"].elapsed, events["http"].elapsed)
+
+        sleeps = []
+        lock = threading.Lock()
+
+        def sleep(seconds):
+            with lock:
+                sleeps.append(seconds)
+
+        replayer = TraceReplayer(self.path, sleep=sleep)
+        with BaseSpaceFile(url, "rb", http_get=replayer.http_get) as read_file:
+            self.assertEqual(read_file.read(), bytes(len(self.DATA)))
+        self.assertEqual(len(sleeps), 2)
+        self.assertAlmostEqual(sum(sleeps), events["http-body"].elapsed)
@@ -0,0 +1,82 @@
+# coding: utf-8
+
+"""
+    Offline tests of the download write pipeline
+"""
+
+import io
+import os
+import threading
+import unittest
+
+from fs_basespace.transfer import WritePipeline
+
+
+class SlowWriter:
+    """ Sequential destination writing nothing until released """
+
+    def __init__(self):
+        self.output = io.BytesIO()
+        self.release = threading.Event()
+
+    def write_at(self, offset, view):
+        self.release.wait()
+        self.output.write(view)
+
+
+class TestWritePipeline(unittest.TestCase):
+
+    def test_sequential_feed(self):
+        data = os.urandom(100000)
+        output = io.BytesIO()
+
+        with WritePipeline(lambda offset, view: output.write(view), buffer_size=4096, memory_limit=16384) as pipeline:
+            self.assertEqual(pipeline.feed(io.BytesIO(data)), len(data))
+
+        self.assertEqual(output.getvalue(), data)
+
+    def test_memory_ceiling(self):
+        writer = SlowWriter()
+        pipeline = WritePipeline(writer.write_at, buffer_size=1024, memory_limit=4096)
+        feeder = threading.Thread(target=pipeline.feed, args=(io.BytesIO(bytes(10 * 1024)),))
+        feeder.start()
+        feeder.join(0.2)
+
+        # the reader waits for buffers to be written back
+        self.assertTrue(feeder.is_alive())
+        self.assertEqual(pipeline._allocated, 4)
+
+        writer.release.set()
+        feeder.join()
+        pipeline.close()
+        self.assertEqual(len(writer.output.getvalue()), 10 * 1024)
+
+    def test_write_error_stops_the_readers(self):
+        def write_at(offset, view):
+            raise OSError("disk full")
+
+        with self.assertRaises(IOError):
+            with WritePipeline(write_at, buffer_size=1024, memory_limit=2048) as pipeline:
+                pipeline.feed(io.BytesIO(bytes(100 * 1024)))
+
+    def test_positional_feeds(self):
+        data = os.urandom(50000)
+        output = bytearray(len(data))
+
+        def write_at(offset, view):
+            output[offset:offset + len(view)] = view
+
+        with WritePipeline(write_at, buffer_size=4096) as pipeline:
+            parts = [threading.Thread(target=pipeline.feed, args=(io.BytesIO(data[start:start + 10000]), start,
+                                                                   min(start + 10000, len(data))))
+                     for start in range(0, len(data), 10000)]
+            for part in parts:
+                part.start()
+            for part in parts:
+                part.join()
+
+        self.assertEqual(bytes(output), data)
+
+        with self.assertRaises(IOError):
+            with WritePipeline(write_at) as pipeline:
+                pipeline.feed(io.BytesIO(b"short"), 0, 10)
@@ -0,0 +1,83 @@
+# coding: utf-8
+
+"""
+    Offline tests of the disk usage crawl
+"""
+
+import unittest
+from types import SimpleNamespace
+
+from fs_basespace.basespace_context import FileContext, FileGroupsContext, ProjectContext
+from fs_basespace.usage import du, group_of, iter_du
+
+from tests.fakes import FakeFs
+
+
+def files(*sizes):
+    return [FileContext(SimpleNamespace(Id=str(index), Size=size)) for index, size in enumerate(sizes)]
+
+
+def make_tree(project_2_modified="2020-01-01"):
+    projects = [ProjectContext(SimpleNamespace(Id="1", DateModified="2020-01-01", TotalSize=60)),
+                ProjectContext(SimpleNamespace(Id="2", DateModified=project_2_modified, TotalSize=5))]
+    tree = {"projects": projects}
+    for project in projects:
+        tree[f"projects/{project.get_id()}"] = project.list(None, None)
+    tree["projects/1/appresults"] = [FileGroupsContext(SimpleNamespace(Id=str(result_id))) for result_id in (10, 11)]
+    tree["projects/1/appresults/10"] = tree["projects/1/appresults"][0].list(None, None)
+    tree["projects/1/appresults/10/files"] = files(10, 20)
+    tree["projects/1/appresults/11"] = tree["projects/1/appresults"][1].list(None, None)
+    tree["projects/1/appresults/11/files"] = files(30)
+    tree["projects/2/appresults"] = [FileGroupsContext(SimpleNamespace(Id="20"))]
+    tree["projects/2/appresults/20"] = tree["projects/2/appresults"][0].list(None, None)
+    tree["projects/2/appresults/20/files"] = files(5)
+    for project_id in ("1", "2"):
+        for category in ("samples", "biosamples", "appsessions"):
+            tree[f"projects/{project_id}/{category}"] = []
+    return tree
+
+
+class TestDiskUsage(unittest.TestCase):
+
+    def setUp(self):
+        self.fs = FakeFs(make_tree())
+
+    def tearDown(self):
+        self.fs.close()
+
+    def test_total(self):
+        usage = du(self.fs, "/projects")
+
+        self.assertEqual(usage.totals, {"/projects": 65})
+        self.assertEqual(usage.files, 4)
+        self.assertTrue(usage.complete)
+
+    def test_grouped_totals(self):
+        self.assertEqual(du(self.fs, "/projects", by="projects").totals, {"/projects/1": 60, "/projects/2": 5})
+        self.assertEqual(du(self.fs, "/projects/1", by="appresults").totals,
+                         {"/projects/1/appresults/10": 30, "/projects/1/appresults/11": 30})
+
+    def test_partial_totals_are_streamed(self):
+        snapshots = list(iter_du(self.fs, "/projects", by="projects"))
+
+        self.assertGreater(len(snapshots), 2)
+        self.assertEqual([snapshot.complete for snapshot in snapshots].count(True), 1)
+        self.assertLessEqual(sum(snapshots[len(snapshots) // 2].totals.values()), 65)
+
+    def test_unchanged_subtrees_are_not_listed_again(self):
+        du(self.fs, "/projects")
+        self.fs.listed.clear()
+        self.fs.tree = make_tree(project_2_modified="2021-01-01")
+        self.fs.tree["projects/2/appresults/20/files"] = files(5, 7)
+
+        usage = du(self.fs, "/projects", by="projects")
+
+        self.assertEqual(usage.totals, {"/projects/1": 60, "/projects/2": 12})
+        self.assertEqual(usage.files, 5)
+        self.assertFalse(any(key.startswith("projects/1") for key in self.fs.listed))
+        self.assertIn("projects/2/appresults/20/files", self.fs.listed)
+
+    def test_group_of(self):
+        self.assertEqual(group_of("/projects/1/appresults/10/files", "appresults"), "/projects/1/appresults/10")
+        self.assertIsNone(group_of("/projects/1/appresults", "appresults"))
+        self.assertIsNone(group_of("/projects/1/samples/3/files", "appresults"))